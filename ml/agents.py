@@ -3,11 +3,56 @@ agents.py
 
 Agentic AI components for SafeCred.
 Simulates a Loan Officer Agent that reasons about the application and makes decisions.
+
+Reviews are stateless: the agent holds only configuration, and each call
+records its thoughts in its own ReviewTrace, so one agent can be shared by
+every request thread or executor worker. With trace=False no thoughts are
+formatted at all and thought_process comes back empty.
 """
 
-import json
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Mapping, Optional
+
+# Decision -> reasoning lines (constant, shared)
+_DECISION_REASONING = {
+    "APPROVED": (
+        "Strong credit profile with low risk indicators.",
+        "Consistent repayment history or reliable alternative data proxies.",
+    ),
+    "REJECTED": (
+        "Credit score below acceptance threshold.",
+        "Insufficient data to verify repayment capacity.",
+    ),
+}
+
+_TIP_LOAN_AMOUNT = "Consider requesting a smaller loan amount (under 50% of your monthly income) to increase approval chances."
+_TIP_ALTERNATIVE_DATA = "Linking more data sources like utility bills or recharge history can help us verify your reliability."
+_TIP_CONSISTENCY = "Regular mobile recharges help build a digital footprint that proves consistency."
+_TIP_MAINTAIN = "Maintain your current good financial habits to build a strong credit history."
+
+_NOTE_PROXY_APPROVAL = "Applicant approved based on strong alternative data proxies (utility/recharge consistency) despite low income."
+_NOTE_FRAUD_CLEAR = "Passed all anti-fraud checks. No suspicious income-lifestyle mismatch detected."
+_NOTE_SOCIAL_IMPACT = "This loan supports financial inclusion for a socially disadvantaged applicant."
+
+_STATUS_DECISIONS = {"approved": "APPROVED", "rejected": "REJECTED"}
+
+
+class ReviewTrace:
+    """Thought log for a single review; never shared between calls."""
+
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries: List[Dict[str, str]] = []
+
+    def think(self, thought: str):
+        """Log a thought process."""
+        self.entries.append({
+            "timestamp": datetime.now().isoformat(),
+            "type": "thought",
+            "content": thought
+        })
+
 
 class LoanOfficerAgent:
     """
@@ -15,75 +60,63 @@ class LoanOfficerAgent:
     It reviews the ML scores, composite scores, and user data to generate
     a human-readable decision and reasoning.
     """
-    
+
     def __init__(self, name: str = "SafeCred AI Officer"):
         self.name = name
-        self.memory = []
-
-    def think(self, thought: str):
-        """Log a thought process."""
-        self.memory.append({
-            "timestamp": datetime.now().isoformat(),
-            "type": "thought",
-            "content": thought
-        })
 
-    def review_application(self, 
-                          application_data: Dict[str, Any], 
-                          ml_result: Dict[str, Any], 
+    def review_application(self,
+                          application_data: Dict[str, Any],
+                          ml_result: Dict[str, Any],
                           composite_result: Dict[str, Any],
-                          precomputed_status: Optional[str] = None) -> Dict[str, Any]:
+                          precomputed_status: Optional[str] = None,
+                          trace: bool = True) -> Dict[str, Any]:
         """
         Review the application and generate a decision report.
+        trace=False skips building thought_process (returned as []).
         """
-        self.memory = [] # Clear memory for new review
-        
-        app_id = application_data.get("application_id", "Unknown")
-        self.think(f"Starting review for application {app_id}")
-        
+        log = ReviewTrace() if trace else None
+
+        if log is not None:
+            log.think(f"Starting review for application {application_data.get('application_id', 'Unknown')}")
+
         # 1. Analyze Risk Profile
-        ml_prob = ml_result.get("ml_probability", 0)
-        composite_score = composite_result.get("composite_score", 0)
         final_sci = ml_result.get("final_sci", 0)
-        
+
         risk_level = "HIGH"
         if final_sci >= 80:
             risk_level = "LOW"
         elif final_sci >= 60:
             risk_level = "MEDIUM"
-            
-        self.think(f"Risk assessment: ML Prob={ml_prob}, Composite={composite_score}, Final SCI={final_sci} -> {risk_level} Risk")
-        
+
+        if log is not None:
+            ml_prob = ml_result.get("ml_probability", 0)
+            composite_score = composite_result.get("composite_score", 0)
+            log.think(f"Risk assessment: ML Prob={ml_prob}, Composite={composite_score}, Final SCI={final_sci} -> {risk_level} Risk")
+
         # 2. Analyze Financial Health
         income = application_data.get("declared_income", 0)
         loan_amount = application_data.get("loan_amount", 0)
         lti_ratio = loan_amount / max(1, income)
-        
+
         financial_health = "GOOD"
         if lti_ratio > 0.6:
             financial_health = "STRETCHED"
-            self.think(f"Financial warning: Loan-to-Income ratio is high ({lti_ratio:.2f})")
-        
+            if log is not None:
+                log.think(f"Financial warning: Loan-to-Income ratio is high ({lti_ratio:.2f})")
+
         # 3. Check for Red Flags
         red_flags = []
         if composite_result.get("fraud_risk_penalty", 0) > 0:
             red_flags.append("Potential fraud risk detected")
         if composite_result.get("no_history_manual_flag", False):
             red_flags.append("High income but no credit history")
-            
+
         # 4. Formulate Decision
-        decision = "MANUAL_REVIEW"
-        reasoning = []
-        
         if precomputed_status:
             # Use the precomputed status from the rigorous business rules
-            if precomputed_status == "approved":
-                decision = "APPROVED"
-            elif precomputed_status == "rejected":
-                decision = "REJECTED"
-            else:
-                decision = "MANUAL_REVIEW"
-            self.think(f"Using precomputed status: {precomputed_status} -> {decision}")
+            decision = _STATUS_DECISIONS.get(precomputed_status, "MANUAL_REVIEW")
+            if log is not None:
+                log.think(f"Using precomputed status: {precomputed_status} -> {decision}")
         else:
             # Fallback to agent's own simple logic (if no precomputed status)
             if risk_level == "LOW" and not red_flags and financial_health == "GOOD":
@@ -94,29 +127,25 @@ class LoanOfficerAgent:
                 decision = "MANUAL_REVIEW"
 
         # Generate reasoning based on the final decision
-        if decision == "APPROVED":
-            reasoning.append("Strong credit profile with low risk indicators.")
-            reasoning.append("Consistent repayment history or reliable alternative data proxies.")
-        elif decision == "REJECTED":
-            reasoning.append("Credit score below acceptance threshold.")
-            reasoning.append("Insufficient data to verify repayment capacity.")
-        else:
+        reasoning = list(_DECISION_REASONING.get(decision, ()))
+        if not reasoning:
             if red_flags:
                 reasoning.append(f"Requires manual verification due to: {', '.join(red_flags)}.")
             elif financial_health == "STRETCHED":
                 reasoning.append("Loan amount is high relative to declared income.")
             else:
                 reasoning.append("Borderline credit score requires human oversight.")
-                
+
         # 5. Generate Coaching & Lender Notes
         coaching_tips = self._generate_coaching_tips(application_data, composite_result, decision)
         lender_notes = self._generate_lender_notes(application_data, composite_result, decision, risk_level)
 
         # 6. Generate Message
         message = self._generate_message(decision, reasoning, application_data, coaching_tips)
-        
-        self.think(f"Final Decision: {decision}")
-        
+
+        if log is not None:
+            log.think(f"Final Decision: {decision}")
+
         return {
             "agent_name": self.name,
             "decision": decision,
@@ -124,58 +153,75 @@ class LoanOfficerAgent:
             "message": message,
             "coaching_tips": coaching_tips,
             "lender_notes": lender_notes,
-            "thought_process": self.memory
+            "thought_process": log.entries if log is not None else []
         }
 
+    def review_batch(self, reviews: Iterable[Mapping[str, Any]], trace: bool = True) -> List[Dict[str, Any]]:
+        """
+        Review many applications. Each item holds the review_application
+        keyword arguments (application_data, ml_result, composite_result and
+        optionally precomputed_status); reports come back in input order.
+        """
+        review = self.review_application
+        return [
+            review(
+                item["application_data"],
+                item["ml_result"],
+                item["composite_result"],
+                item.get("precomputed_status"),
+                trace,
+            )
+            for item in reviews
+        ]
+
     def _generate_coaching_tips(self, app_data: Dict, composite_result: Dict, decision: str) -> List[str]:
         """Generate personalized financial advice for the applicant."""
         tips = []
-        
+
         # Tip 1: Loan Amount
         income = app_data.get("declared_income", 0)
         loan_amount = app_data.get("loan_amount", 0)
         if income > 0 and (loan_amount / income) > 0.5:
-            tips.append("Consider requesting a smaller loan amount (under 50% of your monthly income) to increase approval chances.")
-            
+            tips.append(_TIP_LOAN_AMOUNT)
+
         # Tip 2: Alternative Data
-        consent_depth = composite_result.get("consent_depth", 0)
-        if consent_depth < 0.5:
-            tips.append("Linking more data sources like utility bills or recharge history can help us verify your reliability.")
-            
+        if composite_result.get("consent_depth", 0) < 0.5:
+            tips.append(_TIP_ALTERNATIVE_DATA)
+
         # Tip 3: Consistency
         if composite_result.get("components", {}).get("recharge_score", 0) < 0.5:
-            tips.append("Regular mobile recharges help build a digital footprint that proves consistency.")
-            
+            tips.append(_TIP_CONSISTENCY)
+
         if not tips:
-            tips.append("Maintain your current good financial habits to build a strong credit history.")
-            
+            tips.append(_TIP_MAINTAIN)
+
         return tips
 
     def _generate_lender_notes(self, app_data: Dict, composite_result: Dict, decision: str, risk_level: str) -> List[str]:
         """Generate notes for the lender/investor to comfort them about the risk."""
         notes = []
-        
+
         # Note 1: Alternative Data Validation
         if composite_result.get("user_segment") == "low_income_alternative_proxies" and decision == "APPROVED":
-            notes.append("Applicant approved based on strong alternative data proxies (utility/recharge consistency) despite low income.")
-            
+            notes.append(_NOTE_PROXY_APPROVAL)
+
         # Note 2: Fraud Check
         fraud_penalty = composite_result.get("fraud_risk_penalty", 0)
         if fraud_penalty == 0:
-            notes.append("Passed all anti-fraud checks. No suspicious income-lifestyle mismatch detected.")
+            notes.append(_NOTE_FRAUD_CLEAR)
         else:
             notes.append(f"High fraud risk detected (Penalty: {fraud_penalty:.2f}). Proceed with caution.")
-            
+
         # Note 3: Social Impact
         if app_data.get("is_socially_disadvantaged"):
-            notes.append("This loan supports financial inclusion for a socially disadvantaged applicant.")
-            
+            notes.append(_NOTE_SOCIAL_IMPACT)
+
         return notes
 
     def _generate_message(self, decision: str, reasoning: List[str], app_data: Dict, tips: List[str]) -> str:
         """Generate a user-friendly message."""
         name = app_data.get("name", "Applicant").split()[0]
-        
+
         if decision == "APPROVED":
             return f"Congratulations {name}! Your application has been approved based on your strong profile. {reasoning[0]}"
         elif decision == "REJECTED":
@@ -193,4 +239,3 @@ class GenAIAgent(LoanOfficerAgent):
         # Simulate a more empathetic, GenAI-style response
         base_msg = super()._generate_message(decision, reasoning, app_data, tips)
         return f"[AI Generated] {base_msg}"
-
@@ -1,6 +1,47 @@
+"""
+bank_parser.py
+
+Cash-flow features from bank statement transactions.
+
+extract_bank_features() scores one customer's transaction list.
+stream_bank_features() computes the same features for many customers from
+transaction chunks (a large CSV read with chunksize, or one file per user
+via iter_statement_dir()). Each chunk is reduced with vectorized groupby
+aggregates into per-user totals and per-user monthly credit sums. Those
+partials are buffered and merged in batches (at least MERGE_EVERY_CHUNKS
+chunks, and at least as many rows as already merged), so the users seen
+so far are not regrouped on every chunk and the total cost stays linear.
+Memory grows with users x months, not with the number of transaction rows.
+
+Configuration (environment):
+    ML_BANK_STATEMENT_CHUNK_ROWS  rows per CSV chunk when streaming (default: 200000)
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Union
+
 import pandas as pd
 import numpy as np
 
+STATEMENT_CHUNK_ROWS = int(os.getenv("ML_BANK_STATEMENT_CHUNK_ROWS", "200000"))
+
+# Chunk partials buffered before they are merged into the running per-user aggregates
+MERGE_EVERY_CHUNKS = 64
+
+BOUNCE_KEYWORDS = ('bounce', 'return', 'reversal', 'insufficient', 'penalty')
+BOUNCE_PATTERN = "|".join(re.escape(k) for k in BOUNCE_KEYWORDS)
+LOW_BALANCE_THRESHOLD = 1000
+
+FEATURE_COLUMNS = ["income_volatility", "expense_ratio", "min_balance_days", "bounced_count", "avg_daily_balance"]
+TRANSACTION_COLUMNS = ["date", "description", "amount", "type", "balance"]
+
+
+def _bounced(descriptions: pd.Series) -> pd.Series:
+    return descriptions.str.contains(BOUNCE_PATTERN, case=False, regex=True, na=False)
+
+
 def extract_bank_features(transactions):
     """
     transactions: list of dicts with 'date', 'description', 'amount', 'type' (CREDIT/DEBIT), 'balance'
@@ -8,32 +49,29 @@ def extract_bank_features(transactions):
     """
     if not transactions:
         return {}
-        
+
     df = pd.DataFrame(transactions)
     df['date'] = pd.to_datetime(df['date'])
     df['amount'] = pd.to_numeric(df['amount'])
-    
+
     credits = df[df['type'].str.upper() == 'CREDIT']
     debits = df[df['type'].str.upper() == 'DEBIT']
-    
+
     # 1. Income Volatility (CV of monthly credits)
-    monthly_credits = credits.set_index('date').resample('M')['amount'].sum()
+    monthly_credits = credits.set_index('date').resample('ME')['amount'].sum()
     income_volatility = monthly_credits.std() / monthly_credits.mean() if monthly_credits.mean() > 0 else 0
-    
+
     # 2. Expense-to-income ratio
     total_credit = credits['amount'].sum()
     total_debit = debits['amount'].sum()
     expense_ratio = total_debit / total_credit if total_credit > 0 else 1.0
-    
+
     # 3. Minimum balance days
-    min_bal_days = (df['balance'] < 1000).sum()
-    
+    min_bal_days = (df['balance'] < LOW_BALANCE_THRESHOLD).sum()
+
     # 4. Bounced payments
-    bounced_keywords = ['bounce', 'return', 'reversal', 'insufficient', 'penalty']
-    bounced_count = df['description'].str.lower().apply(
-        lambda x: any(k in x for k in bounced_keywords)
-    ).sum()
-    
+    bounced_count = _bounced(df['description']).sum()
+
     return {
         "income_volatility": round(income_volatility, 3),
         "expense_ratio": round(expense_ratio, 3),
@@ -41,3 +79,158 @@ def extract_bank_features(transactions):
         "bounced_count": int(bounced_count),
         "avg_daily_balance": round(df['balance'].mean(), 2)
     }
+
+
+class BankFeatureAccumulator:
+    """
+    Per-user running aggregates for extract_bank_features, fed one chunk
+    of transactions at a time. A user may appear in any number of chunks.
+    """
+
+    _TOTALS = ["credit", "debit", "low_balance", "bounced", "balance_sum", "balance_count"]
+
+    def __init__(self, user_col: str = "user_id", merge_every: int = MERGE_EVERY_CHUNKS):
+        self.user_col = user_col
+        self.merge_every = max(1, merge_every)
+        self.rows = 0
+        self._totals = pd.DataFrame(columns=self._TOTALS, dtype=float)
+        self._monthly = pd.Series(dtype=float)  # (user, year * 12 + month) -> credit sum
+        # Per-chunk partials not yet merged into _totals / _monthly
+        self._pending_totals: List[pd.DataFrame] = []
+        self._pending_monthly: List[pd.Series] = []
+        self._pending_rows = 0
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if chunk.empty:
+            return
+        users = chunk[self.user_col]
+        kind = chunk['type'].astype(str).str.upper()
+        is_credit = (kind == 'CREDIT').to_numpy()
+        amount = pd.to_numeric(chunk['amount']).to_numpy(dtype=float)
+        balance = pd.to_numeric(chunk['balance']).to_numpy(dtype=float)
+
+        parts = pd.DataFrame({
+            "credit": np.where(is_credit, amount, np.nan),
+            "debit": np.where((kind == 'DEBIT').to_numpy(), amount, np.nan),
+            "low_balance": balance < LOW_BALANCE_THRESHOLD,
+            "bounced": _bounced(chunk['description']).to_numpy(),
+            "balance_sum": balance,
+            "balance_count": ~np.isnan(balance),
+        }, index=users.to_numpy())
+        totals = parts.groupby(level=0, sort=False).sum()
+
+        dates = pd.to_datetime(chunk['date'])
+        month = (dates.dt.year * 12 + dates.dt.month).to_numpy()[is_credit]
+        monthly = pd.Series(amount[is_credit]).groupby(
+            [users.to_numpy()[is_credit], month], sort=False
+        ).sum()
+
+        self._pending_totals.append(totals)
+        self._pending_rows += len(totals)
+        if not monthly.empty:
+            self._pending_monthly.append(monthly)
+        self.rows += len(chunk)
+        if len(self._pending_totals) >= self.merge_every and self._pending_rows >= len(self._totals):
+            self._merge()
+
+    def _merge(self) -> None:
+        """
+        Fold the pending chunk partials into the running aggregates with one
+        groupby each. update() merges only once the partials hold at least
+        merge_every chunks and as many user rows as the aggregates, so each
+        accumulated user is regrouped O(log chunks) times in total instead
+        of once per chunk.
+        """
+        if self._pending_totals:
+            parts = self._pending_totals if self._totals.empty else [self._totals, *self._pending_totals]
+            self._totals = pd.concat(parts).groupby(level=0, sort=False).sum()
+            self._pending_totals = []
+            self._pending_rows = 0
+        if self._pending_monthly:
+            parts = self._pending_monthly if self._monthly.empty else [self._monthly, *self._pending_monthly]
+            self._monthly = pd.concat(parts).groupby(level=[0, 1], sort=False).sum()
+            self._pending_monthly = []
+
+    def _income_volatility(self) -> pd.Series:
+        """
+        CV of monthly credit sums over each user's first..last credit month,
+        months without credits counting as 0 (what resample('ME').sum() does).
+        """
+        if self._monthly.empty:
+            return pd.Series(dtype=float)
+        monthly = self._monthly.rename("amount").reset_index()
+        monthly.columns = ["user", "month", "amount"]
+        per_user = monthly.groupby("user", sort=False).agg(
+            first=("month", "min"), last=("month", "max"), total=("amount", "sum"), observed=("amount", "size")
+        )
+        n_months = per_user["last"] - per_user["first"] + 1
+        mean = per_user["total"] / n_months
+        deviation = (monthly["amount"] - monthly["user"].map(mean)) ** 2
+        sq_dev = deviation.groupby(monthly["user"], sort=False).sum() + (n_months - per_user["observed"]) * mean ** 2
+        std = np.sqrt(sq_dev / (n_months - 1)).where(n_months > 1)
+        return (std / mean).where(mean > 0, 0.0)
+
+    def features(self) -> pd.DataFrame:
+        """One row per user, columns FEATURE_COLUMNS."""
+        self._merge()
+        totals = self._totals
+        if totals.empty:
+            return pd.DataFrame(columns=FEATURE_COLUMNS).rename_axis(self.user_col)
+        # No credits -> 0; a single credit month -> NaN (undefined std), as in extract_bank_features
+        volatility = self._income_volatility().reindex(totals.index, fill_value=0.0)
+        credit, debit = totals["credit"], totals["debit"]
+        out = pd.DataFrame({
+            "income_volatility": volatility.round(3),
+            "expense_ratio": (debit / credit).where(credit > 0, 1.0).round(3),
+            "min_balance_days": totals["low_balance"].astype(int),
+            "bounced_count": totals["bounced"].astype(int),
+            "avg_daily_balance": (totals["balance_sum"] / totals["balance_count"]).round(2),
+        }, index=totals.index)
+        return out.rename_axis(self.user_col)
+
+
+def stream_bank_features(
+    source: Union[str, Path, Iterable[pd.DataFrame]],
+    user_col: str = "user_id",
+    chunksize: int = STATEMENT_CHUNK_ROWS,
+) -> pd.DataFrame:
+    """
+    Bank features for every user in a transaction CSV (read in chunks of
+    chunksize rows) or in an iterable of transaction DataFrames. Each row
+    needs user_col plus the extract_bank_features columns.
+    """
+    if isinstance(source, (str, Path)):
+        chunks = pd.read_csv(source, usecols=[user_col, *TRANSACTION_COLUMNS], chunksize=chunksize)
+    else:
+        chunks = source
+    accumulator = BankFeatureAccumulator(user_col)
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator.features()
+
+
+def iter_statement_dir(directory: Union[str, Path], user_col: str = "user_id") -> Iterator[pd.DataFrame]:
+    """
+    Transactions from a directory of per-user monthly summaries
+    ({user}.csv with date, salary_credit, emi_debit, bill_debit,
+    closing_balance, as in ml/data/bank_statements/), one user per chunk.
+    Each month becomes a salary credit carrying the closing balance plus
+    EMI and bill debits.
+    """
+    for path in sorted(Path(directory).glob("*.csv"), key=lambda p: (len(p.stem), p.stem)):
+        summary = pd.read_csv(path)
+        if summary.empty:
+            continue
+        n = len(summary)
+        yield pd.DataFrame({
+            user_col: path.stem,
+            "date": np.tile(summary["date"].to_numpy(), 3),
+            "description": np.repeat(["salary credit", "loan emi", "bill payment"], n),
+            "amount": np.concatenate([
+                summary["salary_credit"].to_numpy(),
+                summary["emi_debit"].to_numpy(),
+                summary["bill_debit"].to_numpy(),
+            ]),
+            "type": np.repeat(["CREDIT", "DEBIT", "DEBIT"], n),
+            "balance": np.concatenate([summary["closing_balance"].to_numpy(dtype=float), np.full(2 * n, np.nan)]),
+        })
@@ -1,7 +1,48 @@
+"""
+bayesian_updater.py
+
+Dirichlet income-band posteriors per beneficiary, stored in MongoDB.
+
+update() applies one signal in a single round trip: an upserting
+find_one_and_update whose update is an aggregation pipeline. The pipeline
+seeds the demographic prior when the document does not exist yet, appends
+the history entry, adds the likelihood pseudo-counts to the stored alphas
+server-side, and returns the new document.
+
+update_many() is the nightly-ingest path: signals are grouped per
+beneficiary, their pseudo-counts summed, and every beneficiary gets one
+pipeline UpdateOne in an unordered bulk_write (BULK_WRITE_BATCH operations
+per call). The history entries and posteriors equal those of calling
+update() for each signal in order, up to floating-point summation order.
+
+Configuration (environment):
+    ML_BAYES_BULK_WRITE_BATCH  UpdateOne operations per bulk_write call (default: 1000)
+"""
+
+import os
 import numpy as np
+from collections import OrderedDict
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Mapping, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+BULK_WRITE_BATCH = int(os.getenv("ML_BAYES_BULK_WRITE_BATCH", "1000"))
+HISTORY_LIMIT = 50
+N_BANDS = 5
+
+# Estimates do not need the history; keep it on the server
+_ESTIMATE_PROJECTION = {"_id": 0, "signal_history": 0}
+
+
+def _add_vectors(field_path: str, counts: List[float]) -> Dict[str, Any]:
+    """Pipeline expression: element-wise field + counts."""
+    return {"$map": {
+        "input": {"$zip": {"inputs": [field_path, {"$literal": counts}]}},
+        "as": "pair",
+        "in": {"$sum": "$$pair"},
+    }}
 
 @dataclass
 class DemographicPrior:
@@ -61,24 +102,47 @@ class BayesianIncomeUpdater:
         # Uniform fallback
         return [1.0, 1.0, 1.0, 1.0, 1.0]
 
-    def _fetch_or_create_document(self, beneficiary_id: str, district: str = None, state: str = None) -> Dict[str, Any]:
-        """Gets current state or creates new flat prior."""
-        doc = self.collection.find_one({"beneficiary_id": beneficiary_id})
-        if doc:
-            return doc
-            
-        alphas = self._get_initial_alphas(district, state)
-        
-        doc = {
-            "beneficiary_id": beneficiary_id,
-            "alphas": alphas,
-            "district": district,
-            "state": state,
-            "signal_history": []
-        }
-        # Insert atomic
-        self.collection.insert_one(doc)
-        return doc
+    def _update_pipeline(
+        self,
+        district: Optional[str],
+        state: Optional[str],
+        signals: List[Dict[str, Any]],
+        likelihoods: List[List[float]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Aggregation-pipeline update applying signals in order. A missing
+        document (upsert) starts from the demographic prior of district / state.
+        """
+        is_new = {"$eq": [{"$type": "$alphas"}, "missing"]}
+        timestamp = datetime.utcnow().isoformat()
+
+        # Pseudo-counts accumulated up to and including each signal
+        prefix, running = [], [0.0] * N_BANDS
+        for likelihood in likelihoods:
+            running = [a + b for a, b in zip(running, likelihood)]
+            prefix.append(running)
+
+        entries = [
+            {
+                "timestamp": {"$literal": timestamp},
+                "signal_type": {"$literal": signal["signal_type"]},
+                "signal_value": {"$literal": signal["signal_value"]},
+                "posterior_alphas": _add_vectors("$alphas", counts),
+            }
+            for signal, counts in list(zip(signals, prefix))[-HISTORY_LIMIT:]
+        ]
+        return [
+            {"$set": {
+                "alphas": {"$ifNull": ["$alphas", {"$literal": self._get_initial_alphas(district, state)}]},
+                "district": {"$cond": [is_new, {"$literal": district}, "$district"]},
+                "state": {"$cond": [is_new, {"$literal": state}, "$state"]},
+            }},
+            # Entries read the prior alphas ("$alphas" before the final stage)
+            {"$set": {"signal_history": {"$slice": [
+                {"$concatArrays": [{"$ifNull": ["$signal_history", []]}, entries]}, -HISTORY_LIMIT
+            ]}}},
+            {"$set": {"alphas": _add_vectors("$alphas", running)}},
+        ]
 
     def _calculate_likelihood(self, signal_type: str, signal_value: Any) -> List[float]:
         """Converts incoming signals into Dirichlet pseudo-counts."""
@@ -109,41 +173,60 @@ class BayesianIncomeUpdater:
         return [0.0]*5
 
     def update(self, beneficiary_id: str, signal_type: str, signal_value: Any, district: str = None, state: str = None) -> Dict[str, Any]:
-        """Performs Bayesian Dirichlet conjugate addition and stores in MongoDB."""
-        doc = self._fetch_or_create_document(beneficiary_id, district, state)
-        current_alphas = doc["alphas"]
-        
+        """Performs Bayesian Dirichlet conjugate addition in MongoDB (one atomic round trip)."""
         likelihood = self._calculate_likelihood(signal_type, signal_value)
-        
-        # Conjugate update: add pseudo-counts
-        new_alphas = [a + b for a, b in zip(current_alphas, likelihood)]
-        
-        signal_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "signal_type": signal_type,
-            "signal_value": signal_value,
-            "posterior_alphas": new_alphas
-        }
-        
-        # Atomic MongoDB Update
-        self.collection.update_one(
+        signal = {"signal_type": signal_type, "signal_value": signal_value}
+
+        # Conjugate update: add pseudo-counts, server-side
+        doc = self.collection.find_one_and_update(
             {"beneficiary_id": beneficiary_id},
-            {
-                "$set": {"alphas": new_alphas},
-                "$push": {
-                    "signal_history": {
-                        "$each": [signal_entry],
-                        "$slice": -50  # Keep only last 50
-                    }
-                }
-            }
+            self._update_pipeline(district, state, [signal], [likelihood]),
+            projection=_ESTIMATE_PROJECTION,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
         )
-        
-        return self.get_current_estimate(beneficiary_id)
+        return self._estimate(beneficiary_id, doc)
+
+    def update_many(self, signals: Iterable[Mapping[str, Any]]) -> Dict[str, int]:
+        """
+        Apply many signals ({beneficiary_id, signal_type, signal_value,
+        optional district / state}) with one UpdateOne per beneficiary.
+        A beneficiary's signals are applied in input order; district / state
+        are taken from its first signal. Returns write counts.
+        """
+        grouped: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        for signal in signals:
+            group = grouped.get(signal["beneficiary_id"])
+            if group is None:
+                group = grouped[signal["beneficiary_id"]] = {
+                    "district": signal.get("district"), "state": signal.get("state"), "signals": [], "likelihoods": []
+                }
+            group["signals"].append(signal)
+            group["likelihoods"].append(self._calculate_likelihood(signal["signal_type"], signal["signal_value"]))
+
+        totals = {"beneficiaries": len(grouped), "matched": 0, "modified": 0, "upserted": 0}
+        operations = [
+            UpdateOne(
+                {"beneficiary_id": beneficiary_id},
+                self._update_pipeline(group["district"], group["state"], group["signals"], group["likelihoods"]),
+                upsert=True,
+            )
+            for beneficiary_id, group in grouped.items()
+        ]
+        for start in range(0, len(operations), BULK_WRITE_BATCH):
+            result = self.collection.bulk_write(operations[start:start + BULK_WRITE_BATCH], ordered=False)
+            totals["matched"] += result.matched_count
+            totals["modified"] += result.modified_count
+            totals["upserted"] += result.upserted_count
+        return totals
 
     def get_current_estimate(self, beneficiary_id: str) -> Optional[Dict[str, Any]]:
         """Returns normalized probability distribution."""
-        doc = self.collection.find_one({"beneficiary_id": beneficiary_id})
+        doc = self.collection.find_one({"beneficiary_id": beneficiary_id}, _ESTIMATE_PROJECTION)
+        return self._estimate(beneficiary_id, doc)
+
+    @staticmethod
+    def _estimate(beneficiary_id: str, doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         if not doc:
             return None
             
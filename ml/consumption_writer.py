@@ -0,0 +1,217 @@
+"""
+consumption_writer.py
+
+Bulk persistence of application consumption data (bank statements,
+recharges, electricity bills, education fees) to PostgreSQL.
+
+write_consumption_data() resolves the application's internal id and then
+inserts each table's rows with a single multi-row INSERT
+(psycopg2.extras.execute_values), all four tables inside one transaction.
+
+ConsumptionWriteBehind moves that work off the request path: submit()
+only enqueues; a background thread borrows a pooled connection per job.
+A full queue rejects the job (returns False) rather than blocking scoring.
+"""
+
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from structured_log import api_log
+
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("ML_API_DB_WRITE_BEHIND_QUEUE", "1000"))
+
+_STOP = object()
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _bank_statement_row(app_id: int, entry: Dict[str, Any]) -> Tuple:
+    return (
+        app_id,
+        datetime.fromisoformat(entry['date']),
+        entry['description'],
+        entry.get('debit', 0),
+        entry.get('credit', 0),
+        entry['balance'],
+    )
+
+
+def _recharge_row(app_id: int, entry: Dict[str, Any]) -> Tuple:
+    return (
+        app_id,
+        datetime.fromisoformat(entry['date']),
+        entry['amount'],
+        entry['operator'],
+    )
+
+
+def _electricity_bill_row(app_id: int, entry: Dict[str, Any]) -> Tuple:
+    return (
+        app_id,
+        entry['month'],
+        datetime.fromisoformat(entry['billDate']),
+        datetime.fromisoformat(entry['dueDate']),
+        entry['amount'],
+        entry['unitsConsumed'],
+        _parse_date(entry.get('paidDate')),
+        entry.get('paidDate') is not None,
+    )
+
+
+def _education_fee_row(app_id: int, entry: Dict[str, Any]) -> Tuple:
+    return (
+        app_id,
+        entry['academicYear'],
+        entry['amount'],
+        datetime.fromisoformat(entry['dueDate']),
+        _parse_date(entry.get('paidDate')),
+        entry.get('paidDate') is not None,
+    )
+
+
+# payload key -> (INSERT ... VALUES %s, per-row template, row builder)
+CONSUMPTION_TABLES: Dict[str, Tuple[str, str, Callable[[int, Dict[str, Any]], Tuple]]] = {
+    'bank_statements': (
+        'INSERT INTO bank_statements '
+        '("applicationId", date, description, debit, credit, balance, "createdAt") VALUES %s',
+        '(%s, %s, %s, %s, %s, %s, NOW())',
+        _bank_statement_row,
+    ),
+    'recharge_data': (
+        'INSERT INTO recharge_data '
+        '("applicationId", date, amount, operator, "createdAt") VALUES %s',
+        '(%s, %s, %s, %s, NOW())',
+        _recharge_row,
+    ),
+    'electricity_bills': (
+        'INSERT INTO electricity_bills '
+        '("applicationId", month, "billDate", "dueDate", amount, '
+        '"unitsConsumed", "paidDate", "isPaid", "createdAt") VALUES %s',
+        '(%s, %s, %s, %s, %s, %s, %s, %s, NOW())',
+        _electricity_bill_row,
+    ),
+    'education_fees': (
+        'INSERT INTO education_fees '
+        '("applicationId", "academicYear", amount, "dueDate", '
+        '"paidDate", "isPaid", "createdAt") VALUES %s',
+        '(%s, %s, %s, %s, %s, %s, NOW())',
+        _education_fee_row,
+    ),
+}
+
+
+def build_consumption_rows(app_id: int, consumption_data: Dict[str, Any]) -> Dict[str, List[Tuple]]:
+    """Row tuples per payload key; keys with no entries are left out."""
+    rows = {}
+    for key, (_, _, build_row) in CONSUMPTION_TABLES.items():
+        entries = consumption_data.get(key)
+        if entries:
+            rows[key] = [build_row(app_id, entry) for entry in entries]
+    return rows
+
+
+def write_consumption_data(conn, application_id: str, consumption_data: Dict[str, Any]) -> bool:
+    """
+    Insert all consumption rows for one application in a single transaction.
+    Returns False (and writes nothing) if the application is unknown.
+    """
+    from psycopg2.extras import execute_values
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id FROM applications WHERE \"applicationId\" = %s",
+                (application_id,)
+            )
+            result = cur.fetchone()
+            if not result:
+                conn.rollback()
+                api_log.warning("application_not_in_db", application_id=application_id)
+                return False
+
+            for key, rows in build_consumption_rows(result[0], consumption_data).items():
+                sql, template, _ = CONSUMPTION_TABLES[key]
+                execute_values(cur, sql, rows, template=template, page_size=max(len(rows), 1))
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class ConsumptionWriteBehind:
+    """Background writer: one pooled connection and one transaction per job."""
+
+    def __init__(self, db_pool, queue_size: int = WRITE_BEHIND_QUEUE_SIZE):
+        self.db_pool = db_pool
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="consumption-write-behind", daemon=True)
+            self._thread.start()
+
+    def submit(self, application_id: str, consumption_data: Dict[str, Any]) -> bool:
+        """Queue a write. False if the queue is full (the data is not saved)."""
+        self.start()
+        try:
+            self._queue.put_nowait((application_id, consumption_data))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            api_log.error("consumption_write_rejected", application_id=application_id, reason="queue_full")
+            return False
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is _STOP:
+                    return
+                application_id, consumption_data = job
+                try:
+                    with self.db_pool.connection() as conn:
+                        ok = write_consumption_data(conn, application_id, consumption_data)
+                except Exception as e:
+                    ok = False
+                    api_log.error("consumption_save_failed", application_id=application_id, error=str(e))
+                with self._lock:
+                    if ok:
+                        self.written += 1
+                    else:
+                        self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Block until every queued job has been attempted."""
+        self._queue.join()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def close(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout=timeout)
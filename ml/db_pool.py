@@ -0,0 +1,98 @@
+"""
+db_pool.py
+
+Process-wide PostgreSQL connection pool for the ML API.
+
+Wraps psycopg2's ThreadedConnectionPool (imported lazily, like the rest of
+the API treats psycopg2) behind a context manager that always returns the
+connection, rolls back on error and discards connections that died. When
+every connection is checked out, callers wait up to ML_DB_POOL_TIMEOUT
+seconds instead of failing straight away.
+
+Configuration (environment):
+    ML_DB_POOL_MIN       connections opened up front (default: 1)
+    ML_DB_POOL_MAX       upper bound on open connections (default: 8)
+    ML_DB_POOL_TIMEOUT   seconds to wait for a free connection (default: 5)
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+POOL_MIN = int(os.getenv("ML_DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("ML_DB_POOL_MAX", "8"))
+POOL_TIMEOUT_SECONDS = float(os.getenv("ML_DB_POOL_TIMEOUT", "5"))
+
+
+class PoolTimeout(RuntimeError):
+    """No pooled connection became free within the timeout."""
+
+
+class DatabasePool:
+    def __init__(
+        self,
+        dsn: str,
+        minconn: int = POOL_MIN,
+        maxconn: int = POOL_MAX,
+        timeout: float = POOL_TIMEOUT_SECONDS,
+    ):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def _get_pool(self):
+        # Connections must not cross a fork: rebuild the pool in a new process
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    from psycopg2.pool import ThreadedConnectionPool
+
+                    self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+                    self._pid = os.getpid()
+                    self._slots = threading.BoundedSemaphore(self.maxconn)
+        return self._pool
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Borrow a connection. Commit is left to the caller; on an exception
+        the transaction is rolled back before the connection goes back.
+        """
+        pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+        conn = None
+        try:
+            conn = pool.getconn()
+            try:
+                yield conn
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+        finally:
+            if conn is not None:
+                pool.putconn(conn, close=bool(conn.closed))
+            slots.release()
+
+    def ping(self) -> bool:
+        """True if a pooled connection answers SELECT 1."""
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            conn.rollback()
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pid == os.getpid():
+            pool.closeall()
@@ -0,0 +1,375 @@
+"""
+district_stats.py
+
+District, state and national feature medians maintained from a stream of
+observations instead of rescans of the consumption data.
+
+Each (level, key, feature) - level being district, state or national - owns
+a KLL quantile sketch (Karnin, Lang & Liberty 2016): a stack of compactors
+where level h holds items of weight 2^h, and a full level is sorted and
+every other item promoted. Memory is O(k) per sketch whatever the number of
+observations, the rank error is about 1.7 / k, and two sketches merge by
+concatenating levels and compacting, so each worker can sketch its share
+of the data and the results are combined.
+
+DistrictStatsService keeps the sketches and a median cache. observe() and
+observe_frame() update the sketches and mark their medians stale; the next
+read recomputes each stale median once, and later reads are dict lookups.
+The service feeds the existing consumers:
+
+    district_stats() / state_stats() / national_stats()  MissingDataHandler
+    district_medians(d) / median_table()                 IncomeProxyExtractor
+
+Sketches summarize observations, not beneficiaries: re-observing a
+beneficiary adds a second sample. Rebuild (or keep one service per scoring
+window) if that matters.
+
+Configuration (environment):
+    ML_DISTRICT_SKETCH_K     KLL accuracy parameter, items at the top level (default: 200)
+    ML_DISTRICT_STATS_PATH   file used by save() / load() by default (default: district_stats.bin)
+"""
+
+import math
+import os
+import struct
+import zlib
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from income_proxies import DistrictMedians, DistrictMedianTable, DISTRICT_MEDIAN_FIELDS
+from missing_data import MissingDataHandler
+
+SKETCH_K = int(os.getenv("ML_DISTRICT_SKETCH_K", "200"))
+STATS_PATH = os.getenv("ML_DISTRICT_STATS_PATH", "district_stats.bin")
+
+LEVELS = ("district", "state", "national")
+NATIONAL = ""
+
+# DistrictMedians field -> proxy feature whose median fills it
+MEDIAN_SOURCES = {
+    "median_electricity_kwh": "avg_monthly_electricity_units",
+    "median_electricity_regularity": "electricity_payment_regularity",
+    "median_electricity_spend_trend": "electricity_spend_trend",
+    "median_recharge_amount": "avg_monthly_recharge_amount",
+    "median_recharge_frequency": "recharge_frequency_score",
+    "median_utility_diversity": "utility_diversity_score",
+    "median_lpg_frequency": "lpg_refill_frequency",
+    "median_consumption_growth_rate": "consumption_growth_rate",
+}
+# estimated_consumption_percentile: national percentile of the district's median of this feature
+CONSUMPTION_FEATURE = "avg_monthly_electricity_units"
+
+_CAPACITY_DECAY = 2.0 / 3.0
+_SKETCH_HEADER = struct.Struct("<IqqddI")  # k, count, compactions, min, max, levels
+_SERVICE_MAGIC = b"DSS"
+_SERVICE_VERSION = 1
+
+
+class QuantileSketch:
+    """KLL sketch of a stream of floats. Exact (numpy interpolation) until the first compaction."""
+
+    __slots__ = ("k", "count", "compactions", "min", "max", "levels", "_size", "_limit")
+
+    def __init__(self, k: int = SKETCH_K):
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.count = 0
+        self.compactions = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels: List[List[float]] = [[]]
+        self._size = 0
+        self._limit = self._capacity(0)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(math.ceil(self.k * _CAPACITY_DECAY ** depth)))
+
+    def _compress(self) -> None:
+        self._size = sum(map(len, self.levels))
+        self._limit = sum(self._capacity(h) for h in range(len(self.levels)))
+        while self._size > self._limit:
+            for h, items in enumerate(self.levels):
+                if len(items) >= self._capacity(h):
+                    break
+            if h + 1 == len(self.levels):
+                self.levels.append([])
+            items.sort()
+            keep = items.pop() if len(items) % 2 else None
+            # Alternate the kept half so repeated compactions do not bias the ranks
+            offset = self.compactions & 1
+            self.compactions += 1
+            self.levels[h + 1].extend(items[offset::2])
+            self.levels[h] = [] if keep is None else [keep]
+            self._size = sum(map(len, self.levels))
+            self._limit = sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def update(self, value: float) -> None:
+        value = float(value)
+        if value != value:
+            return
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.levels[0].append(value)
+        self._size += 1
+        if self._size > self._limit:
+            self._compress()
+
+    def update_many(self, values: Iterable[float]) -> None:
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0].extend(values.tolist())
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Fold other into this sketch (in place) and return self."""
+        if other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, items in enumerate(other.levels):
+            self.levels[h].extend(items)
+        self.count += other.count
+        self.compactions += other.compactions
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    @property
+    def exact(self) -> bool:
+        return len(self.levels) == 1
+
+    def _weighted(self) -> Tuple[np.ndarray, np.ndarray]:
+        values = np.concatenate([np.asarray(items, dtype=float) for items in self.levels])
+        weights = np.concatenate([np.full(len(items), 2.0 ** h) for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q: float) -> float:
+        """Value at quantile q in [0, 1]; NaN for an empty sketch."""
+        if self.count == 0:
+            return float("nan")
+        if self.exact:
+            return float(np.quantile(self.levels[0], q))
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cumulative = self._weighted()
+        return float(values[np.searchsorted(cumulative, q * cumulative[-1], side="left")])
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    def rank(self, value: float) -> float:
+        """Estimated fraction of observations <= value."""
+        if self.count == 0:
+            return float("nan")
+        values, cumulative = self._weighted()
+        position = np.searchsorted(values, value, side="right")
+        return float(cumulative[position - 1] / cumulative[-1]) if position else 0.0
+
+    def to_bytes(self) -> bytes:
+        parts = [_SKETCH_HEADER.pack(self.k, self.count, self.compactions, self.min, self.max, len(self.levels))]
+        for items in self.levels:
+            parts.append(struct.pack("<I", len(items)))
+            parts.append(np.asarray(items, dtype="<f8").tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, offset: int = 0) -> Tuple["QuantileSketch", int]:
+        """Sketch stored at blob[offset:], and the offset just past it."""
+        k, count, compactions, low, high, n_levels = _SKETCH_HEADER.unpack_from(blob, offset)
+        offset += _SKETCH_HEADER.size
+        sketch = cls(k)
+        sketch.count, sketch.compactions, sketch.min, sketch.max = count, compactions, low, high
+        sketch.levels = []
+        for _ in range(n_levels):
+            (length,) = struct.unpack_from("<I", blob, offset)
+            offset += 4
+            sketch.levels.append(np.frombuffer(blob, dtype="<f8", count=length, offset=offset).tolist())
+            offset += 8 * length
+        sketch._compress()
+        return sketch, offset
+
+
+class DistrictStatsService:
+    def __init__(self, features: Optional[Iterable[str]] = None, k: int = SKETCH_K):
+        """features limits which observed features are sketched (default: all numeric ones)."""
+        self.features = None if features is None else frozenset(features)
+        self.k = k
+        self._sketches: Dict[Tuple[str, str, str], QuantileSketch] = {}
+        self._medians: Dict[Tuple[str, str, str], float] = {}
+        self._stale = set()
+
+    # --- updates ---
+
+    def _sketch(self, key: Tuple[str, str, str]) -> QuantileSketch:
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = QuantileSketch(self.k)
+        self._stale.add(key)
+        return sketch
+
+    def _tracked(self, feature: str) -> bool:
+        return self.features is None or feature in self.features
+
+    def observe(self, district: Any, state: Any, values: Mapping[str, Any]) -> None:
+        """One beneficiary's feature values; None / NaN / non-numeric values are skipped."""
+        for feature, value in values.items():
+            if not self._tracked(feature) or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if value != value:
+                continue
+            for key in (("district", str(district), feature), ("state", str(state), feature), ("national", NATIONAL, feature)):
+                self._sketch(key).update(value)
+
+    def observe_frame(self, frame: pd.DataFrame, district_col: str = "district_code", state_col: str = "state_code") -> None:
+        """
+        Many observations at once, one row per beneficiary (e.g. the
+        IncomeProxyExtractor.compute_features_batch output joined with the
+        beneficiaries' district and state codes).
+        """
+        columns = [
+            c for c in frame.columns
+            if c not in (district_col, state_col) and self._tracked(c) and pd.api.types.is_numeric_dtype(frame[c])
+        ]
+        if not columns or frame.empty:
+            return
+        values = frame[columns]
+        for level, keys in (("district", frame[district_col]), ("state", frame[state_col]), ("national", None)):
+            groups = [(NATIONAL, values)] if keys is None else values.groupby(keys.astype(str).to_numpy(), sort=False)
+            for key, part in groups:
+                for feature in columns:
+                    self._sketch((level, key, feature)).update_many(part[feature].to_numpy(dtype=float))
+
+    def merge(self, other: "DistrictStatsService") -> "DistrictStatsService":
+        """Fold another worker's sketches into this service (in place)."""
+        for key, sketch in other._sketches.items():
+            self._sketch(key).merge(sketch)
+        return self
+
+    # --- reads ---
+
+    def median(self, level: str, key: Any, feature: str) -> Optional[float]:
+        """Cached median; None when nothing was observed."""
+        cache_key = (level, NATIONAL if level == "national" else str(key), feature)
+        if cache_key in self._stale:
+            self._stale.discard(cache_key)
+            self._medians[cache_key] = self._sketches[cache_key].median()
+        return self._medians.get(cache_key)
+
+    def quantile(self, level: str, key: Any, feature: str, q: float) -> Optional[float]:
+        sketch = self._sketches.get((level, NATIONAL if level == "national" else str(key), feature))
+        return sketch.quantile(q) if sketch is not None else None
+
+    def refresh(self) -> None:
+        """Recompute every stale median now (e.g. before forking or exporting)."""
+        for key in list(self._stale):
+            self.median(*key)
+
+    def _level_stats(self, level: str) -> Dict[str, Dict[str, float]]:
+        self.refresh()
+        stats: Dict[str, Dict[str, float]] = {}
+        for (sketch_level, key, feature), value in self._medians.items():
+            if sketch_level == level:
+                stats.setdefault(key, {})[feature] = value
+        return stats
+
+    def district_stats(self) -> Dict[str, Dict[str, float]]:
+        return self._level_stats("district")
+
+    def state_stats(self) -> Dict[str, Dict[str, float]]:
+        return self._level_stats("state")
+
+    def national_stats(self) -> Dict[str, float]:
+        return self._level_stats("national").get(NATIONAL, {})
+
+    def missing_data_handler(self) -> MissingDataHandler:
+        return MissingDataHandler(self.district_stats(), self.state_stats(), self.national_stats())
+
+    def district_medians(self, district: Any) -> DistrictMedians:
+        """
+        DistrictMedians for one district. A feature without district
+        observations uses the national median, and then the dataclass default.
+        """
+        defaults = DistrictMedians()
+        values = {}
+        for field, feature in MEDIAN_SOURCES.items():
+            value = self.median("district", district, feature)
+            if value is None:
+                value = self.median("national", NATIONAL, feature)
+            values[field] = getattr(defaults, field) if value is None else value
+        consumption = self.median("district", district, CONSUMPTION_FEATURE)
+        national = self._sketches.get(("national", NATIONAL, CONSUMPTION_FEATURE))
+        if consumption is not None and national is not None:
+            values["estimated_consumption_percentile"] = round(national.rank(consumption) * 100.0, 2)
+        else:
+            values["estimated_consumption_percentile"] = defaults.estimated_consumption_percentile
+        return DistrictMedians(**values)
+
+    def districts(self) -> List[str]:
+        return sorted({key for level, key, _ in self._sketches if level == "district"})
+
+    def median_table(self) -> DistrictMedianTable:
+        """Every observed district's DistrictMedians, for compute_features_batch()."""
+        districts = self.districts()
+        rows = [[getattr(self.district_medians(d), f) for f in DISTRICT_MEDIAN_FIELDS] for d in districts]
+        return DistrictMedianTable(districts, rows)
+
+    # --- persistence ---
+
+    def to_bytes(self) -> bytes:
+        """zlib-compressed sketches; medians are recomputed on load."""
+        parts = [struct.pack("<I", len(self._sketches))]
+        for (level, key, feature), sketch in self._sketches.items():
+            for text in (level, key, feature):
+                encoded = text.encode("utf-8")
+                parts.append(struct.pack(f"<H{len(encoded)}s", len(encoded), encoded))
+            parts.append(sketch.to_bytes())
+        return _SERVICE_MAGIC + struct.pack("<B", _SERVICE_VERSION) + zlib.compress(b"".join(parts))
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, features: Optional[Iterable[str]] = None) -> "DistrictStatsService":
+        if blob[:3] != _SERVICE_MAGIC or blob[3] != _SERVICE_VERSION:
+            raise ValueError(f"Not a district stats (version {_SERVICE_VERSION}) blob")
+        payload = zlib.decompress(blob[4:])
+        (n_sketches,) = struct.unpack_from("<I", payload, 0)
+        offset = 4
+        service = None
+        for _ in range(n_sketches):
+            key = []
+            for _ in range(3):
+                (length,) = struct.unpack_from("<H", payload, offset)
+                key.append(payload[offset + 2:offset + 2 + length].decode("utf-8"))
+                offset += 2 + length
+            sketch, offset = QuantileSketch.from_bytes(payload, offset)
+            if service is None:
+                service = cls(features, k=sketch.k)
+            service._sketches[tuple(key)] = sketch
+            service._stale.add(tuple(key))
+        return service if service is not None else cls(features)
+
+    def save(self, path: str = STATS_PATH) -> None:
+        """Write atomically, so readers never load a half-written file."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(self.to_bytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = STATS_PATH, features: Optional[Iterable[str]] = None) -> "DistrictStatsService":
+        with open(path, "rb") as fh:
+            return cls.from_bytes(fh.read(), features)
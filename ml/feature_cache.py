@@ -0,0 +1,221 @@
+"""
+feature_cache.py
+
+Per-process L1 cache of feature dicts in front of FeatureStore's Redis tier.
+
+FeatureL1Cache is a bounded LRU with a TTL, so a hot beneficiary rescored
+again within minutes is answered from process memory without a network
+round trip. Entries are the decoded dicts themselves: callers share them
+and must not mutate them. Like FeatureStore, the cache belongs to one
+event loop and takes no locks; a hit is a dict lookup, a clock read and
+an LRU move.
+
+Coherence across processes goes over a Redis pub/sub channel. Whenever
+FeatureStore.write_features or bulk_write touches a beneficiary, the
+writing process drops its own entry and publishes the beneficiary ids;
+every other process listening on the channel drops them too. While the
+listener is not subscribed (not started yet, or reconnecting after a
+dropped connection) the cache is empty and stores nothing, because
+invalidations sent in the meantime would be lost.
+
+Version stamps close the stale-after-write race. A read takes stamp()
+before going to Redis or Postgres, and every invalidation stamps its
+beneficiaries with a new, higher version. put() is refused when the
+beneficiary was invalidated after the read's stamp was taken, so a value
+read before a write cannot land in the cache after that write's
+invalidation. Invalidation stamps are kept for the most recent
+max_entries beneficiaries; stamps older than the evicted ones are refused
+as a whole.
+
+    cache = FeatureL1Cache()
+    store = FeatureStore(redis_client, session_maker, l1=cache)
+    await cache.start(redis_client)   # listener task; await cache.stop() on shutdown
+
+Configuration (environment):
+    ML_FEATURE_L1_SIZE     feature dicts kept per process (default: 50000; 0 disables)
+    ML_FEATURE_L1_TTL      seconds an entry lives (default: 120)
+    ML_FEATURE_L1_CHANNEL  pub/sub channel for invalidations (default: features:invalidate)
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import structlog
+from prometheus_client import Counter
+
+L1_SIZE = int(os.getenv("ML_FEATURE_L1_SIZE", "50000"))
+L1_TTL = float(os.getenv("ML_FEATURE_L1_TTL", "120"))
+L1_CHANNEL = os.getenv("ML_FEATURE_L1_CHANNEL", "features:invalidate")
+
+RESUBSCRIBE_DELAY_SECONDS = 1.0
+
+logger = structlog.get_logger()
+
+L1_INVALIDATIONS = Counter(
+    "feature_l1_invalidations_total",
+    "Beneficiaries dropped from the L1 feature cache",
+    ["source"],  # local | remote
+)
+
+
+class FeatureL1Cache:
+    def __init__(self, max_entries: int = L1_SIZE, ttl: float = L1_TTL, channel: str = L1_CHANNEL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()  # bid -> version stamp
+        self._version = 0
+        self._floor = 0  # stamps below this may predate a forgotten invalidation
+        self._subscribed = False
+        self._listener: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.refused = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def active(self) -> bool:
+        """Serving and storing entries: enabled and subscribed to invalidations."""
+        return self._subscribed and self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- entries ---
+
+    def get(self, bid: str) -> Optional[Dict]:
+        entry = self._entries.get(bid)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[bid]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(bid)
+        self.hits += 1
+        return entry[1]
+
+    def stamp(self) -> int:
+        """Version to pass to put() for a value about to be read from a lower tier."""
+        return self._version
+
+    def put(self, bid: str, features: Dict, stamp: int) -> bool:
+        """Store features read under stamp, unless bid was invalidated since. Returns whether stored."""
+        if not self.active or stamp < self._floor or self._invalidated.get(bid, 0) > stamp:
+            self.refused += 1
+            return False
+        self._entries[bid] = (time.monotonic() + self.ttl, features)
+        self._entries.move_to_end(bid)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, bids: Iterable[str], source: str = "local") -> int:
+        """Drop bids and stamp them with a new version. Returns how many were dropped."""
+        dropped = 0
+        self._version += 1
+        version = self._version
+        for bid in bids:
+            dropped += self._entries.pop(bid, None) is not None
+            self._invalidated[bid] = version
+            self._invalidated.move_to_end(bid)
+        while len(self._invalidated) > max(self.max_entries, 1):
+            _, forgotten = self._invalidated.popitem(last=False)
+            self._floor = max(self._floor, forgotten)
+        if dropped:
+            L1_INVALIDATIONS.labels(source).inc(dropped)
+        return dropped
+
+    def clear(self) -> None:
+        """Drop every entry and refuse puts of reads already in flight."""
+        self._entries.clear()
+        self._invalidated.clear()
+        self._version += 1
+        self._floor = self._version
+
+    # --- pub/sub ---
+
+    async def publish(self, redis, bids: List[str]) -> None:
+        """Invalidate bids here and in every process subscribed to the channel."""
+        self.invalidate(bids)
+        if not bids:
+            return
+        try:
+            await redis.publish(self.channel, json.dumps({"origin": self.origin, "bids": bids}))
+        except Exception as e:
+            logger.warning("feature_l1_publish_failed", batch_size=len(bids), error=str(e))
+
+    def handle_message(self, data) -> None:
+        try:
+            message = json.loads(data)
+            if message.get("origin") == self.origin:
+                return  # already invalidated locally by publish()
+            bids = message["bids"]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning("feature_l1_bad_message", error=str(e))
+            self.clear()
+            return
+        self.invalidate(bids, source="remote")
+
+    async def start(self, redis) -> bool:
+        """
+        Start the invalidation listener and wait for its first subscribe
+        attempt. Returns whether the cache is active; after a failed attempt
+        the listener keeps retrying in the background.
+        """
+        if not self.enabled:
+            return False
+        if self._listener is None:
+            subscribed = asyncio.get_running_loop().create_future()
+            self._listener = asyncio.create_task(self._listen(redis, subscribed))
+            await subscribed
+        return self.active
+
+    async def stop(self) -> None:
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.cancel()
+            try:
+                await listener
+            except asyncio.CancelledError:
+                pass
+        self._subscribed = False
+        self.clear()
+
+    async def _listen(self, redis, subscribed: "asyncio.Future") -> None:
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                self.clear()
+                self._subscribed = True
+                if not subscribed.done():
+                    subscribed.set_result(True)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.handle_message(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("feature_l1_subscription_lost", channel=self.channel, error=str(e))
+                if not subscribed.done():
+                    subscribed.set_result(False)
+            finally:
+                self._subscribed = False
+                self.clear()
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+            await asyncio.sleep(RESUBSCRIBE_DELAY_SECONDS)
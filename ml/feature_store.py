@@ -1,7 +1,8 @@
-import json
 import asyncio
+import struct
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 import structlog
 from prometheus_client import Histogram, Counter, Gauge
 
@@ -12,6 +13,9 @@ from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 import uuid
 
+from feature_cache import FeatureL1Cache
+from feature_codec import FeatureCodec, FeatureSchema
+
 logger = structlog.get_logger()
 
 # --- Prometheus Metrics ---
@@ -22,6 +26,18 @@ FEATURE_WRITE_LATENCY = Histogram(
 CACHE_HITS = Counter('feature_cache_hits_total', 'Number of feature reads served from Redis')
 CACHE_MISSES = Counter('feature_cache_misses_total', 'Number of feature reads falling back to Postgres')
 STALE_COUNT = Gauge('stale_feature_count', 'Number of beneficiaries with features older than threshold')
+BATCH_HIT_RATIO = Histogram(
+    'feature_batch_cache_hit_ratio',
+    'Share of each read_many batch served from Redis',
+    buckets=(0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1.0)
+)
+BATCH_SIZE = Histogram(
+    'feature_batch_read_size',
+    'Beneficiaries requested per read_many call',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+
+REWARM_TTL_SECONDS = 30 * 86400
 
 # --- SQLAlchemy Model ---
 class Base(DeclarativeBase):
@@ -39,14 +55,19 @@ class FeatureVector(Base):
 
 # --- Core Feature Store ---
 class FeatureStore:
-    def __init__(self, redis_client, db_session_maker):
+    def __init__(self, redis_client, db_session_maker, codec: Optional[FeatureCodec] = None,
+                 l1: Optional[FeatureL1Cache] = None):
         """
         Dependency Injection Architecture
-        :param redis_client: active aioredis client
+        :param redis_client: active aioredis client (decode_responses=False for binary entries)
         :param db_session_maker: async_sessionmaker for PostgreSQL
+        :param codec: Redis value encoding; without a registered schema entries stay JSON
+        :param l1: optional in-process cache in front of Redis (start its listener separately)
         """
         self.redis = redis_client
         self.db_session_maker = db_session_maker
+        self.codec = codec if codec is not None else FeatureCodec()
+        self.l1 = l1
 
     def _redis_key(self, bid: str) -> str:
         return f"features:{bid}"
@@ -74,7 +95,7 @@ class FeatureStore:
                 await session.commit()
 
         async def write_redis():
-            payload = json.dumps(features)
+            payload = self.codec.encode(features)
             await self.redis.set(self._redis_key(bid), payload, ex=ttl_days * 86400)
 
         try:
@@ -84,15 +105,29 @@ class FeatureStore:
         except Exception as e:
             logger.error("feature_write_failed", beneficiary_id=bid, error=str(e))
             return False
+        finally:
+            if self.l1 is not None:
+                await self.l1.publish(self.redis, [bid])
 
     async def read_features(self, bid: str) -> Optional[Dict]:
-        """Cache-aside: Read from Redis, fallback to PG and re-warm."""
+        """Cache-aside: Read from L1 and Redis, fallback to PG and re-warm."""
+        # 0. Try the in-process L1
+        l1 = self.l1
+        if l1 is not None:
+            features = l1.get(bid)
+            if features is not None:
+                return features
+            stamp = l1.stamp()
+
         # 1. Try Redis
         try:
             cached = await self.redis.get(self._redis_key(bid))
-            if cached:
+            if cached and self.codec.can_decode(cached):
                 CACHE_HITS.inc()
-                return json.loads(cached)
+                features = self.codec.decode(cached)
+                if l1 is not None and features is not None:
+                    l1.put(bid, features, stamp)
+                return features
         except Exception as e:
             logger.warning("redis_read_failed", error=str(e))
             
@@ -109,14 +144,132 @@ class FeatureStore:
                 
                 if row and row[0]:
                     features = row[0]
+                    if l1 is not None:
+                        l1.put(bid, features, stamp)
                     # 3. Re-warm Cache asynchronously (fire and forget)
-                    asyncio.create_task(self.redis.set(self._redis_key(bid), json.dumps(features), ex=30 * 86400))
+                    asyncio.create_task(self.redis.set(self._redis_key(bid), self.codec.encode(features), ex=REWARM_TTL_SECONDS))
                     return features
         except Exception as e:
             logger.error("postgres_read_failed", beneficiary_id=bid, error=str(e))
             
         return None
 
+    async def read_many(self, bids: List[str]) -> List[Optional[Dict]]:
+        """
+        Batched read_features: one Redis MGET, one Postgres query for all
+        misses, and one pipelined re-warm. Results follow the order of bids,
+        with None for beneficiaries found in neither store.
+        """
+        return await self._read_entries(bids, decode=True)
+
+    async def read_matrix(self, bids: List[str], schema: Optional[FeatureSchema] = None) -> np.ndarray:
+        """
+        read_many straight into a (len(bids), len(schema)) float64 matrix in
+        the column order of schema (default: the codec's current schema).
+        Binary entries skip the dict entirely (and so do not fill the L1);
+        absent features and beneficiaries found nowhere are NaN.
+        """
+        return self.codec.decode_matrix(await self._read_entries(bids, decode=False), schema)
+
+    async def _read_entries(self, bids: List[str], decode: bool) -> List[Any]:
+        """
+        Per bid: the L1 dict, else the Redis entry (decoded to a dict when
+        decode), else the Postgres dict, else None. Only beneficiaries the
+        L1 lacks go to Redis.
+        """
+        l1 = self.l1
+        if l1 is None:
+            entries: List[Any] = [None] * len(bids)
+            rest = list(range(len(bids)))
+        else:
+            stamp = l1.stamp()
+            entries = [l1.get(bid) for bid in bids]
+            rest = [i for i, entry in enumerate(entries) if entry is None]
+        if not rest:
+            return entries
+
+        rest_bids = [bids[i] for i in rest]
+        cached, found = await self._read_batch(rest_bids, decode)
+        for i, bid, entry in zip(rest, rest_bids, cached):
+            if entry is None:
+                entry = found.get(bid)
+            entries[i] = entry
+            if l1 is not None and isinstance(entry, dict):
+                l1.put(bid, entry, stamp)
+        return entries
+
+    def _cached_entry(self, raw: Any, decode: bool) -> Any:
+        """
+        A Redis value as a dict (binary entries stay raw unless decode), or
+        None when it is missing, of an unknown schema version (written by a
+        newer process) or corrupt.
+        """
+        if not raw:
+            return None
+        codec = self.codec
+        try:
+            if not codec.can_decode(raw):
+                return None
+            if not decode and not codec.is_json(raw):
+                return raw
+            features = codec.decode(raw)
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            logger.warning("redis_entry_decode_failed", error=str(e))
+            return None
+        return features if isinstance(features, dict) else None
+
+    async def _read_batch(self, bids: List[str], decode: bool = True) -> Tuple[List[Any], Dict[str, Dict]]:
+        """
+        Usable Redis entry per bid (see _cached_entry; None on a miss), and
+        Postgres features of the missed beneficiaries.
+        """
+        if not bids:
+            return [], {}
+        BATCH_SIZE.observe(len(bids))
+
+        # 1. Try Redis: a single MGET for the whole batch
+        try:
+            cached = await self.redis.mget([self._redis_key(bid) for bid in bids])
+        except Exception as e:
+            logger.warning("redis_mget_failed", batch_size=len(bids), error=str(e))
+            cached = [None] * len(bids)
+
+        # Undecodable entries count as misses and are read from Postgres
+        cached = [self._cached_entry(raw, decode) for raw in cached]
+        misses = [i for i, entry in enumerate(cached) if entry is None]
+        CACHE_HITS.inc(len(bids) - len(misses))
+        CACHE_MISSES.inc(len(misses))
+        BATCH_HIT_RATIO.observe((len(bids) - len(misses)) / len(bids))
+        if not misses:
+            return cached, {}
+
+        # 2. Try PostgreSQL: every distinct miss in one ANY(:bids) query
+        missing = list(dict.fromkeys(bids[i] for i in misses))
+        try:
+            async with self.db_session_maker() as session:
+                result = await session.execute(
+                    text("SELECT beneficiary_id, features FROM feature_vectors WHERE beneficiary_id = ANY(:bids)"),
+                    {"bids": missing}
+                )
+                found = {row[0]: row[1] for row in result.fetchall() if row[1]}
+        except Exception as e:
+            logger.error("postgres_batch_read_failed", batch_size=len(missing), error=str(e))
+            return cached, {}
+
+        # 3. Re-warm Cache through one pipeline (fire and forget)
+        if found:
+            asyncio.create_task(self._rewarm(found))
+        return cached, found
+
+    async def _rewarm(self, features_by_bid: Dict[str, Dict]) -> None:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for bid, features in features_by_bid.items():
+                pipe.set(self._redis_key(bid), self.codec.encode(features), ex=REWARM_TTL_SECONDS)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("redis_rewarm_failed", batch_size=len(features_by_bid), error=str(e))
+
     async def get_feature_age(self, bid: str) -> Optional[timedelta]:
         """Returns the age of the feature vector from Postgres."""
         async with self.db_session_maker() as session:
@@ -164,4 +317,13 @@ class FeatureStore:
             )
             result = await session.execute(stmt)
             await session.commit()
-            return result.rowcount
+
+        # Drop the now stale Redis copies; the next read re-warms from Postgres
+        bids = [record["beneficiary_id"] for record in records]
+        try:
+            await self.redis.delete(*[self._redis_key(bid) for bid in bids])
+        except Exception as e:
+            logger.warning("redis_bulk_delete_failed", batch_size=len(bids), error=str(e))
+        if self.l1 is not None:
+            await self.l1.publish(self.redis, bids)
+        return result.rowcount
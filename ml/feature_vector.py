@@ -0,0 +1,92 @@
+"""
+feature_vector.py
+
+Array-native feature vector assembly for the scoring hot path.
+
+FeatureVectorAssembler is compiled once from feature_order.pkl: the column
+order becomes a single operator.itemgetter, so filling a row is one C-level
+lookup plus one buffer write into a preallocated float64 array. Missing
+features raise MissingFeatureError naming every absent column rather than
+surfacing later as a NaN or a pandas KeyError.
+
+compile_scaler() turns a fitted StandardScaler into the same affine
+transform sklearn applies (x - mean_) / scale_, done directly on the array.
+That skips sklearn's per-call input validation and the feature-name check
+that fires when a scaler fitted on a DataFrame receives a raw array. Other
+scalers fall back to scaler.transform.
+"""
+
+import operator
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class MissingFeatureError(KeyError):
+    """Feature dict is missing columns required by feature_order."""
+
+    def __init__(self, missing: Sequence[str]):
+        self.missing = list(missing)
+        super().__init__(f"Missing features: {', '.join(self.missing)}")
+
+    def __str__(self):
+        return self.args[0]
+
+
+class FeatureVectorAssembler:
+    def __init__(self, feature_order: Sequence[str]):
+        self.feature_order = list(feature_order)
+        if not self.feature_order:
+            raise ValueError("feature_order is empty")
+        self.n_features = len(self.feature_order)
+        self.column_index: Dict[str, int] = {name: i for i, name in enumerate(self.feature_order)}
+        getter = operator.itemgetter(*self.feature_order)
+        if self.n_features == 1:
+            self._get = lambda features: (getter(features),)
+        else:
+            self._get = getter
+
+    def _missing(self, features: Dict[str, Any]) -> MissingFeatureError:
+        return MissingFeatureError([k for k in self.feature_order if k not in features])
+
+    def row(self, features: Dict[str, Any], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Single (1, n_features) float64 row in feature_order."""
+        if out is None:
+            out = np.empty((1, self.n_features), dtype=np.float64)
+        try:
+            out[0] = self._get(features)
+        except KeyError:
+            raise self._missing(features) from None
+        return out
+
+    def matrix(self, features_list: List[Dict[str, Any]], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """(len(features_list), n_features) float64 matrix in feature_order."""
+        if out is None:
+            out = np.empty((len(features_list), self.n_features), dtype=np.float64)
+        get = self._get
+        for i, features in enumerate(features_list):
+            try:
+                out[i] = get(features)
+            except KeyError:
+                raise self._missing(features) from None
+        return out
+
+
+def compile_scaler(scaler: Any) -> Callable[[np.ndarray], np.ndarray]:
+    """Array-in, array-out transform equivalent to scaler.transform."""
+    mean = getattr(scaler, "mean_", None)
+    scale = getattr(scaler, "scale_", None)
+    if type(scaler).__name__ == "StandardScaler" and (mean is not None or scale is not None):
+        with_mean = getattr(scaler, "with_mean", True) and mean is not None
+        with_std = getattr(scaler, "with_std", True) and scale is not None
+
+        def transform(X: np.ndarray) -> np.ndarray:
+            X = np.array(X, dtype=np.float64, copy=True)
+            if with_mean:
+                X -= mean
+            if with_std:
+                X /= scale
+            return X
+
+        return transform
+    return scaler.transform
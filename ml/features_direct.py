@@ -7,6 +7,8 @@ instead of reading from offline CSV/JSON files.
 This is used when user submits their data through the application form.
 """
 
+from model_registry import registry
+
 def extract_features_from_application_data(application_data: dict) -> dict:
     """
     Extract features directly from application form data.
@@ -162,15 +164,7 @@ def extract_features_from_application_data(application_data: dict) -> dict:
     
     # Suspicion score (income vs lifestyle mismatch)
     # Use dynamic income barrier from trained model instead of hardcoded value
-    import os as _os, json as _json
-    _ROOT = _os.path.dirname(__file__)
-    _META_PATH = _os.path.join(_ROOT, "models", "model_metadata.json")
-    try:
-        with open(_META_PATH, "r") as _f:
-            _meta = _json.load(_f)
-            _income_barrier = float(_meta.get("dynamic_income_barrier", 15000))
-    except Exception:
-        _income_barrier = 15000
+    _income_barrier = registry.policy().dynamic_income_barrier
 
     declared_income = features["declared_income"]
     if declared_income < _income_barrier:
@@ -0,0 +1,21 @@
+"""
+gunicorn settings for the ML API with models shared across workers.
+
+    cd ml && gunicorn -c gunicorn.conf.py application_api:app
+
+The app is imported once in the master (preload_app); with ML_API_PRELOAD=1
+application_api loads the model registry there and gc.freeze()s the heap,
+so every forked worker serves from the same copy-on-write pages.
+MODEL_REGISTRY_MMAP=1 additionally file-backs the NumPy arrays, which keeps
+them shared after a hot reload inside a worker.
+"""
+
+import os
+
+os.environ.setdefault("ML_API_PRELOAD", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8002')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
@@ -0,0 +1,153 @@
+"""
+health_monitor.py
+
+Background-refreshed health snapshot for the ML API probes.
+
+Kubernetes probes every few seconds on every replica; running a database
+connection and model check on each probe adds load exactly when the pod is
+busiest. HealthMonitor runs the checks on its own daemon thread every
+refresh_interval seconds and publishes an immutable snapshot, so /readyz
+and /health just return the current snapshot.
+
+On start() the thread first runs the warmup callable (a synthetic
+prediction), so a pod only reports ready after its first real scoring
+would be warm.
+
+Configuration (environment):
+    ML_API_HEALTH_REFRESH_SECONDS  check interval (default: 10)
+    ML_API_READY_REQUIRES_DB       1 to report not-ready while the database
+                                   is unreachable (default: 0; scoring does
+                                   not need the database)
+"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+HEALTH_REFRESH_SECONDS = float(os.getenv("ML_API_HEALTH_REFRESH_SECONDS", "10"))
+READY_REQUIRES_DB = os.getenv("ML_API_READY_REQUIRES_DB", "0") == "1"
+
+
+@dataclass(frozen=True)
+class HealthSnapshot:
+    ready: bool = False
+    database: str = "unknown"
+    model_loaded: bool = False
+    model_version: Optional[str] = None
+    warmed_up: bool = False
+    warmup_ms: Optional[float] = None
+    checked_at: Optional[str] = None
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "not_ready",
+            "ready": self.ready,
+            "database": self.database,
+            "model_loaded": self.model_loaded,
+            "model_version": self.model_version,
+            "warmed_up": self.warmed_up,
+            "warmup_ms": self.warmup_ms,
+            "checked_at": self.checked_at,
+            "errors": dict(self.errors),
+        }
+
+
+class HealthMonitor:
+    def __init__(
+        self,
+        db_check: Callable[[], bool],
+        model_check: Callable[[], Tuple[bool, Optional[str]]],
+        warmup: Callable[[], None],
+        refresh_interval: float = HEALTH_REFRESH_SECONDS,
+        require_db: bool = READY_REQUIRES_DB,
+    ):
+        self.db_check = db_check
+        self.model_check = model_check
+        self.warmup = warmup
+        self.refresh_interval = refresh_interval
+        self.require_db = require_db
+        self._snapshot = HealthSnapshot()
+        self._warmed_up = False
+        self._warmup_ms: Optional[float] = None
+        self._warmup_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def snapshot(self) -> HealthSnapshot:
+        """Latest published snapshot; never runs a check."""
+        return self._snapshot
+
+    def run_warmup(self) -> None:
+        start = datetime.now()
+        self.warmup()
+        self._warmup_ms = round((datetime.now() - start).total_seconds() * 1000, 2)
+        self._warmed_up = True
+
+    def refresh(self) -> HealthSnapshot:
+        """Run every check once and publish the result."""
+        errors: Dict[str, str] = {}
+
+        try:
+            model_loaded, model_version = self.model_check()
+        except Exception as exc:
+            model_loaded, model_version = False, None
+            errors["model"] = str(exc)
+
+        # A hot-swapped model version gets its own warmup before counting as ready
+        if model_loaded and (not self._warmed_up or model_version != self._warmup_version):
+            try:
+                self.run_warmup()
+                self._warmup_version = model_version
+            except Exception as exc:
+                self._warmed_up = False
+                errors["warmup"] = str(exc)
+
+        try:
+            database = "connected" if self.db_check() else "disconnected"
+        except Exception as exc:
+            database = "disconnected"
+            errors["database"] = str(exc)
+
+        ready = model_loaded and self._warmed_up and (database == "connected" or not self.require_db)
+        snapshot = HealthSnapshot(
+            ready=ready,
+            database=database,
+            model_loaded=model_loaded,
+            model_version=model_version,
+            warmed_up=self._warmed_up,
+            warmup_ms=self._warmup_ms,
+            checked_at=datetime.now().isoformat(),
+            errors=errors,
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    def start(self) -> None:
+        """Warm up and check on a daemon thread, then re-check every refresh_interval."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+
+            def _run():
+                while True:
+                    try:
+                        self.refresh()
+                    except Exception:
+                        pass
+                    if self._stop.wait(self.refresh_interval):
+                        return
+
+            self._thread = threading.Thread(target=_run, name="health-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
@@ -1,8 +1,23 @@
+"""
+income_proxies.py
+
+Consumption-based income proxies from utility and telecom billing records.
+
+compute_features() scores one beneficiary from lists of record dicts and a
+DistrictMedians fallback. compute_features_batch() computes the same 12
+proxies for many beneficiaries from columnar utility / telecom DataFrames:
+billing dates are parsed once per distinct value, every proxy is a
+bincount over the whole table, and the fallbacks are gathered from a
+DistrictMedianTable (one float64 row per district) by district code, so
+no per-beneficiary objects are built. Results equal compute_features()
+up to rounding in the last digits of the trend slope.
+"""
+
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Mapping, Optional, Union
 from datetime import datetime, timedelta
-from dataclasses import dataclass
+from dataclasses import astuple, dataclass, fields
 
 @dataclass
 class DistrictMedians:
@@ -16,6 +31,44 @@ class DistrictMedians:
     estimated_consumption_percentile: float = 50.0
     median_consumption_growth_rate: float = 0.0
 
+DISTRICT_MEDIAN_FIELDS = tuple(f.name for f in fields(DistrictMedians))
+
+
+class DistrictMedianTable:
+    """
+    DistrictMedians for many districts as one array: values[i] holds the
+    DISTRICT_MEDIAN_FIELDS of districts[i].
+    """
+
+    def __init__(self, districts, values):
+        self.districts = pd.Index(districts)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.districts), len(DISTRICT_MEDIAN_FIELDS))
+        if not self.districts.is_unique:
+            raise ValueError("District median table has duplicate districts")
+
+    @classmethod
+    def from_medians(cls, medians: Mapping[Any, DistrictMedians]) -> "DistrictMedianTable":
+        return cls(list(medians), [astuple(m) for m in medians.values()])
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, district_col: str = "district") -> "DistrictMedianTable":
+        """One row per district; missing median columns take the DistrictMedians defaults."""
+        defaults = DistrictMedians()
+        columns = [
+            frame[name].to_numpy(dtype=float) if name in frame else np.full(len(frame), getattr(defaults, name))
+            for name in DISTRICT_MEDIAN_FIELDS
+        ]
+        return cls(frame[district_col].to_numpy(), np.column_stack(columns) if len(frame) else [])
+
+    def codes(self, districts) -> np.ndarray:
+        """Row index per district, -1 for districts without medians."""
+        return self.districts.get_indexer(pd.Index(districts))
+
+    def medians(self, district) -> DistrictMedians:
+        """Single-district DistrictMedians for compute_features()."""
+        return DistrictMedians(*self.values[self.districts.get_loc(district)])
+
+
 FEATURE_METADATA = {
     "avg_monthly_electricity_units": {
         "expected_range": "0 - 5000 kWh",
@@ -79,12 +132,74 @@ FEATURE_METADATA = {
     }
 }
 
+PROXY_FEATURES = list(FEATURE_METADATA)
+
+_NAT = np.iinfo(np.int64).min
+_DIGITAL_METHODS = ["upi", "card", "netbanking", "digital"]
+
+
+def _parse_date_column(values: Optional[pd.Series], n_rows: int) -> np.ndarray:
+    """
+    Nanosecond timestamps (int64, _NAT when missing) with the rules of
+    IncomeProxyExtractor._parse_date. Each distinct value is parsed once.
+    """
+    out = np.full(n_rows, _NAT, dtype=np.int64)
+    if values is None or n_rows == 0:
+        return out
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        parsed = pd.DatetimeIndex(values).as_unit("ns").asi8
+    else:
+        codes, uniques = pd.factorize(values, sort=False)
+        parsed_uniques = np.array([
+            pd.Timestamp(d).as_unit("ns").value if d is not None else _NAT
+            for d in map(IncomeProxyExtractor._parse_date, uniques)
+        ], dtype=np.int64)
+        if not len(parsed_uniques):
+            return out
+        parsed = np.where(codes >= 0, parsed_uniques[np.maximum(codes, 0)], _NAT)
+    valid = parsed != _NAT
+    # compute_features compares Python datetimes: microsecond resolution
+    out[valid] = parsed[valid] // 1000 * 1000
+    return out
+
+
+def _stamp(value: datetime) -> int:
+    return pd.Timestamp(value).as_unit("ns").value
+
+
+class _RecordColumns:
+    """The columns of one billing table that the proxies read, as arrays."""
+
+    def __init__(self, frame: pd.DataFrame, groups: np.ndarray):
+        n = len(frame)
+        self.groups = groups
+        self.dates = _parse_date_column(frame.get("billing_date"), n)
+        self.amounts = self._numeric(frame, "amount")
+        self.units = self._numeric(frame, "units_consumed_kwh")
+        self.types = self._text(frame, "type").str.lower().to_numpy()
+        self.status = self._text(frame, "payment_status").str.upper().to_numpy()
+        self.digital = self._text(frame, "payment_method").str.lower().isin(_DIGITAL_METHODS).to_numpy()
+
+    @staticmethod
+    def _numeric(frame: pd.DataFrame, column: str) -> np.ndarray:
+        if column not in frame:
+            return np.zeros(len(frame))
+        return np.nan_to_num(pd.to_numeric(frame[column]).to_numpy(dtype=float, na_value=np.nan), nan=0.0)
+
+    @staticmethod
+    def _text(frame: pd.DataFrame, column: str) -> pd.Series:
+        if column not in frame:
+            return pd.Series([""] * len(frame), index=frame.index, dtype=object)
+        return frame[column].where(frame[column].notna(), "").astype(str)
+
+
 class IncomeProxyExtractor:
     def __init__(self, reference_date: datetime = None):
         self.reference_date = reference_date or datetime.utcnow()
         self.six_months_ago = self.reference_date - timedelta(days=180)
 
-    def _parse_date(self, date_val) -> datetime:
+    @staticmethod
+    def _parse_date(date_val) -> datetime:
         if pd.isna(date_val) or not date_val:
             return None
         if isinstance(date_val, datetime):
@@ -110,22 +225,22 @@ class IncomeProxyExtractor:
         all_records = utility_records + telecom_records
         
         # Helper: Ensure date formats are proper and filter last 6 months
+        # (parsed date, record) pairs; the caller's dicts are left untouched
         recent_utils = []
         for r in utility_records:
             d = self._parse_date(r.get("billing_date"))
             if d and d >= self.six_months_ago:
-                r["_parsed_date"] = d
-                recent_utils.append(r)
+                recent_utils.append((d, r))
                 
         recent_telecoms = []
         for r in telecom_records:
             d = self._parse_date(r.get("billing_date"))
             if d and d >= self.six_months_ago:
-                r["_parsed_date"] = d
                 recent_telecoms.append(r)
 
         # 1. avg_monthly_electricity_units
-        elec_records = [r for r in recent_utils if str(r.get("type")).lower() == "electricity"]
+        dated_elec = [(d, r) for d, r in recent_utils if str(r.get("type")).lower() == "electricity"]
+        elec_records = [r for _, r in dated_elec]
         if len(elec_records) < 3:
             if not district_medians: raise ValueError("district_medians required when fewer than 3 records are available")
             features["avg_monthly_electricity_units"] = district_medians.median_electricity_kwh
@@ -146,8 +261,8 @@ class IncomeProxyExtractor:
             if not district_medians: raise ValueError("district_medians required when fewer than 3 records are available")
             features["electricity_spend_trend"] = district_medians.median_electricity_spend_trend
         else:
-            sorted_elec = sorted(elec_records, key=lambda x: x["_parsed_date"])
-            amounts = [float(r.get("amount", 0)) for r in sorted_elec]
+            sorted_elec = sorted(dated_elec, key=lambda x: x[0])
+            amounts = [float(r.get("amount", 0)) for _, r in sorted_elec]
             x = np.arange(len(amounts))
             try:
                 slope, _ = np.polyfit(x, amounts, 1)
@@ -230,3 +345,123 @@ class IncomeProxyExtractor:
                 features["consumption_growth_rate"] = 0.0
 
         return features
+
+    def compute_features_batch(
+        self,
+        utility_records: Optional[pd.DataFrame],
+        telecom_records: Optional[pd.DataFrame],
+        beneficiary_districts: Union[pd.Series, Mapping[Any, Any]],
+        district_medians: DistrictMedianTable,
+        beneficiary_col: str = "beneficiary_id",
+    ) -> pd.DataFrame:
+        """
+        compute_features() for every beneficiary in beneficiary_districts
+        (beneficiary -> district), with fallbacks from that district's row of
+        district_medians. utility_records / telecom_records hold one record
+        per row (the compute_features dict keys as columns, NaN for a missing
+        key) plus beneficiary_col; rows of other beneficiaries are ignored.
+        Returns one row per beneficiary, columns PROXY_FEATURES. Raises
+        ValueError if a beneficiary's district has no medians.
+        """
+        if not isinstance(beneficiary_districts, pd.Series):
+            beneficiary_districts = pd.Series(beneficiary_districts, dtype=object)
+        ids = pd.Index(beneficiary_districts.index)
+        n = len(ids)
+        district_rows = district_medians.codes(beneficiary_districts.to_numpy())
+        if (district_rows < 0).any():
+            missing = pd.unique(beneficiary_districts.to_numpy()[district_rows < 0])[:5].tolist()
+            raise ValueError(f"district_medians required: no medians for districts {missing}")
+        medians = district_medians.values[district_rows]
+
+        def columns(frame: Optional[pd.DataFrame]) -> _RecordColumns:
+            if frame is None:
+                frame = pd.DataFrame({beneficiary_col: []})
+            groups = ids.get_indexer(frame[beneficiary_col])
+            keep = groups >= 0
+            return _RecordColumns(frame[keep], groups[keep])
+
+        utils, telecoms = columns(utility_records), columns(telecom_records)
+        six_months_ago = _stamp(self.six_months_ago)
+        three_months_ago = _stamp(self.reference_date - timedelta(days=90))
+
+        def count(groups: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+            return np.bincount(groups, weights=weights, minlength=n)
+
+        def median(name: str) -> np.ndarray:
+            return medians[:, DISTRICT_MEDIAN_FIELDS.index(name)]
+
+        features = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # 1-3. Electricity, from the last 6 months of utility bills
+            recent_util = (utils.dates != _NAT) & (utils.dates >= six_months_ago)
+            elec = recent_util & (utils.types == "electricity")
+            n_elec = count(utils.groups[elec])
+            enough_elec = n_elec >= 3
+
+            with_units = elec & (utils.units != 0)
+            n_units = count(utils.groups[with_units])
+            avg_units = np.where(n_units > 0, count(utils.groups[with_units], utils.units[with_units]) / n_units, 0.0)
+            features["avg_monthly_electricity_units"] = np.where(enough_elec, avg_units, median("median_electricity_kwh"))
+
+            paid = count(utils.groups[elec & (utils.status == "PAID")])
+            features["electricity_payment_regularity"] = np.where(
+                enough_elec, paid / n_elec * 100.0, median("median_electricity_regularity")
+            )
+
+            # Slope of amount against bill index in date order (closed-form least squares)
+            elec_idx = np.flatnonzero(elec)
+            elec_idx = elec_idx[np.lexsort((utils.dates[elec_idx], utils.groups[elec_idx]))]
+            g, y = utils.groups[elec_idx], utils.amounts[elec_idx]
+            x = np.arange(len(g)) - np.searchsorted(g, g, side="left")
+            m = n_elec.astype(float)
+            sxy = count(g, (x - (m[g] - 1) / 2.0) * y)
+            slope = sxy / (m * (m * m - 1) / 12.0)
+            features["electricity_spend_trend"] = np.where(enough_elec, slope, median("median_electricity_spend_trend"))
+
+            # 4-6. Telecom recharges in the last 6 months
+            recent_tel = (telecoms.dates != _NAT) & (telecoms.dates >= six_months_ago)
+            n_tel = count(telecoms.groups[recent_tel])
+            enough_tel = n_tel >= 3
+            tel_spend = count(telecoms.groups[recent_tel], telecoms.amounts[recent_tel])
+            features["avg_monthly_recharge_amount"] = np.where(
+                enough_tel, tel_spend / 6.0, median("median_recharge_amount")
+            )
+            features["recharge_frequency_score"] = np.where(
+                enough_tel, np.minimum(100.0, (n_tel / 6.0 / 4.0) * 100.0), median("median_recharge_frequency")
+            )
+            high_value = recent_tel & (telecoms.amounts > 500)
+            features["high_value_recharge_flag"] = (count(telecoms.groups[high_value]) > 0).astype(float)
+
+            # 7-12 look at every record, utility and telecom
+            groups = np.concatenate([utils.groups, telecoms.groups])
+            types = np.concatenate([utils.types, telecoms.types])
+            dates = np.concatenate([utils.dates, telecoms.dates])
+            amounts = np.concatenate([utils.amounts, telecoms.amounts])
+
+            typed = types != ""
+            distinct = pd.DataFrame({"g": groups[typed], "t": types[typed]}).drop_duplicates()
+            features["utility_diversity_score"] = count(distinct["g"].to_numpy(dtype=np.int64)).astype(float)
+            features["water_bill_payment_flag"] = (count(groups[types == "water"]) > 0).astype(float)
+
+            n_lpg = count(groups[np.isin(types, ["lpg", "pahal"])])
+            n_util = count(utils.groups)
+            features["lpg_refill_frequency"] = np.where(n_util >= 3, n_lpg * 2.0, median("median_lpg_frequency"))
+
+            features["estimated_consumption_percentile"] = median("estimated_consumption_percentile").copy()
+
+            digital = np.concatenate([utils.digital, telecoms.digital])
+            features["payment_mode_digital_flag"] = (count(groups[digital]) > 0).astype(float)
+
+            dated = dates != _NAT
+            last_3 = dated & (dates >= three_months_ago)
+            prev_3 = dated & (dates >= six_months_ago) & (dates < three_months_ago)
+            last_3_spend = count(groups[last_3], amounts[last_3])
+            prev_3_spend = count(groups[prev_3], amounts[prev_3])
+            growth = np.where(prev_3_spend > 0, (last_3_spend - prev_3_spend) / prev_3_spend, 0.0)
+            features["consumption_growth_rate"] = np.where(
+                count(groups[dated]) >= 6, growth, median("median_consumption_growth_rate")
+            )
+
+        result = pd.DataFrame({name: features[name] for name in PROXY_FEATURES}, index=ids)
+        result.index.name = beneficiary_col
+        return result
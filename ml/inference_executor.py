@@ -0,0 +1,147 @@
+"""
+inference_executor.py
+
+Bounded executor for the CPU-heavy scoring stages of the ML API.
+
+Feature extraction, scaler.transform, predict_proba and the agent review are
+synchronous; running them inside an async endpoint blocks the event loop for
+every other request on the worker. InferenceExecutor moves them onto a
+thread pool or a process pool (each process preloads the models once) and
+caps how much work may be in flight. When the cap is reached, run() raises
+ExecutorSaturated straight away instead of queueing, so the API can answer
+503 and latency for admitted requests stays flat.
+
+Configuration (environment):
+    ML_API_EXECUTOR          thread | process | inline   (default: thread)
+    ML_API_EXECUTOR_WORKERS  pool size                   (default: min(4, cpu_count))
+    ML_API_EXECUTOR_QUEUE    extra requests allowed to wait for a worker (default: 32)
+"""
+
+import os
+import asyncio
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+EXECUTOR_MODES = ("thread", "process", "inline")
+
+DEFAULT_MODE = os.getenv("ML_API_EXECUTOR", "thread").strip().lower()
+DEFAULT_WORKERS = int(os.getenv("ML_API_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+DEFAULT_QUEUE_DEPTH = int(os.getenv("ML_API_EXECUTOR_QUEUE", "32"))
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class InferenceExecutor:
+    def __init__(
+        self,
+        mode: str = DEFAULT_MODE,
+        max_workers: int = DEFAULT_WORKERS,
+        queue_depth: int = DEFAULT_QUEUE_DEPTH,
+        initializer: Optional[Callable[[], Any]] = None,
+    ):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode '{mode}', expected one of {EXECUTOR_MODES}")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if queue_depth < 0:
+            raise ValueError("queue_depth must be non-negative")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.capacity = max_workers + queue_depth
+        self.initializer = initializer
+
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._in_flight = 0
+        self._rejected = 0
+        self._count_lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> Optional[Executor]:
+        if self.mode == "inline":
+            return None
+        pool = self._pool
+        if pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    if self.mode == "process":
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            initializer=self.initializer,
+                        )
+                    else:
+                        self._pool = ThreadPoolExecutor(
+                            max_workers=self.max_workers,
+                            thread_name_prefix="ml-inference",
+                        )
+                pool = self._pool
+        return pool
+
+    def start(self) -> None:
+        """
+        Create the pool eagerly (process workers run the initializer now).
+        Call it before starting other threads: every process worker is
+        forked here, and the pool forks no more afterwards.
+        """
+        pool = self._get_pool()
+        if self.mode == "process" and pool is not None:
+            # Touch every worker so model preload happens before traffic
+            for future in [pool.submit(os.getpid) for _ in range(self.max_workers)]:
+                future.result()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run fn(*args) on the pool and await the result.
+        Raises ExecutorSaturated if capacity is exhausted; never blocks waiting
+        for a slot.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._count_lock:
+                self._rejected += 1
+            raise ExecutorSaturated(
+                f"Inference executor saturated ({self.capacity} requests in flight)"
+            )
+        with self._count_lock:
+            self._in_flight += 1
+        try:
+            pool = self._get_pool()
+            if pool is not None:
+                future = pool.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        if pool is None:
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        # The slot is held until the work itself finishes: a cancelled caller
+        # stops waiting, but a job already running keeps its worker busy
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future: Optional[Future] = None) -> None:
+        with self._count_lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._count_lock:
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
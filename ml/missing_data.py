@@ -1,5 +1,36 @@
+"""
+missing_data.py
+
+Tiered imputation (district -> state -> national -> 0.0) of missing
+features, with conservative capping of income proxies and a weighted
+completeness score that drives the CCS cap policy flags.
+
+impute() handles one beneficiary's feature dict. impute_matrix() does the
+same for a whole batch: the district / state / national stats are laid out
+once as lookup arrays (one row per district or state, one column per
+feature), each row's district and state become row indices, and the tier
+chain is resolved with boolean masks over the (beneficiaries x features)
+matrix. Instead of per-feature metadata dicts it returns a tier code per
+cell (TIER_NAMES, plus TIER_CAPPED when an income proxy was capped), and
+completeness is one matrix-vector product with the feature weights.
+"""
+
 from dataclasses import dataclass, field
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Tier codes for impute_matrix(); the names match impute()'s tier_used
+TIER_NAMES = ("observed", "district", "state", "national", "absolute_fallback")
+TIER_OBSERVED, TIER_DISTRICT, TIER_STATE, TIER_NATIONAL, TIER_FALLBACK = range(len(TIER_NAMES))
+TIER_CAPPED = 8  # bit flag: income proxy capped at the national value
+
+
+def tier_name(code: int) -> str:
+    """impute()'s tier_used string for an impute_matrix() tier code."""
+    name = TIER_NAMES[code & ~TIER_CAPPED]
+    return f"{name}_capped_conservative" if code & TIER_CAPPED else name
 
 @dataclass
 class BeneficiaryMeta:
@@ -16,6 +47,49 @@ class ImputedFeatureVector:
     requires_ccs_cap: bool
     policy_flags: Dict[str, bool] = field(default_factory=dict)
 
+@dataclass
+class ImputedMatrix:
+    features: List[str]
+    values: np.ndarray              # (n, m) float, missing cells imputed
+    tiers: np.ndarray               # (n, m) int8 tier codes, TIER_OBSERVED where present
+    completeness_score: np.ndarray  # (n,)
+    requires_ccs_cap: np.ndarray    # (n,) bool
+    requires_manual_review: np.ndarray  # (n,) bool
+
+    def to_frame(self, index=None) -> pd.DataFrame:
+        return pd.DataFrame(self.values, columns=self.features, index=index)
+
+
+@dataclass
+class _TierTables:
+    """Stats for one feature order as arrays; the last row of each table is all-absent (index -1)."""
+    districts: pd.Index
+    district_values: np.ndarray
+    district_has: np.ndarray
+    states: pd.Index
+    state_values: np.ndarray
+    state_has: np.ndarray
+    national_values: np.ndarray
+    national_has: np.ndarray
+    cap_values: np.ndarray
+    proxy_columns: np.ndarray
+    weights: np.ndarray
+
+
+def _stats_table(stats: Dict[Any, Dict[str, Any]], features: Sequence[str]) -> Tuple[pd.Index, np.ndarray, np.ndarray]:
+    keys = list(stats)
+    values = np.full((len(keys) + 1, len(features)), np.nan)
+    has = np.zeros((len(keys) + 1, len(features)), dtype=bool)
+    for i, key in enumerate(keys):
+        row = stats[key]
+        for j, feat in enumerate(features):
+            if feat in row:
+                has[i, j] = True
+                value = row[feat]
+                values[i, j] = np.nan if value is None else value
+    return pd.Index(keys), values, has
+
+
 class MissingDataHandler:
     # Features where higher is "wealthier". We must not impute a wealthy proxy 
     # for someone who is missing data.
@@ -43,6 +117,8 @@ class MissingDataHandler:
         self.district_stats = district_stats
         self.state_stats = state_stats
         self.national_stats = national_stats
+        # impute_matrix() lookup arrays per feature order; stats are read-only after construction
+        self._tables: Dict[Tuple[str, ...], _TierTables] = {}
 
     def compute_completeness_score(self, original_fv: dict) -> float:
         """Computes a weighted ratio of present features to total expected features."""
@@ -140,3 +216,91 @@ class MissingDataHandler:
             requires_ccs_cap=requires_ccs_cap,
             policy_flags=policy_flags
         )
+
+    def _tier_tables(self, features: Tuple[str, ...]) -> _TierTables:
+        tables = self._tables.get(features)
+        if tables is None:
+            districts, district_values, district_has = _stats_table(self.district_stats, features)
+            states, state_values, state_has = _stats_table(self.state_stats, features)
+            national = self.national_stats
+            national_has = np.array([feat in national for feat in features], dtype=bool)
+            national_values = np.array(
+                [np.nan if national.get(feat) is None else national[feat] for feat in features], dtype=float
+            )
+            tables = self._tables[features] = _TierTables(
+                districts=districts, district_values=district_values, district_has=district_has,
+                states=states, state_values=state_values, state_has=state_has,
+                national_values=national_values, national_has=national_has,
+                cap_values=np.array([national.get(feat, 0.0) for feat in features], dtype=float),
+                proxy_columns=np.array([feat in self.INCOME_PROXIES for feat in features], dtype=bool),
+                weights=np.array([self.FEATURE_WEIGHTS.get(feat, self.DEFAULT_WEIGHT) for feat in features], dtype=float),
+            )
+        return tables
+
+    def impute_matrix(
+        self,
+        X,
+        district_codes: Sequence[Any],
+        state_codes: Sequence[Any],
+        feature_names: Optional[Sequence[str]] = None,
+    ) -> ImputedMatrix:
+        """
+        impute() for a batch. X is a DataFrame (columns are the features) or
+        a 2-D array with feature_names; NaN marks a missing cell. Row i uses
+        district_codes[i] and state_codes[i].
+        """
+        if isinstance(X, pd.DataFrame):
+            features = tuple(X.columns if feature_names is None else feature_names)
+            values = X[list(features)].to_numpy(dtype=float, na_value=np.nan, copy=True)
+        else:
+            if feature_names is None:
+                raise ValueError("feature_names is required when X is not a DataFrame")
+            features = tuple(feature_names)
+            values = np.array(X, dtype=float, copy=True)
+        if values.ndim != 2 or values.shape[1] != len(features):
+            raise ValueError(f"X must be (n, {len(features)}), got {values.shape}")
+        if len(district_codes) != len(values) or len(state_codes) != len(values):
+            raise ValueError("district_codes and state_codes need one entry per row of X")
+
+        t = self._tier_tables(features)
+        missing = np.isnan(values)
+
+        # Index -1 (unknown code) selects the all-absent sentinel row
+        d_rows = t.districts.get_indexer(pd.Index(district_codes))
+        s_rows = t.states.get_indexer(pd.Index(state_codes))
+        use_district = missing & t.district_has[d_rows]
+        use_state = missing & ~use_district & t.state_has[s_rows]
+        use_national = missing & ~use_district & ~use_state & t.national_has
+        use_fallback = missing & ~use_district & ~use_state & ~use_national
+
+        imputed = np.where(use_district, t.district_values[d_rows], 0.0)
+        imputed = np.where(use_state, t.state_values[s_rows], imputed)
+        imputed = np.where(use_national, t.national_values, imputed)
+
+        tiers = np.zeros(values.shape, dtype=np.int8)
+        tiers[use_district] = TIER_DISTRICT
+        tiers[use_state] = TIER_STATE
+        tiers[use_national] = TIER_NATIONAL
+        tiers[use_fallback] = TIER_FALLBACK
+
+        # Safety rule: never impute an income proxy above the national value
+        capped = missing & t.proxy_columns & (imputed > t.cap_values)
+        imputed = np.where(capped, t.cap_values, imputed)
+        tiers[capped] |= TIER_CAPPED
+
+        values[missing] = imputed[missing]
+
+        total_weight = t.weights.sum()
+        if total_weight > 0:
+            completeness = (~missing) @ t.weights / total_weight
+        else:
+            completeness = np.zeros(len(values))
+
+        return ImputedMatrix(
+            features=list(features),
+            values=values,
+            tiers=tiers,
+            completeness_score=completeness,
+            requires_ccs_cap=completeness < 0.3,
+            requires_manual_review=completeness < 0.1,
+        )
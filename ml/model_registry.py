@@ -0,0 +1,368 @@
+"""
+model_registry.py
+
+In-process registry for model artifacts and scoring policy.
+
+Loads model_metadata.json, the classifier, scaler and feature order, plus the
+pillar weights and caps used by scoring.py, exactly once per artifact version.
+Consumers grab an immutable snapshot; a reload builds a complete new snapshot
+and swaps the reference in one assignment, so a request never sees a new
+model paired with an old scaler. Once artifacts are loaded, policy() is the
+policy of the current artifact snapshot, so metadata, weights and caps swap
+in that same assignment and a failed reload keeps the old policy too.
+
+Change detection is by file mtime/size stamp. refresh() does the stat calls;
+the per-request accessors (policy(), artifacts()) only touch files on the
+very first load. Call start_watcher() in long-running servers to refresh
+in the background. Process-pool workers have no watcher thread; they call
+refresh_if_due(), which stats the files at most once per refresh_interval.
+A load that fails remembers the stamp it failed on, so the same broken
+files are not loaded again until they change.
+
+Sharing models across workers:
+- MODEL_REGISTRY_MMAP=1 loads the model, scaler and compiled tree engine
+  with joblib mmap_mode="r" from an uncompressed cache under
+  MODEL_CACHE_DIR (default: models/.mmap_cache). NumPy buffers are then
+  read-only file-backed pages that every worker maps from the page cache.
+  Estimators that copy their arrays when unpickled (sklearn's Cython Tree,
+  used by RandomForest) still get private copies; the compiled engine and
+  HistGradientBoosting node arrays do not.
+- preload() loads everything and calls gc.freeze(), for servers that
+  import the app before forking workers (gunicorn --preload). Frozen
+  objects are never touched by the collector, so their pages stay shared
+  copy-on-write.
+"""
+
+import os
+import gc
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+
+from structured_log import api_log
+from tree_engine import (
+    COMPILED_MAX_BATCH,
+    COMPILED_MODEL_FILE,
+    CompiledTreeEnsemble,
+    UnsupportedModelError,
+    compile_for_serving,
+    export_tree_ensemble,
+)
+
+ROOT = os.path.dirname(__file__)
+MODELS_DIR = os.path.join(ROOT, "models")
+
+DEFAULT_INCOME_BARRIER = 15000
+REFRESH_INTERVAL_SECONDS = float(os.getenv("MODEL_REGISTRY_REFRESH_SECONDS", "30"))
+MMAP_ENABLED = os.getenv("MODEL_REGISTRY_MMAP", "0") == "1"
+CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "")
+
+META_FILE = "model_metadata.json"
+MODEL_FILE = "safecred_model.pkl"
+SCALER_FILE = "scaler.pkl"
+FEATURE_ORDER_FILE = "feature_order.pkl"
+
+
+@dataclass(frozen=True)
+class ScoringPolicy:
+    """Metadata-derived scoring policy (no model binaries)."""
+    metadata: Dict[str, Any]
+    dynamic_income_barrier: float
+    pillar_weights: Dict[str, float]
+    caps: Dict[str, float]
+    version: str
+    stamp: Tuple = ()
+
+
+@dataclass(frozen=True)
+class ModelArtifacts:
+    """Everything apply_direct needs to score, loaded as one unit."""
+    clf: Any
+    scaler: Any
+    feature_order: List[str]
+    policy: ScoringPolicy
+    stamp: Tuple = ()
+    predictor: Any = None  # clf, or its compiled tree engine (tree_engine.py)
+
+    @property
+    def ready(self) -> bool:
+        return self.clf is not None and self.scaler is not None and bool(self.feature_order)
+
+    @property
+    def version(self) -> str:
+        return self.policy.version
+
+
+def _file_stamp(path: str) -> Tuple:
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (None, None)
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        models_dir: str = MODELS_DIR,
+        refresh_interval: float = REFRESH_INTERVAL_SECONDS,
+        mmap: bool = MMAP_ENABLED,
+        cache_dir: Optional[str] = None,
+    ):
+        self.models_dir = models_dir
+        self.refresh_interval = refresh_interval
+        self.mmap = mmap
+        self.cache_dir = cache_dir or CACHE_DIR or os.path.join(models_dir, ".mmap_cache")
+        self._policy: Optional[ScoringPolicy] = None
+        self._artifacts: Optional[ModelArtifacts] = None
+        self._lock = threading.RLock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._failed_stamp: Optional[Tuple] = None
+        self._next_check = 0.0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.models_dir, name)
+
+    def _policy_stamp(self) -> Tuple:
+        return _file_stamp(self._path(META_FILE))
+
+    def _artifact_stamp(self) -> Tuple:
+        return tuple(
+            _file_stamp(self._path(name))
+            for name in (META_FILE, MODEL_FILE, SCALER_FILE, FEATURE_ORDER_FILE)
+        )
+
+    # --- Loading ---
+
+    def _cache_path(self, name: str, stamp: Tuple) -> str:
+        base = os.path.splitext(name)[0]
+        return os.path.join(self.cache_dir, f"{base}-{stamp[0]}-{stamp[1]}.pkl")
+
+    def _load_cached(self, name: str, stamp: Tuple, build):
+        """
+        joblib.load(mmap_mode="r") of an uncompressed cache entry keyed by the
+        source file stamp; build() produces the object on a cache miss.
+        """
+        cached = self._cache_path(name, stamp)
+        if not os.path.exists(cached):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            obj = build()
+            tmp = f"{cached}.tmp{os.getpid()}"
+            joblib.dump(obj, tmp)  # uncompressed, so arrays can be mapped
+            os.replace(tmp, cached)
+            self._prune_cache(name, keep=cached)
+        return joblib.load(cached, mmap_mode="r")
+
+    def _prune_cache(self, name: str, keep: str) -> None:
+        prefix = os.path.splitext(name)[0] + "-"
+        for entry in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, entry)
+            if entry.startswith(prefix) and path != keep and ".tmp" not in entry:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _load_pickle(self, name: str) -> Any:
+        path = self._path(name)
+        if not self.mmap:
+            return joblib.load(path)
+        return self._load_cached(name, _file_stamp(path), lambda: joblib.load(path))
+
+    def _load_engine(self, clf: Any) -> CompiledTreeEnsemble:
+        """
+        The engine train_v2.py exported next to the model, or clf compiled
+        here when that file is missing, older than the model or unreadable.
+        """
+        path = self._path(COMPILED_MODEL_FILE)
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(self._path(MODEL_FILE)):
+                engine = CompiledTreeEnsemble.load(path)
+                if engine.n_features_in_ == getattr(clf, "n_features_in_", engine.n_features_in_):
+                    return engine
+                api_log.warning("compiled_model_mismatch", path=path, n_features=engine.n_features_in_)
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            api_log.warning("compiled_model_load_failed", path=path, error=str(exc))
+        return export_tree_ensemble(clf)
+
+    def _compile_predictor(self, clf: Any) -> Any:
+        """clf routed through the compiled tree engine when possible (tree_engine.py)."""
+        if COMPILED_MAX_BATCH <= 0:
+            return clf
+        try:
+            if self.mmap:
+                engine = self._load_cached(
+                    "safecred_model_compiled.pkl",
+                    _file_stamp(self._path(MODEL_FILE)),
+                    lambda: self._load_engine(clf),
+                )
+            else:
+                engine = self._load_engine(clf)
+        except UnsupportedModelError:
+            return clf
+        return compile_for_serving(clf, engine=engine)
+
+    def _load_policy(self) -> ScoringPolicy:
+        # scoring imports this module, so resolve its defaults lazily
+        from scoring import DEFAULT_CAPS, PILLAR_WEIGHTS
+
+        stamp = self._policy_stamp()
+        try:
+            with open(self._path(META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            barrier = float(meta.get("dynamic_income_barrier", DEFAULT_INCOME_BARRIER))
+        except Exception:
+            meta = {}
+            barrier = DEFAULT_INCOME_BARRIER  # fallback default
+
+        return ScoringPolicy(
+            metadata=meta,
+            dynamic_income_barrier=barrier,
+            pillar_weights={**PILLAR_WEIGHTS, **meta.get("pillar_weights", {})},
+            caps={**DEFAULT_CAPS, **meta.get("caps", {})},
+            version=str(meta.get("version", "unversioned")),
+            stamp=stamp,
+        )
+
+    def _load_artifacts(self, policy: ScoringPolicy) -> ModelArtifacts:
+        stamp = self._artifact_stamp()
+        paths = [self._path(n) for n in (MODEL_FILE, SCALER_FILE, FEATURE_ORDER_FILE)]
+        if not all(os.path.exists(p) for p in paths):
+            api_log.warning("model_artifacts_missing", models_dir=self.models_dir, hint="run train_v2.py")
+            return ModelArtifacts(None, None, [], policy, stamp)
+
+        clf = self._load_pickle(MODEL_FILE)
+        scaler = self._load_pickle(SCALER_FILE)
+        feature_order = list(joblib.load(paths[2]))
+        predictor = self._compile_predictor(clf)
+        compiled = predictor is not clf
+        api_log.info(
+            "model_loaded",
+            n_features=len(feature_order),
+            model_version=policy.version,
+            compiled=compiled,
+            mmap=self.mmap,
+        )
+        return ModelArtifacts(clf, scaler, feature_order, policy, stamp, predictor)
+
+    # --- Hot-path accessors ---
+
+    def policy(self) -> ScoringPolicy:
+        """Current scoring policy; loads metadata on first use only."""
+        artifacts = self._artifacts
+        if artifacts is not None:
+            return artifacts.policy
+        policy = self._policy
+        if policy is None:
+            with self._lock:
+                if self._policy is None:
+                    self._policy = self._load_policy()
+                policy = self._policy
+        return policy
+
+    def artifacts(self) -> ModelArtifacts:
+        """Current model snapshot; loads the artifacts on first use only."""
+        artifacts = self._artifacts
+        if artifacts is None:
+            with self._lock:
+                if self._artifacts is None:
+                    stamp = self._artifact_stamp()
+                    try:
+                        self._artifacts = self._load_artifacts(self.policy())
+                    except Exception as exc:
+                        api_log.error("model_load_failed", error=str(exc))
+                        # Not-ready snapshot with the failed stamp: refresh()
+                        # retries once the files change, requests do not
+                        self._failed_stamp = stamp
+                        self._artifacts = ModelArtifacts(None, None, [], self.policy(), stamp)
+                artifacts = self._artifacts
+        return artifacts
+
+    def preload(self) -> ModelArtifacts:
+        """
+        Load everything now and freeze the GC heap. Call in the parent
+        process before workers fork so they share the model pages.
+        """
+        artifacts = self.artifacts()
+        gc.collect()
+        gc.freeze()
+        return artifacts
+
+    # --- Reloading ---
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload anything whose files changed since it was loaded.
+        Returns True if a new snapshot was swapped in. On a failed reload the
+        previous snapshot keeps serving.
+        """
+        with self._lock:
+            artifacts = self._artifacts
+            if artifacts is None:
+                # Policy-only consumers: nothing to pair the metadata with
+                policy = self._policy
+                if policy is not None and (force or self._policy_stamp() != policy.stamp):
+                    self._policy = self._load_policy()
+                    return True
+                return False
+
+            # The artifact stamp includes the metadata file
+            stamp = self._artifact_stamp()
+            if not force and (stamp == artifacts.stamp or stamp == self._failed_stamp):
+                return False
+            try:
+                fresh = self._load_artifacts(self._load_policy())
+            except Exception as exc:
+                self._failed_stamp = stamp
+                api_log.error("model_reload_failed", kept_version=artifacts.version, error=str(exc))
+                return False
+            # One assignment publishes the new policy and model together
+            self._artifacts = fresh
+            self._policy = fresh.policy
+            self._failed_stamp = None
+        return True
+
+    def refresh_if_due(self) -> bool:
+        """refresh() at most once per refresh_interval; for processes without a watcher."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.refresh_interval
+        try:
+            return self.refresh()
+        except Exception as exc:
+            api_log.error("model_registry_refresh_failed", error=str(exc))
+            return False
+
+    def start_watcher(self) -> None:
+        """Poll artifact stamps every refresh_interval seconds on a daemon thread."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+
+        def _run():
+            while not self._stop.wait(self.refresh_interval):
+                try:
+                    self.refresh()
+                except Exception as exc:
+                    api_log.error("model_registry_refresh_failed", error=str(exc))
+
+        self._watcher = threading.Thread(target=_run, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+
+# Process-wide default registry
+registry = ModelRegistry()
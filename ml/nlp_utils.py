@@ -3,11 +3,43 @@ nlp_utils.py
 
 Simple NLP utilities for categorizing bank transactions and analyzing text data.
 This serves as a lightweight NLP component without heavy dependencies.
+
+TransactionCategorizer compiles every category's patterns into a single
+regex: one lookahead branch per category, tried in CATEGORIES order, each
+naming its category with an empty named group. A description therefore
+gets the first category with any matching pattern, exactly as looping
+over the categories and calling re.search on each pattern would, but in
+one C-level match. Results are LRU-cached per description (merchant
+strings repeat heavily across statements), and categorize_series()
+categorizes each distinct value of a pandas Series only once.
+
+Configuration (environment):
+    ML_CATEGORY_CACHE_SIZE  descriptions kept in the LRU cache (default: 65536)
 """
 
+import os
 import re
+from functools import lru_cache
 from typing import List, Dict, Any
 
+import numpy as np
+import pandas as pd
+
+CATEGORY_CACHE_SIZE = int(os.getenv("ML_CATEGORY_CACHE_SIZE", "65536"))
+
+
+def compile_categories(categories: Dict[str, List[str]]) -> "re.Pattern":
+    r"""
+    One regex equivalent to "first category with any re.search hit".
+    Matched at position 0; lastgroup is the category name. The skip prefix
+    is [\s\S]*? so keywords after a newline are still found.
+    """
+    branches = [
+        rf"(?=[\s\S]*?(?:{'|'.join(patterns)}))(?P<{category}>)"
+        for category, patterns in categories.items()
+    ]
+    return re.compile("|".join(branches))
+
 class TransactionCategorizer:
     """
     Rule-based NLP categorizer for bank transactions.
@@ -40,19 +72,33 @@ class TransactionCategorizer:
         ]
     }
 
+    _MATCHER = None  # compiled from CATEGORIES on first use
+
     @staticmethod
+    def matcher() -> "re.Pattern":
+        if TransactionCategorizer._MATCHER is None:
+            TransactionCategorizer._MATCHER = compile_categories(TransactionCategorizer.CATEGORIES)
+        return TransactionCategorizer._MATCHER
+
+    @staticmethod
+    @lru_cache(maxsize=CATEGORY_CACHE_SIZE)
     def categorize(description: str) -> str:
         """
         Categorize a single transaction description.
         """
-        desc_lower = description.lower()
-        
-        for category, patterns in TransactionCategorizer.CATEGORIES.items():
-            for pattern in patterns:
-                if re.search(pattern, desc_lower):
-                    return category
-        
-        return "OTHER"
+        match = TransactionCategorizer.matcher().match(description.lower())
+        return match.lastgroup if match else "OTHER"
+
+    @staticmethod
+    def categorize_series(descriptions: pd.Series) -> pd.Series:
+        """
+        Categorize a Series of descriptions; each distinct value is matched
+        once. Missing values are categorized as empty strings ("OTHER").
+        """
+        codes, uniques = pd.factorize(descriptions.fillna("").astype(str), sort=False)
+        categorize = TransactionCategorizer.categorize
+        labels = np.array([categorize(value) for value in uniques], dtype=object)
+        return pd.Series(labels[codes], index=descriptions.index, name=descriptions.name)
 
     @staticmethod
     def analyze_statements(statements: List[Dict[str, Any]]) -> Dict[str, Any]:
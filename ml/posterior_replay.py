@@ -0,0 +1,217 @@
+"""
+posterior_replay.py
+
+Offline recomputation of every beneficiary's Dirichlet income posterior
+from its stored signal_history, for when BayesianIncomeUpdater's
+likelihood mappings or a DemographicRegistry prior change.
+
+    load_histories()    MongoDB documents -> SignalHistories: one flat array
+                        per history field plus per-beneficiary offsets
+    replay()            one distinct (signal_type, signal_value) pair -> one
+                        likelihood row; rows are gathered by pair code,
+                        np.add.reduceat sums each beneficiary's segment and
+                        a cumulative sum gives every history posterior
+    write_posteriors()  unordered bulk_write of upserting UpdateOnes
+
+signal_history keeps only the last HISTORY_LIMIT signals. A full history
+may have lost older signals, so replaying it from the prior would drop
+their evidence. Such beneficiaries are skipped (and counted) unless
+include_truncated=True.
+
+Replay rewrites alphas and history posteriors with $set: run it while
+live updates are paused, or they may be overwritten.
+
+Configuration (environment):
+    ML_BAYES_BULK_WRITE_BATCH  UpdateOne operations per bulk_write call (default: 1000)
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+from bayesian_updater import BULK_WRITE_BATCH, HISTORY_LIMIT, N_BANDS
+
+HISTORY_PROJECTION = {
+    "_id": 0, "beneficiary_id": 1, "district": 1, "state": 1,
+    "signal_history.timestamp": 1, "signal_history.signal_type": 1, "signal_history.signal_value": 1,
+}
+
+
+@dataclass
+class SignalHistories:
+    """Signal histories of many beneficiaries; beneficiary i owns signals offsets[i]:offsets[i + 1]."""
+    beneficiary_ids: np.ndarray
+    districts: np.ndarray
+    states: np.ndarray
+    offsets: np.ndarray
+    signal_types: np.ndarray
+    signal_values: np.ndarray
+    timestamps: np.ndarray
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+
+@dataclass
+class ReplayResult:
+    beneficiary_ids: np.ndarray
+    alphas: np.ndarray              # (beneficiaries, N_BANDS)
+    history_posteriors: np.ndarray  # (signals, N_BANDS), aligned with the histories' signals
+    replayed: np.ndarray            # (beneficiaries,) bool, False for skipped truncated histories
+
+
+@dataclass
+class ReplayReport:
+    beneficiaries: int = 0
+    signals: int = 0
+    skipped_truncated: int = 0
+    written: int = 0
+    load_seconds: float = 0.0
+    replay_seconds: float = 0.0
+    write_seconds: float = 0.0
+
+    @property
+    def beneficiaries_per_second(self) -> float:
+        elapsed = self.load_seconds + self.replay_seconds + self.write_seconds
+        return self.beneficiaries / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**self.__dict__, "beneficiaries_per_second": round(self.beneficiaries_per_second, 1)}
+
+
+def load_histories(documents: Iterable[Mapping[str, Any]]) -> SignalHistories:
+    """Flatten documents (e.g. collection.find({}, HISTORY_PROJECTION)) into columns."""
+    ids, districts, states, lengths = [], [], [], []
+    types, values, stamps = [], [], []
+    for doc in documents:
+        history = doc.get("signal_history") or []
+        ids.append(doc["beneficiary_id"])
+        districts.append(doc.get("district"))
+        states.append(doc.get("state"))
+        lengths.append(len(history))
+        for entry in history:
+            types.append(entry.get("signal_type"))
+            values.append(entry.get("signal_value"))
+            stamps.append(entry.get("timestamp"))
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    def column(items: List[Any]) -> np.ndarray:
+        out = np.empty(len(items), dtype=object)
+        out[:] = items
+        return out
+
+    return SignalHistories(
+        beneficiary_ids=column(ids), districts=column(districts), states=column(states), offsets=offsets,
+        signal_types=column(types), signal_values=column(values), timestamps=column(stamps),
+    )
+
+
+def _codes(values: np.ndarray):
+    """factorize, with None / NaN as one more value (None) instead of code -1."""
+    codes, uniques = pd.factorize(values)
+    codes[codes < 0] = len(uniques)
+    return codes.astype(np.int64), list(uniques) + [None]
+
+
+def _pair_codes(first: np.ndarray, second: np.ndarray):
+    """Codes of the distinct (first, second) pairs, and the pairs themselves."""
+    first_codes, first_uniques = _codes(first)
+    second_codes, second_uniques = _codes(second)
+    codes, combined = pd.factorize(first_codes * len(second_uniques) + second_codes)
+    first_of, second_of = np.divmod(combined, len(second_uniques))
+    return codes, [(first_uniques[i], second_uniques[j]) for i, j in zip(first_of, second_of)]
+
+
+def replay(updater, histories: SignalHistories, include_truncated: bool = False) -> ReplayResult:
+    """Posteriors under updater's current mappings and registry priors."""
+    n = len(histories.beneficiary_ids)
+    lengths = histories.lengths
+
+    # Likelihood lookup table: one row per distinct (signal_type, signal_value)
+    signal_codes, signal_pairs = _pair_codes(histories.signal_types, histories.signal_values)
+    table = np.array([updater._calculate_likelihood(t, v) for t, v in signal_pairs], dtype=float).reshape(-1, N_BANDS)
+    likelihoods = table[signal_codes]
+
+    # Prior per distinct (district, state)
+    region_codes, regions = _pair_codes(histories.districts, histories.states)
+    priors = np.array([updater._get_initial_alphas(d, s) for d, s in regions], dtype=float).reshape(-1, N_BANDS)
+    prior = priors[region_codes] if n else np.zeros((0, N_BANDS))
+
+    # Total evidence per beneficiary: reduceat over non-empty segments
+    evidence = np.zeros((n, N_BANDS))
+    non_empty = lengths > 0
+    if non_empty.any():
+        evidence[non_empty] = np.add.reduceat(likelihoods, histories.offsets[:-1][non_empty], axis=0)
+
+    # History posteriors: prior + running sum within the beneficiary's segment
+    running = np.zeros((len(likelihoods) + 1, N_BANDS))
+    np.cumsum(likelihoods, axis=0, out=running[1:])
+    before = np.repeat(running[histories.offsets[:-1]], lengths, axis=0)
+    history_posteriors = np.repeat(prior, lengths, axis=0) + running[1:] - before
+
+    replayed = np.ones(n, dtype=bool) if include_truncated else lengths < HISTORY_LIMIT
+    return ReplayResult(
+        beneficiary_ids=histories.beneficiary_ids,
+        alphas=prior + evidence,
+        history_posteriors=history_posteriors,
+        replayed=replayed,
+    )
+
+
+def write_posteriors(collection, histories: SignalHistories, result: ReplayResult, batch_size: int = BULK_WRITE_BATCH) -> int:
+    """Upsert alphas and history posteriors of replayed beneficiaries. Returns operations sent."""
+    alphas = result.alphas.tolist()
+    posteriors = result.history_posteriors.tolist()
+    offsets = histories.offsets.tolist()
+    sent = 0
+    operations = []
+    for i in np.flatnonzero(result.replayed).tolist():
+        history = [
+            {
+                "timestamp": histories.timestamps[j],
+                "signal_type": histories.signal_types[j],
+                "signal_value": histories.signal_values[j],
+                "posterior_alphas": posteriors[j],
+            }
+            for j in range(offsets[i], offsets[i + 1])
+        ]
+        operations.append(UpdateOne(
+            {"beneficiary_id": histories.beneficiary_ids[i]},
+            {"$set": {"alphas": alphas[i], "signal_history": history}},
+            upsert=True,
+        ))
+        if len(operations) == batch_size:
+            collection.bulk_write(operations, ordered=False)
+            sent += len(operations)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+        sent += len(operations)
+    return sent
+
+
+def replay_collection(updater, collection=None, include_truncated: bool = False, dry_run: bool = False) -> ReplayReport:
+    """Load, replay and (unless dry_run) rewrite every document of collection (default: updater.collection)."""
+    collection = collection if collection is not None else updater.collection
+    report = ReplayReport()
+
+    t0 = time.perf_counter()
+    histories = load_histories(collection.find({}, HISTORY_PROJECTION))
+    t1 = time.perf_counter()
+    result = replay(updater, histories, include_truncated)
+    t2 = time.perf_counter()
+    if not dry_run:
+        report.written = write_posteriors(collection, histories, result)
+    t3 = time.perf_counter()
+
+    report.beneficiaries = len(histories.beneficiary_ids)
+    report.signals = len(histories.signal_types)
+    report.skipped_truncated = int((~result.replayed).sum())
+    report.load_seconds, report.replay_seconds, report.write_seconds = t1 - t0, t2 - t1, t3 - t2
+    return report
@@ -1,7 +1,142 @@
+"""
+repayment_features.py
+
+Repayment-history features for a beneficiary (DPD buckets, streaks, trend,
+consistency, loan-level ratios).
+
+compute_features() works on one beneficiary's lists of loan and repayment
+dicts. compute_features_batch() computes the same 24 features for many
+beneficiaries from columnar loans / repayments DataFrames: each date column
+is parsed once (each distinct value once), rows are ordered with one
+stable lexsort, and every aggregate is a bincount / groupby over the whole
+table. On the same records it returns exactly what compute_features()
+returns, with one deliberate exception: the averages (avg_days_past_due,
+avg_loan_size_growth, avg_loan_tenure_months), the delay standard
+deviation behind payment_consistency_score and the delinquency_trend
+slope are bincount sums in closed form rather than per-beneficiary
+np.mean / np.std / np.polyfit calls. Those can differ in the last
+digits (within 1e-12, relative or absolute); matching them bit for bit
+would take a Python loop per beneficiary.
+
+In the columnar tables a missing value (NaN / None / "") stands for a key
+the record does not have.
+
+RepaymentFeatureState keeps the same features as running aggregates for
+event-driven rescoring: add_repayment() / record_payment() / add_loan()
+update it in O(1), features() reads it without the history, and
+to_bytes() / from_bytes() store it as a small binary blob.
+"""
+
+import bisect
+import copy
+import struct
+from collections import Counter, deque
+
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
-from datetime import datetime
+from typing import List, Dict, Any, Iterable, Optional
+from datetime import datetime, timedelta
+
+FEATURE_NAMES = [
+    'emi_hit_rate', 'avg_days_past_due', 'max_days_past_due', 'current_days_past_due',
+    '30_plus_dpd_count', '60_plus_dpd_count', '90_plus_dpd_count', 'prepayment_ratio',
+    'loan_utilisation_rate', 'repeat_borrower_flag', 'tenure_completion_rate',
+    'delinquency_trend', 'avg_loan_size_growth', 'payment_consistency_score',
+    'consecutive_on_time_streak', 'worst_delinquency_bucket', 'partial_payment_rate',
+    'loan_purpose_diversity', 'avg_loan_tenure_months', 'recovery_rate',
+    'early_repayment_flag', 'channel_partner_diversity', 'on_time_payment_ratio',
+    'late_payment_ratio'
+]
+COUNT_FEATURES = ['30_plus_dpd_count', '60_plus_dpd_count', '90_plus_dpd_count']
+
+_NAT = np.iinfo(np.int64).min
+_NS_PER_DAY = 86_400 * 10**9
+_CLOSED_STATUSES = ['CLOSED', 'REPAID']
+
+
+def _parse_date_column(values: Optional[pd.Series], n_rows: int) -> np.ndarray:
+    """
+    Nanosecond timestamps (int64, _NAT when missing) with the same rules as
+    RepaymentFeatureExtractor._parse_date: strings are parsed, datetimes
+    kept, anything else is missing. Each distinct value is parsed once.
+    """
+    out = np.full(n_rows, _NAT, dtype=np.int64)
+    if values is None:
+        return out
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        parsed = pd.DatetimeIndex(values).as_unit("ns").asi8
+    else:
+        codes, uniques = pd.factorize(values, sort=False)
+        if len(uniques) == 0:
+            return out
+        parsed_uniques = np.full(len(uniques), _NAT, dtype=np.int64)
+        is_str = np.array([isinstance(u, str) and u != "" for u in uniques], dtype=bool)
+        is_dt = np.array([isinstance(u, datetime) for u in uniques], dtype=bool)
+        if is_str.any():
+            strings = list(uniques[is_str])
+            try:
+                stamps = pd.to_datetime(strings, format="mixed", errors="coerce")
+                parsed_uniques[is_str] = pd.DatetimeIndex(stamps).as_unit("ns").asi8
+            except Exception:
+                parsed_uniques[is_str] = [
+                    pd.Timestamp(v).as_unit("ns").value if v is not None else _NAT
+                    for v in (_safe_to_datetime(s) for s in strings)
+                ]
+        if is_dt.any():
+            parsed_uniques[is_dt] = [pd.Timestamp(u).as_unit("ns").value for u in uniques[is_dt]]
+        parsed = np.where(codes >= 0, parsed_uniques[np.maximum(codes, 0)], _NAT)
+    valid = parsed != _NAT
+    # compute_features works on Python datetimes: microsecond resolution
+    out[valid] = parsed[valid] // 1000 * 1000
+    return out
+
+
+def _safe_to_datetime(value: str):
+    try:
+        return pd.to_datetime(value)
+    except Exception:
+        return None
+
+
+def _days(later: np.ndarray, earlier) -> np.ndarray:
+    """(later - earlier).days: whole days, floored like timedelta.days."""
+    return np.floor_divide(later - earlier, _NS_PER_DAY)
+
+
+def _numeric(frame: pd.DataFrame, column: str, default: float = 0.0) -> np.ndarray:
+    if column not in frame:
+        return np.full(len(frame), default, dtype=float)
+    return pd.to_numeric(frame[column]).to_numpy(dtype=float, na_value=np.nan)
+
+
+def _text(frame: pd.DataFrame, column: str) -> pd.Series:
+    if column not in frame:
+        return pd.Series([""] * len(frame), index=frame.index, dtype=object)
+    return frame[column].where(frame[column].notna(), "").astype(str)
+
+
+def _group_max_run(groups: np.ndarray, flags: np.ndarray, n_groups: int) -> np.ndarray:
+    """Longest run of True per group; rows are already grouped and ordered."""
+    best = np.zeros(n_groups, dtype=np.int64)
+    if len(flags) == 0:
+        return best
+    new_group = np.r_[True, groups[1:] != groups[:-1]]
+    segment = np.cumsum(~flags | new_group)
+    run_lengths = np.bincount(segment, weights=flags)
+    segment_group = np.zeros(segment[-1] + 1, dtype=np.int64)
+    segment_group[segment] = groups
+    np.maximum.at(best, segment_group, run_lengths.astype(np.int64))
+    return best
+
+
+def _position_in_group(groups: np.ndarray) -> np.ndarray:
+    """0, 1, 2, ... within each run of equal group codes."""
+    if len(groups) == 0:
+        return np.zeros(0, dtype=np.int64)
+    idx = np.arange(len(groups))
+    starts = np.r_[True, groups[1:] != groups[:-1]]
+    return idx - np.maximum.accumulate(np.where(starts, idx, 0))
+
 
 class RepaymentFeatureExtractor:
     def __init__(self, reference_date: datetime = None):
@@ -11,7 +146,8 @@ class RepaymentFeatureExtractor:
         """
         self.reference_date = reference_date or datetime.utcnow()
 
-    def _parse_date(self, date_val) -> datetime:
+    @staticmethod
+    def _parse_date(date_val) -> datetime:
         if pd.isna(date_val) or not date_val:
             return None
         if isinstance(date_val, datetime):
@@ -218,14 +354,513 @@ class RepaymentFeatureExtractor:
         return features
 
     def _empty_feature_dict(self) -> Dict[str, float]:
-        keys = [
-            'emi_hit_rate', 'avg_days_past_due', 'max_days_past_due', 'current_days_past_due',
-            '30_plus_dpd_count', '60_plus_dpd_count', '90_plus_dpd_count', 'prepayment_ratio',
-            'loan_utilisation_rate', 'repeat_borrower_flag', 'tenure_completion_rate',
-            'delinquency_trend', 'avg_loan_size_growth', 'payment_consistency_score',
-            'consecutive_on_time_streak', 'worst_delinquency_bucket', 'partial_payment_rate',
-            'loan_purpose_diversity', 'avg_loan_tenure_months', 'recovery_rate',
-            'early_repayment_flag', 'channel_partner_diversity', 'on_time_payment_ratio',
-            'late_payment_ratio'
-        ]
-        return {k: 0.0 for k in keys}
+        return {k: 0.0 for k in FEATURE_NAMES}
+
+    def compute_features_batch(
+        self,
+        loans: Optional[pd.DataFrame],
+        repayments: Optional[pd.DataFrame],
+        beneficiary_col: str = 'beneficiary_id',
+        beneficiary_ids: Optional[Iterable[Any]] = None,
+    ) -> pd.DataFrame:
+        """
+        compute_features() for every beneficiary at once.
+
+        loans / repayments hold one row per record (the compute_features dict
+        keys as columns) plus beneficiary_col. Loans keep their row order
+        within a beneficiary (it matters for avg_loan_size_growth). Returns
+        one row per beneficiary, columns FEATURE_NAMES, in beneficiary_ids
+        order or order of first appearance. Raises ValueError, like
+        compute_features, if a repayment has neither due_date nor dpd.
+        """
+        loans = loans if loans is not None else pd.DataFrame(columns=[beneficiary_col])
+        repayments = repayments if repayments is not None else pd.DataFrame(columns=[beneficiary_col])
+
+        if beneficiary_ids is None:
+            ids = pd.Index(pd.unique(pd.concat(
+                [loans[beneficiary_col], repayments[beneficiary_col]], ignore_index=True
+            )))
+        else:
+            ids = pd.Index(list(beneficiary_ids))
+        n = len(ids)
+        loan_group = ids.get_indexer(loans[beneficiary_col])
+        rep_group = ids.get_indexer(repayments[beneficiary_col])
+        loans = loans[loan_group >= 0]
+        repayments = repayments[rep_group >= 0]
+        loan_group = loan_group[loan_group >= 0]
+        rep_group = rep_group[rep_group >= 0]
+
+        features = {}
+        n_loans = np.bincount(loan_group, minlength=n)
+        n_reps = np.bincount(rep_group, minlength=n)
+
+        # --- Repayments, ordered by (beneficiary, due_date or datetime.min), stable ---
+        due = _parse_date_column(repayments.get('due_date'), len(repayments))
+        paid = _parse_date_column(repayments.get('paid_date'), len(repayments))
+        order = np.lexsort((due, rep_group))  # _NAT sorts first, like datetime.min
+        g, due, paid = rep_group[order], due[order], paid[order]
+        has_due, has_paid = due != _NAT, paid != _NAT
+
+        dpd = _numeric(repayments, 'dpd', np.nan)[order]
+        missing = ~has_due & np.isnan(dpd)
+        if missing.any():
+            bad = ids[np.unique(g[missing])][:5].tolist()
+            raise ValueError(
+                f"Repayment record must contain due_date, or a legacy dpd field (beneficiaries {bad})."
+            )
+        both = has_due & has_paid
+        due_only = has_due & ~has_paid
+        dpd[both] = np.maximum(0, _days(paid[both], due[both]))
+        dpd[due_only] = np.maximum(0, _days(np.int64(pd.Timestamp(self.reference_date).as_unit("ns").value), due[due_only]))
+
+        valid = ~np.isnan(dpd)
+        dg, dv = g[valid], dpd[valid]
+        n_dpd = np.bincount(dg, minlength=n)
+
+        delay_g = g[both]
+        delay = _days(paid[both], due[both]).astype(float)
+        n_delays = np.bincount(delay_g, minlength=n)
+        paid_reps = np.bincount(g[has_paid], minlength=n)
+        prepayments = np.bincount(delay_g[delay < 0], minlength=n)
+        on_time = np.bincount(delay_g[delay <= 0], minlength=n)
+        streak = _group_max_run(delay_g, delay <= 0, n)
+
+        amt_due = np.nan_to_num(_numeric(repayments, 'amount_due')[order], nan=0.0)
+        amt_paid = np.nan_to_num(_numeric(repayments, 'amount_paid')[order], nan=0.0)
+        partial = np.bincount(g[(amt_due > 0) & (amt_paid > 0) & (amt_paid < amt_due)], minlength=n)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 1. emi_hit_rate
+            features['emi_hit_rate'] = np.where(n_reps > 0, on_time / np.maximum(n_reps, 1) * 100, 0.0)
+
+            # 2 & 3. DPD aggregates
+            overdue = dv > 0
+            n_overdue = np.bincount(dg[overdue], minlength=n)
+            overdue_sum = np.bincount(dg[overdue], weights=dv[overdue], minlength=n)
+            features['avg_days_past_due'] = np.where(n_overdue > 0, overdue_sum / np.maximum(n_overdue, 1), 0.0)
+            max_dpd = np.full(n, -np.inf)
+            np.maximum.at(max_dpd, dg, dv)
+            features['max_days_past_due'] = np.where(n_dpd > 0, max_dpd, 0.0)
+            last_dpd = np.zeros(n)
+            last_dpd[dg] = dv  # rows are in order, so the last write per group wins
+            features['current_days_past_due'] = last_dpd
+            for threshold in (30, 60, 90):
+                features[f'{threshold}_plus_dpd_count'] = np.bincount(dg[dv >= threshold], minlength=n)
+
+            # 4. prepayment_ratio
+            features['prepayment_ratio'] = np.where(paid_reps > 0, prepayments / np.maximum(paid_reps, 1), 0.0)
+
+            # --- Loan level, in input order within each beneficiary ---
+            lorder = np.argsort(loan_group, kind='stable')
+            lg = loan_group[lorder]
+            disbursed = np.nan_to_num(_numeric(loans, 'disbursed_amount')[lorder], nan=0.0)
+            approved = np.nan_to_num(_numeric(loans, 'approved_amount')[lorder], nan=0.0)
+            status_closed = _text(loans, 'status').str.upper().isin(_CLOSED_STATUSES).to_numpy()[lorder]
+
+            # 5. loan_utilisation_rate
+            approved_total = np.bincount(lg, weights=approved, minlength=n)
+            disbursed_total = np.bincount(lg, weights=disbursed, minlength=n)
+            features['loan_utilisation_rate'] = np.where(
+                approved_total > 0, disbursed_total / np.where(approved_total > 0, approved_total, 1), 0.0
+            )
+
+            # 6. repeat_borrower_flag / 7. tenure_completion_rate
+            features['repeat_borrower_flag'] = (n_loans >= 2).astype(float)
+            fully_repaid = np.bincount(lg[status_closed], minlength=n)
+            features['tenure_completion_rate'] = np.where(n_loans > 0, fully_repaid / np.maximum(n_loans, 1), 0.0)
+
+            # 8. delinquency_trend: least-squares slope of DPD against sequence index
+            x = _position_in_group(dg).astype(float)
+            x_mean = (n_dpd - 1) / 2.0
+            sxx = n_dpd * (n_dpd.astype(float) ** 2 - 1) / 12.0
+            sxy = np.bincount(dg, weights=(x - x_mean[dg]) * dv, minlength=n)
+            features['delinquency_trend'] = np.where(n_dpd > 1, sxy / np.where(sxx > 0, sxx, 1), 0.0)
+
+            # 9. avg_loan_size_growth
+            follows = np.zeros(len(lg), dtype=bool)
+            follows[1:] = lg[1:] == lg[:-1]
+            pct = (approved[1:] - approved[:-1]) / (approved[:-1] + 1e-9)
+            growth_g = lg[follows]
+            growth_sum = np.bincount(growth_g, weights=pct[follows[1:]], minlength=n)
+            features['avg_loan_size_growth'] = np.where(n_loans > 1, growth_sum / np.maximum(n_loans - 1, 1), 0.0)
+
+            # 10. payment_consistency_score
+            delay_mean = np.bincount(delay_g, weights=delay, minlength=n) / np.maximum(n_delays, 1)
+            delay_var = np.bincount(delay_g, weights=(delay - delay_mean[delay_g]) ** 2, minlength=n) / np.maximum(n_delays, 1)
+            max_delay = np.full(n, -np.inf)
+            np.maximum.at(max_delay, delay_g, delay)
+            raw_score = np.maximum(0, 1 - np.sqrt(delay_var) / np.maximum(max_delay, 1))
+            features['payment_consistency_score'] = np.where(
+                n_delays > 1, raw_score * 100, np.where(paid_reps > 0, 100.0, 0.0)
+            )
+
+            # 11. consecutive_on_time_streak
+            features['consecutive_on_time_streak'] = streak.astype(float)
+
+            # 12. worst_delinquency_bucket
+            max_d = features['max_days_past_due']
+            features['worst_delinquency_bucket'] = np.select(
+                [max_d == 0, max_d <= 30, max_d <= 60, max_d <= 90], [0.0, 1.0, 2.0, 3.0], 4.0
+            )
+
+            # 13. partial_payment_rate
+            features['partial_payment_rate'] = np.where(n_reps > 0, partial / np.maximum(n_reps, 1), 0.0)
+
+            # 14 & 18. purpose / channel partner diversity
+            for feature, column in (('loan_purpose_diversity', 'purpose'), ('channel_partner_diversity', 'channel_partner')):
+                values = _text(loans, column).to_numpy()[lorder]
+                present = values != ""
+                distinct = pd.DataFrame({"g": lg[present], "v": values[present]}).drop_duplicates()
+                features[feature] = np.bincount(distinct["g"].to_numpy(dtype=np.int64), minlength=n).astype(float)
+
+            # 15. avg_loan_tenure_months
+            tenure = _numeric(loans, 'tenure_months')[lorder]
+            has_tenure = ~np.isnan(tenure) & (tenure != 0)
+            n_tenure = np.bincount(lg[has_tenure], minlength=n)
+            tenure_sum = np.bincount(lg[has_tenure], weights=tenure[has_tenure], minlength=n)
+            features['avg_loan_tenure_months'] = np.where(n_tenure > 0, tenure_sum / np.maximum(n_tenure, 1), 0.0)
+
+            # 16. recovery_rate (dpd > 30 at a dpd index below the number of delays)
+            late = dv > 30
+            late_due = np.bincount(dg[late], minlength=n)
+            late_paid = np.bincount(dg[late & (x < n_delays[dg])], minlength=n)
+            features['recovery_rate'] = np.where(late_due > 0, late_paid / np.maximum(late_due, 1), 1.0)
+
+            # 17. early_repayment_flag
+            closed_date = _parse_date_column(loans.get('closed_date'), len(loans))[lorder]
+            maturity = _parse_date_column(loans.get('maturity_date'), len(loans))[lorder]
+            early = status_closed & (closed_date != _NAT) & (maturity != _NAT)
+            early[early] = _days(maturity[early], closed_date[early]) > 90
+            features['early_repayment_flag'] = (np.bincount(lg[early], minlength=n) > 0).astype(float)
+
+        # Extra ratios
+        features['on_time_payment_ratio'] = features['emi_hit_rate'] / 100.0
+        features['late_payment_ratio'] = 1.0 - features['on_time_payment_ratio']
+
+        result = pd.DataFrame({k: features[k] for k in FEATURE_NAMES}, index=ids)
+        result.index.name = beneficiary_col
+        float_cols = [c for c in FEATURE_NAMES if c not in COUNT_FEATURES]
+        result[float_cols] = result[float_cols].fillna(0.0)
+        # No records at all: compute_features returns the all-zero dict
+        empty = (n_loans == 0) & (n_reps == 0)
+        if empty.any():
+            result.loc[empty, :] = 0
+        return result
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_NO_DATE = np.iinfo(np.int64).min
+
+_STATE_MAGIC = b"RFS"
+_STATE_VERSION = 1
+
+
+_parse_date = RepaymentFeatureExtractor._parse_date
+
+
+def _to_us(value: Optional[datetime]) -> int:
+    return _NO_DATE if value is None else (value - _EPOCH) // _MICROSECOND
+
+
+def _from_us(value: int) -> Optional[datetime]:
+    return None if value == _NO_DATE else _EPOCH + timedelta(microseconds=value)
+
+
+class RepaymentFeatureState:
+    """
+    Running per-beneficiary aggregates behind the compute_features()
+    definitions, updated per event instead of rescanning the history.
+
+    Repayments must arrive in due-date order (records without a due date
+    sort first, as in compute_features). An installment that is due but
+    unpaid stays pending: its DPD runs against the reference date, and
+    streaks and delays depend on it once it is paid. Pending installments,
+    and everything recorded after the oldest one, are kept as raw records
+    and folded in at read time; once record_payment() settles the oldest,
+    the settled prefix is folded into the totals for good. Updates are O(1)
+    amortized, features() is O(pending).
+
+    Besides scalars the state keeps the DPD indices of repayments over 30
+    DPD (recovery_rate compares them with the final delay count) and the
+    purpose / channel partner counts.
+
+    Floating point results equal compute_features() up to rounding in the
+    last digits (running mean/variance and closed-form slope).
+    """
+
+    # Order of the fixed part of the binary blob
+    _INT_FIELDS = (
+        "n_reps", "paid_reps", "n_delays", "prepayments", "on_time", "current_streak", "max_streak",
+        "partial", "n_dpd", "n_overdue", "dpd_30", "dpd_60", "dpd_90", "last_due",
+        "n_loans", "closed_loans", "early_loans", "n_tenure",
+    )
+    _FLOAT_FIELDS = (
+        "delay_mean", "delay_m2", "max_delay", "dpd_sum", "dpd_xsum", "max_dpd", "last_dpd",
+        "overdue_sum", "disbursed_total", "approved_total", "tenure_sum", "growth_sum", "last_approved",
+    )
+    _HEADER = struct.Struct(f"<3sB{len(_INT_FIELDS)}q{len(_FLOAT_FIELDS)}d")
+    _PENDING = struct.Struct("<qqddd")  # due, paid (microseconds), amount_due, amount_paid, legacy dpd
+
+    __slots__ = _INT_FIELDS + _FLOAT_FIELDS + ("late_positions", "pending", "purposes", "partners")
+
+    def __init__(self):
+        for name in self._INT_FIELDS:
+            setattr(self, name, 0)
+        for name in self._FLOAT_FIELDS:
+            setattr(self, name, 0.0)
+        self.max_delay = self.max_dpd = -np.inf
+        self.last_due = _to_us(datetime.min)
+        self.late_positions: List[int] = []
+        self.pending: deque = deque()
+        self.purposes: Counter = Counter()
+        self.partners: Counter = Counter()
+
+    @classmethod
+    def from_history(cls, loans: List[Dict[str, Any]], repayments: List[Dict[str, Any]]) -> "RepaymentFeatureState":
+        """State equivalent to having seen every record of a history."""
+        state = cls()
+        for loan in loans:
+            state.add_loan(loan)
+        for rep in sorted(repayments, key=lambda r: _parse_date(r.get('due_date')) or datetime.min):
+            state.add_repayment(rep)
+        return state
+
+    # --- events ---
+
+    def add_repayment(self, rep: Dict[str, Any]) -> None:
+        """Append one repayment record (compute_features dict format)."""
+        due, paid = _parse_date(rep.get('due_date')), _parse_date(rep.get('paid_date'))
+        key = _to_us(due or datetime.min)
+        if key < self.last_due:
+            raise ValueError("Repayments must be added in due_date order; rebuild with from_history().")
+        dpd = np.nan
+        if not due:
+            if rep.get('dpd') is None:
+                raise ValueError("Repayment record must contain due_date, or a legacy dpd field.")
+            dpd = float(rep['dpd'])
+        self.last_due = key
+        item = (due, paid, float(rep.get('amount_due', 0)), float(rep.get('amount_paid', 0)), dpd)
+        if self.pending or (due and not paid):
+            self.pending.append(item)
+        else:
+            self._fold(item, None)
+
+    def record_payment(self, due_date, paid_date, amount_paid: Optional[float] = None) -> None:
+        """Mark the oldest pending installment due on due_date as paid."""
+        due, paid = _parse_date(due_date), _parse_date(paid_date)
+        if not paid:
+            raise ValueError("paid_date is required")
+        for i, (item_due, item_paid, amount_due, item_amount_paid, dpd) in enumerate(self.pending):
+            if item_due == due and not item_paid:
+                amount = item_amount_paid if amount_paid is None else float(amount_paid)
+                self.pending[i] = (item_due, paid, amount_due, amount, dpd)
+                break
+        else:
+            raise ValueError(f"No pending installment due on {due_date}")
+        while self.pending and not (self.pending[0][0] and not self.pending[0][1]):
+            self._fold(self.pending.popleft(), None)
+
+    def add_loan(self, loan: Dict[str, Any]) -> None:
+        """Append one loan record; loans keep their arrival order."""
+        approved = float(loan.get('approved_amount', 0))
+        if self.n_loans:
+            self.growth_sum += (approved - self.last_approved) / (self.last_approved + 1e-9)
+        self.last_approved = approved
+        self._count_loan(loan, 1)
+
+    def update_loan(self, previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+        """Replace a loan already added (e.g. its status or closed_date changed)."""
+        if float(previous.get('approved_amount', 0)) != float(current.get('approved_amount', 0)):
+            raise ValueError("approved_amount changes need a rebuild with from_history().")
+        self._count_loan(previous, -1)
+        self._count_loan(current, 1)
+
+    def _count_loan(self, loan: Dict[str, Any], sign: int) -> None:
+        self.n_loans += sign
+        self.disbursed_total += sign * float(loan.get('disbursed_amount', 0))
+        self.approved_total += sign * float(loan.get('approved_amount', 0))
+        closed = loan.get('status', '').upper() in _CLOSED_STATUSES
+        self.closed_loans += sign * closed
+        for counts, value in ((self.purposes, loan.get('purpose')), (self.partners, loan.get('channel_partner'))):
+            if value:
+                counts[value] += sign
+                if counts[value] <= 0:
+                    del counts[value]
+        if loan.get('tenure_months'):
+            self.n_tenure += sign
+            self.tenure_sum += sign * float(loan['tenure_months'])
+        closed_date, maturity = _parse_date(loan.get('closed_date')), _parse_date(loan.get('maturity_date'))
+        if closed and closed_date and maturity and (maturity - closed_date).days > 90:
+            self.early_loans += sign
+
+    def _fold(self, item, reference_date: Optional[datetime]) -> None:
+        due, paid, amount_due, amount_paid, dpd = item
+        self.n_reps += 1
+        if paid:
+            self.paid_reps += 1
+            if due:
+                delay = (paid - due).days
+                self.n_delays += 1
+                step = delay - self.delay_mean
+                self.delay_mean += step / self.n_delays
+                self.delay_m2 += step * (delay - self.delay_mean)
+                self.max_delay = max(self.max_delay, delay)
+                if delay < 0:
+                    self.prepayments += 1
+                if delay <= 0:
+                    self.on_time += 1
+                    self.current_streak += 1
+                    self.max_streak = max(self.max_streak, self.current_streak)
+                else:
+                    self.current_streak = 0
+        if amount_due > 0 and 0 < amount_paid < amount_due:
+            self.partial += 1
+
+        if due:
+            dpd = float(max(0, ((paid or reference_date) - due).days))
+        if np.isnan(dpd):
+            return
+        position = self.n_dpd
+        self.n_dpd += 1
+        self.dpd_sum += dpd
+        self.dpd_xsum += position * dpd
+        self.max_dpd = max(self.max_dpd, dpd)
+        self.last_dpd = dpd
+        if dpd > 0:
+            self.n_overdue += 1
+            self.overdue_sum += dpd
+        self.dpd_30 += dpd >= 30
+        self.dpd_60 += dpd >= 60
+        self.dpd_90 += dpd >= 90
+        if dpd > 30:
+            self.late_positions.append(position)
+
+    # --- features ---
+
+    def features(self, reference_date: Optional[datetime] = None) -> Dict[str, float]:
+        """
+        The compute_features() dict. reference_date (default: now) is the
+        date unpaid installments are aged against.
+        """
+        if not self.n_loans and not self.n_reps and not self.pending:
+            return {k: 0.0 for k in FEATURE_NAMES}
+        reference_date = reference_date or datetime.utcnow()
+
+        s = self
+        if self.pending:
+            s = copy.copy(self)
+            s.late_positions = []
+            for item in self.pending:
+                s._fold(item, reference_date)
+
+        features = {}
+        features['emi_hit_rate'] = (s.on_time / s.n_reps * 100) if s.n_reps > 0 else 0.0
+        features['avg_days_past_due'] = (s.overdue_sum / s.n_overdue) if s.n_overdue else 0.0
+        features['max_days_past_due'] = float(s.max_dpd) if s.n_dpd else 0.0
+        features['current_days_past_due'] = float(s.last_dpd) if s.n_dpd else 0.0
+        features['30_plus_dpd_count'] = s.dpd_30
+        features['60_plus_dpd_count'] = s.dpd_60
+        features['90_plus_dpd_count'] = s.dpd_90
+        features['prepayment_ratio'] = (s.prepayments / s.paid_reps) if s.paid_reps > 0 else 0.0
+        features['loan_utilisation_rate'] = (s.disbursed_total / s.approved_total) if s.approved_total > 0 else 0.0
+        features['repeat_borrower_flag'] = 1.0 if s.n_loans >= 2 else 0.0
+        features['tenure_completion_rate'] = (s.closed_loans / s.n_loans) if s.n_loans > 0 else 0.0
+
+        # Least-squares slope of DPD against sequence index, x = 0 .. n-1
+        n = s.n_dpd
+        if n > 1:
+            features['delinquency_trend'] = (s.dpd_xsum - (n - 1) / 2.0 * s.dpd_sum) / (n * (n * n - 1) / 12.0)
+        else:
+            features['delinquency_trend'] = 0.0
+
+        features['avg_loan_size_growth'] = (s.growth_sum / (s.n_loans - 1)) if s.n_loans > 1 else 0.0
+
+        if s.n_delays > 1:
+            std_delay = np.sqrt(max(s.delay_m2, 0.0) / s.n_delays)
+            raw_score = max(0, 1 - (std_delay / max(s.max_delay, 1)))
+            features['payment_consistency_score'] = float(raw_score * 100)
+        else:
+            features['payment_consistency_score'] = 100.0 if s.paid_reps > 0 else 0.0
+
+        features['consecutive_on_time_streak'] = float(s.max_streak)
+
+        max_d = features['max_days_past_due']
+        if max_d == 0: bucket = 0.0
+        elif max_d <= 30: bucket = 1.0
+        elif max_d <= 60: bucket = 2.0
+        elif max_d <= 90: bucket = 3.0
+        else: bucket = 4.0
+        features['worst_delinquency_bucket'] = bucket
+
+        features['partial_payment_rate'] = (s.partial / s.n_reps) if s.n_reps > 0 else 0.0
+        features['loan_purpose_diversity'] = float(len(s.purposes))
+        features['avg_loan_tenure_months'] = (s.tenure_sum / s.n_tenure) if s.n_tenure else 0.0
+
+        late_due = len(self.late_positions) + (len(s.late_positions) if s is not self else 0)
+        late_paid = bisect.bisect_left(self.late_positions, s.n_delays)
+        if s is not self:
+            late_paid += bisect.bisect_left(s.late_positions, s.n_delays)
+        features['recovery_rate'] = (late_paid / late_due) if late_due > 0 else 1.0
+
+        features['early_repayment_flag'] = 1.0 if s.early_loans > 0 else 0.0
+        features['channel_partner_diversity'] = float(len(s.partners))
+        features['on_time_payment_ratio'] = features['emi_hit_rate'] / 100.0
+        features['late_payment_ratio'] = 1.0 - features['on_time_payment_ratio']
+
+        for k, v in features.items():
+            if np.isnan(v):
+                features[k] = 0.0
+        return {k: features[k] for k in FEATURE_NAMES}
+
+    # --- serialization ---
+
+    def to_bytes(self) -> bytes:
+        """Compact little-endian blob; from_bytes() restores the state."""
+        parts = [self._HEADER.pack(
+            _STATE_MAGIC, _STATE_VERSION,
+            *(getattr(self, name) for name in self._INT_FIELDS),
+            *(getattr(self, name) for name in self._FLOAT_FIELDS),
+        )]
+        parts.append(struct.pack(f"<I{len(self.late_positions)}I", len(self.late_positions), *self.late_positions))
+        parts.append(struct.pack("<I", len(self.pending)))
+        for due, paid, amount_due, amount_paid, dpd in self.pending:
+            parts.append(self._PENDING.pack(_to_us(due), _to_us(paid), amount_due, amount_paid, dpd))
+        for counts in (self.purposes, self.partners):
+            parts.append(struct.pack("<I", len(counts)))
+            for value, count in counts.items():
+                encoded = str(value).encode("utf-8")
+                parts.append(struct.pack(f"<H{len(encoded)}sI", len(encoded), encoded, count))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "RepaymentFeatureState":
+        header = cls._HEADER.unpack_from(blob, 0)
+        if header[0] != _STATE_MAGIC or header[1] != _STATE_VERSION:
+            raise ValueError(f"Not a repayment feature state (version {_STATE_VERSION}) blob")
+        state = cls()
+        values = header[2:]
+        for name, value in zip(cls._INT_FIELDS + cls._FLOAT_FIELDS, values):
+            setattr(state, name, value)
+        offset = cls._HEADER.size
+
+        (n_late,) = struct.unpack_from("<I", blob, offset)
+        state.late_positions = list(struct.unpack_from(f"<{n_late}I", blob, offset + 4))
+        offset += 4 + 4 * n_late
+
+        (n_pending,) = struct.unpack_from("<I", blob, offset)
+        offset += 4
+        for _ in range(n_pending):
+            due, paid, amount_due, amount_paid, dpd = cls._PENDING.unpack_from(blob, offset)
+            state.pending.append((_from_us(due), _from_us(paid), amount_due, amount_paid, dpd))
+            offset += cls._PENDING.size
+
+        for counts in (state.purposes, state.partners):
+            (n_values,) = struct.unpack_from("<I", blob, offset)
+            offset += 4
+            for _ in range(n_values):
+                (length,) = struct.unpack_from("<H", blob, offset)
+                encoded, count = struct.unpack_from(f"<{length}sI", blob, offset + 2)
+                counts[encoded.decode("utf-8")] = count
+                offset += 2 + length + 4
+        return state
@@ -0,0 +1,183 @@
+"""
+request_profiler.py
+
+Opt-in sampling profiler for scoring requests.
+
+While a request is being profiled, one daemon thread per process reads the
+request thread's Python stack every ML_API_PROFILE_INTERVAL_MS via
+sys._current_frames() and counts identical stacks. Nothing is patched into
+the scoring code, and requests that are not being profiled pay only a
+counter increment.
+
+Profiles are written as folded stacks ("outer;inner;leaf <samples>" per
+line). speedscope, flamegraph.pl and inferno render them as flame graphs.
+
+Modes:
+    every    profile one request in ML_API_PROFILE_EVERY_N and write each one
+    slowest  profile every request, keep files only for the
+             ML_API_PROFILE_KEEP slowest seen so far (per process)
+
+The sampler only gets the GIL at the interpreter's switch interval (5 ms
+by default), so requests much shorter than that yield few samples.
+
+Configuration (environment):
+    ML_API_PROFILE              off | every | slowest       (default: off)
+    ML_API_PROFILE_EVERY_N      sampling rate for "every"   (default: 100)
+    ML_API_PROFILE_KEEP         files kept for "slowest"    (default: 10)
+    ML_API_PROFILE_INTERVAL_MS  stack sampling interval     (default: 5)
+    ML_API_PROFILE_DIR          output directory            (default: profiles)
+"""
+
+import heapq
+import itertools
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_MODES = ("off", "every", "slowest")
+
+PROFILE_MODE = os.getenv("ML_API_PROFILE", "off").strip().lower()
+PROFILE_EVERY_N = int(os.getenv("ML_API_PROFILE_EVERY_N", "100"))
+PROFILE_KEEP = int(os.getenv("ML_API_PROFILE_KEEP", "10"))
+PROFILE_INTERVAL_MS = float(os.getenv("ML_API_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("ML_API_PROFILE_DIR", "profiles")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def fold_stack(frame) -> str:
+    """Root-first, ';'-joined stack for one frame."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class SamplingProfiler:
+    def __init__(
+        self,
+        mode: str = PROFILE_MODE,
+        every_n: int = PROFILE_EVERY_N,
+        keep: int = PROFILE_KEEP,
+        interval_ms: float = PROFILE_INTERVAL_MS,
+        directory: str = PROFILE_DIR,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        if every_n < 1:
+            raise ValueError("every_n must be at least 1")
+        if keep < 1:
+            raise ValueError("keep must be at least 1")
+        self.mode = mode
+        self.every_n = every_n
+        self.keep = keep
+        self.interval = interval_ms / 1000.0
+        self.directory = directory
+
+        self._counter = itertools.count(1)
+        self._targets: Dict[int, Counter] = {}
+        self._kept: List[Tuple[float, str]] = []  # min-heap of (elapsed, path)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _ensure_sampler(self) -> None:
+        # Threads do not survive a fork: start one per process
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._targets = {}
+            self._kept = []
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                targets = list(self._targets)
+            if not targets:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            samples = [
+                (tid, fold_stack(frames[tid]))
+                for tid in targets
+                if tid in frames and tid != me
+            ]
+            del frames
+            # finish() pops a target under the lock before writing it, so
+            # counting under the lock never touches a profile being written
+            with self._lock:
+                for tid, stack in samples:
+                    stacks = self._targets.get(tid)
+                    if stacks is not None:
+                        stacks[stack] += 1
+            self._wake.wait(self.interval)
+
+    def begin(self) -> Optional[int]:
+        """
+        Start sampling the calling thread if this request is picked.
+        Returns a token for finish(), or None when not profiling.
+        """
+        if self.mode == "off":
+            return None
+        if self.mode == "every" and next(self._counter) % self.every_n:
+            return None
+        tid = threading.get_ident()
+        with self._lock:
+            self._ensure_sampler()
+            self._targets[tid] = Counter()
+        self._wake.set()
+        return tid
+
+    def finish(self, token: Optional[int], elapsed: float, name: str = "request") -> Optional[str]:
+        """Stop sampling; write the profile if it is kept. Returns its path."""
+        if token is None:
+            return None
+        with self._lock:
+            stacks = self._targets.pop(token, None)
+            if not stacks:
+                return None
+            if self.mode == "slowest" and len(self._kept) >= self.keep and elapsed <= self._kept[0][0]:
+                return None
+
+        path = self._write(stacks, elapsed, name)
+
+        if self.mode == "slowest":
+            with self._lock:
+                heapq.heappush(self._kept, (elapsed, path))
+                evicted = heapq.heappop(self._kept) if len(self._kept) > self.keep else None
+            if evicted is not None:
+                try:
+                    os.remove(evicted[1])
+                except OSError:
+                    pass
+        return path
+
+    def _write(self, stacks: Counter, elapsed: float, name: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(
+            self.directory, f"{stamp}_{name}_{elapsed * 1000:.0f}ms_{os.getpid()}.folded"
+        )
+        with open(path, "w") as fh:
+            for stack, count in stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+        return path
+
+
+request_profiler = SamplingProfiler()
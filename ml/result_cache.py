@@ -0,0 +1,254 @@
+"""
+result_cache.py
+
+Idempotent result cache for /apply_direct.
+
+The frontend and the Next.js backend retry on timeouts, and a retry is the
+same application scored by the same model. ResultCache stores finished
+responses under a key derived from the application payload and the model
+version, so a retry is answered from memory without touching the executor:
+
+    memory   bounded LRU with a TTL, per API process
+    redis    optional shared tier (redis.asyncio, imported lazily); errors
+             are logged and treated as a miss, never as a failed request
+    inflight a duplicate that arrives while the first request is still
+             being scored waits for that result instead of scoring again
+
+payload_fingerprint() hashes the scoring-relevant fields of the payload:
+everything except CACHE_KEY_EXCLUDED_FIELDS (contact details that never
+reach the model, the composite score or the agent message). The
+application_id is kept because it is echoed in the response; the API
+does not cache requests without one (unless they carry an Idempotency-Key),
+since it generates a fresh id for each. A client-supplied Idempotency-Key
+replaces the payload hash as the key; reusing a key with a different
+payload raises IdempotencyConflict.
+
+Configuration (environment):
+    ML_API_RESULT_CACHE_SIZE       entries kept in memory (default: 10000; 0 disables)
+    ML_API_RESULT_CACHE_TTL        seconds an entry lives (default: 300)
+    ML_API_RESULT_CACHE_REDIS_URL  enables the Redis tier (default: unset)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from prometheus_client import Counter
+
+from structured_log import api_log
+
+RESULT_CACHE_SIZE = int(os.getenv("ML_API_RESULT_CACHE_SIZE", "10000"))
+RESULT_CACHE_TTL = float(os.getenv("ML_API_RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_REDIS_URL = os.getenv("ML_API_RESULT_CACHE_REDIS_URL", "")
+
+CACHE_KEY_EXCLUDED_FIELDS = frozenset({"email", "mobile"})
+
+CACHE_LOOKUPS = Counter(
+    "ml_api_result_cache_lookups_total",
+    "Result cache lookups by outcome",
+    ["outcome"],  # memory_hit | redis_hit | coalesced | miss
+)
+
+
+class IdempotencyConflict(ValueError):
+    """Idempotency-Key was already used for a different payload."""
+
+
+def _json_default(value: Any) -> Any:
+    # numpy scalars and anything else json does not know
+    item = getattr(value, "item", None)
+    if callable(item):
+        return item()
+    return str(value)
+
+
+def payload_fingerprint(payload: Dict[str, Any]) -> str:
+    """Canonical hash of the scoring-relevant fields of a payload."""
+    relevant = {k: v for k, v in payload.items() if k not in CACHE_KEY_EXCLUDED_FIELDS}
+    canonical = json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=_json_default)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def cache_key(fingerprint: str, model_version: str, idempotency_key: Optional[str] = None) -> str:
+    if idempotency_key:
+        return f"idem:{idempotency_key}"
+    return f"payload:{model_version}:{fingerprint}"
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = RESULT_CACHE_SIZE,
+        ttl: float = RESULT_CACHE_TTL,
+        redis_url: str = RESULT_CACHE_REDIS_URL,
+        namespace: str = "ml:result:",
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.namespace = namespace
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Tuple[str, "asyncio.Future"]] = {}
+        self._redis = None
+        self.counts = {"memory_hit": 0, "redis_hit": 0, "coalesced": 0, "miss": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _count(self, outcome: str) -> None:
+        self.counts[outcome] += 1
+        CACHE_LOOKUPS.labels(outcome).inc()
+
+    # --- memory tier ---
+
+    def _get_local(self, key: str) -> Optional[Tuple[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, fingerprint, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return fingerprint, value
+
+    def _set_local(self, key: str, fingerprint: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, fingerprint, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- redis tier ---
+
+    def _get_redis(self):
+        if not self.redis_url:
+            return None
+        if self._redis is None:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    async def _redis_get(self, key: str) -> Optional[Tuple[str, Any]]:
+        client = self._get_redis()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(self.namespace + key)
+        except Exception as e:
+            api_log.warning("result_cache_redis_error", op="get", error=str(e))
+            return None
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw)
+            return entry["fingerprint"], entry["value"]
+        except (ValueError, KeyError, TypeError) as e:
+            # Corrupt or foreign value under our namespace: a miss, not a failed request
+            api_log.warning("result_cache_redis_error", op="decode", error=str(e))
+            return None
+
+    async def _redis_set(self, key: str, fingerprint: str, value: Any) -> None:
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            raw = json.dumps({"fingerprint": fingerprint, "value": value}, default=_json_default)
+            await client.set(self.namespace + key, raw, ex=max(1, int(self.ttl)))
+        except Exception as e:
+            api_log.warning("result_cache_redis_error", op="set", error=str(e))
+
+    # --- public ---
+
+    async def get(self, key: str, fingerprint: str) -> Optional[Any]:
+        """Cached value or None. Raises IdempotencyConflict on a payload mismatch."""
+        found = self._get_local(key)
+        outcome = "memory_hit"
+        if found is None:
+            found = await self._redis_get(key)
+            outcome = "redis_hit"
+            if found is not None:
+                self._set_local(key, *found)
+        if found is None:
+            return None
+        if found[0] != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different payload")
+        self._count(outcome)
+        return found[1]
+
+    async def set(self, key: str, fingerprint: str, value: Any) -> None:
+        self._set_local(key, fingerprint, value)
+        await self._redis_set(key, fingerprint, value)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        fingerprint: str,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """
+        Cached value, or the result of compute() stored for next time.
+        Returns (value, hit). Exceptions from compute() are not cached and
+        propagate to every waiter.
+        """
+        if not self.enabled:
+            return await compute(), False
+
+        cached = await self.get(key, fingerprint)
+        if cached is not None:
+            return cached, True
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            if pending[0] != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key is in use for a different payload")
+            self._count("coalesced")
+            return await asyncio.shield(pending[1]), True
+
+        self._count("miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (fingerprint, future)
+        try:
+            value = await compute()
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            await self.set(key, fingerprint, value)
+            future.set_result(value)
+            return value, False
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = sum(self.counts.values())
+        hits = lookups - self.counts["miss"]
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "redis": bool(self.redis_url),
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            **self.counts,
+        }
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            try:
+                await self._redis.close()
+            finally:
+                self._redis = None
@@ -4,6 +4,8 @@ Scoring utilities for SafeCred.
 
 Provides:
 - compute_composite_score(features, training_stats=None)
+- compute_composite_scores_batch(df) (vectorized, identical to the scalar path)
+- compute_composite_scores(features_list) (vectorized, full breakdowns)
 - combine_ml_and_composite(ml_prob, composite_score, ml_weight=0.6)
 - map_sci_to_riskband(final_sci, socio_flag, thresholds=(70,50))
 - aggregate_loan_history_metrics(loan_history_df, user_id)
@@ -16,12 +18,13 @@ Features expected: numeric keys produced by your parsers/features:
 All missing values are handled gracefully.
 """
 
-from typing import Dict, Optional, Tuple
-import math
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
-# ---- Defaults / caps (tunable) ----
+from model_registry import registry
+
+# ---- Defaults / caps (tunable; model_metadata.json may override via model_registry) ----
 DEFAULT_CAPS = {
     "income_cap": 40000.0,      # 90th pct income proxy
     "std_cap": 20000.0,         # large std => unstable
@@ -39,285 +42,367 @@ PILLAR_WEIGHTS = {
     "history": 0.15
 }
 
+# Pillar weights per evaluation strategy chosen in compute_subscores
+SEGMENT_PILLAR_WEIGHTS = {
+    # 🆕 NEW USERS / NO BANK DATA: heavy reliance on alternative proxies
+    "new_user_no_bank_data": {
+        "financial": 0.15,      # Limited financial data, use declared income
+        "repayment": 0.10,      # No repayment history
+        "consumption": 0.50,    # 🔥 HIGH weight on alternative proxies
+        "history": 0.25         # Check for any previous loan patterns
+    },
+    # 🏚️ POOR / LOW-INCOME USERS: alternative proxies + loan-to-income ratio
+    "low_income_alternative_proxies": {
+        "financial": 0.20,
+        "repayment": 0.20,
+        "consumption": 0.45,
+        "history": 0.15
+    },
+    # 💰 HIGH-INCOME, NO REPAYMENT HISTORY: mandatory manual review
+    "high_income_no_history_manual_review": {
+        "financial": 0.60,      # Income verification only
+        "repayment": 0.00,      # No history available
+        "consumption": 0.00,    # 🚫 BLOCKED - prevent proxy misuse
+        "history": 0.40         # General creditworthiness check
+    },
+    # 💰 HIGH-INCOME WITH HISTORY: proven repayment track record only
+    "high_income_repayment_only": {
+        "financial": 0.30,      # Basic income verification
+        "repayment": 0.60,      # 🔥 PRIMARY: Proven repayment behavior
+        "consumption": 0.00,    # 🚫 BLOCKED - no alternative proxies
+        "history": 0.10         # Historical loan performance
+    },
+}
+
+# Segment codes used by the vectorized engine, in SEGMENT_PILLAR_WEIGHTS order
+_SEGMENTS = list(SEGMENT_PILLAR_WEIGHTS)
+_PILLARS = ["financial", "repayment", "consumption", "history"]
+_SEGMENT_WEIGHT_TABLE = np.array(
+    [[SEGMENT_PILLAR_WEIGHTS[s][p] for p in _PILLARS] for s in _SEGMENTS],
+    dtype=np.float64,
+)
+
+_CONSENT_KEYS = [
+    "consent_recharge",
+    "consent_electricity",
+    "consent_education",
+    "consent_bank",
+    "consent_bank_statement",
+]
+
 def _safe_div(a, b, default=0.0):
     try:
         return a / b
     except Exception:
         return default
 
-def _clip01(x: float) -> float:
-    if x is None or (isinstance(x, float) and math.isnan(x)):
-        return 0.0
-    return float(max(0.0, min(1.0, x)))
+def _clip01(x: np.ndarray) -> np.ndarray:
+    """Elementwise float(max(0.0, min(1.0, x))) with NaN mapped to 0.0."""
+    clipped = np.where(x < 1.0, x, 1.0)
+    clipped = np.where(clipped > 0.0, clipped, 0.0)
+    return np.where(np.isnan(x), 0.0, clipped)
+
+def _truthy(values: np.ndarray, missing: np.ndarray) -> np.ndarray:
+    """Python truthiness per cell: None and 0 are falsy, NaN is truthy."""
+    return ~missing & (values != 0)
+
+
+class _Columns:
+    """Column access over a DataFrame, a list of feature dicts or a single dict.
+
+    get() returns (values, missing) where values is float64 and missing marks
+    cells holding None (or an absent key), mirroring dict.get() semantics.
+    NaN is treated as a present value, like it is in the scalar path.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._single = isinstance(data, dict)
+        self._records = isinstance(data, (list, tuple))
+        self.n = 1 if self._single else len(data)
+
+    def present(self, key: str) -> np.ndarray:
+        """Per-row `key in features`."""
+        if self._records:
+            return np.fromiter((key in r for r in self._data), dtype=bool, count=self.n)
+        return np.full(self.n, key in self._data)
+
+    def get(self, key: str, default: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        n = self.n
+        if self._records:
+            raw = np.empty(n, dtype=object)
+            raw[:] = [r.get(key, default) for r in self._data]
+        elif key not in self._data:
+            if default is None:
+                return np.full(n, np.nan), np.ones(n, dtype=bool)
+            return np.full(n, float(default)), np.zeros(n, dtype=bool)
+        elif self._single:
+            raw = self._data[key]
+            if raw is None:
+                return np.full(1, np.nan), np.ones(1, dtype=bool)
+            return np.full(1, float(raw)), np.zeros(1, dtype=bool)
+        else:
+            raw = self._data[key]
+            raw = raw.to_numpy() if hasattr(raw, "to_numpy") else np.asarray(raw)
+            if raw.dtype.kind in "biuf":
+                return raw.astype(np.float64), np.zeros(n, dtype=bool)
+
+        missing = np.fromiter((v is None for v in raw), dtype=bool, count=n)
+        values = np.fromiter(
+            (np.nan if v is None else float(v) for v in raw), dtype=np.float64, count=n
+        )
+        return values, missing
+
+    def get_first(self, key: str, fallback_key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """features.get(key), falling back to features.get(fallback_key) where it is None."""
+        values, missing = self.get(key)
+        if missing.any():
+            alt_values, alt_missing = self.get(fallback_key)
+            values = np.where(missing, alt_values, values)
+            missing = missing & alt_missing
+        return values, missing
 
-def compute_subscores(features: Dict, caps: Optional[Dict] = None) -> Dict:
-    """Compute normalized sub-scores (0..1) for pillars. Returns breakdown dict."""
-    caps = caps or DEFAULT_CAPS
+
+def _score_columns(cols: _Columns, caps: Dict, barrier) -> Dict[str, np.ndarray]:
+    """
+    Vectorized scoring engine shared by the scalar and batch entry points.
+
+    Every rule of the per-applicant strategy (segments, pillar weights,
+    penalties, bonuses) is evaluated as a boolean mask over whole columns.
+    Arithmetic is performed in the same order as the original scalar code so
+    results are bit-for-bit identical.
+    """
+    n = cols.n
 
     # --- Financial Subcomponents ---
-    monthly = features.get("monthly_credits")
-    if monthly is None:
-        monthly = features.get("bank_monthly_credits")
-
-    declared_income = features.get("declared_income", 0.0)
-    income_baseline = monthly or declared_income
-    income_score = _clip01((income_baseline or 0.0) / caps["income_cap"])
-
-    salary_std = features.get("salary_std")
-    if salary_std is None:
-        salary_std = features.get("bank_salary_std")
-    stability_score = 1.0 - _clip01((salary_std or 0.0) / caps["std_cap"])
-
-    avg_balance = features.get("avg_balance")
-    if avg_balance is None:
-        avg_balance = features.get("bank_avg_balance")
-    balance_score = _clip01((avg_balance or 0.0) / caps["balance_cap"])
-
-    consent_flags = [
-        features.get("consent_recharge"),
-        features.get("consent_electricity"),
-        features.get("consent_education"),
-        features.get("consent_bank"),
-        features.get("consent_bank_statement"),
-    ]
-    consent_values = [flag for flag in consent_flags if flag is not None]
-    consent_depth = (
-        sum(1 for flag in consent_values if bool(flag)) / len(consent_values)
-        if consent_values
-        else 0.0
+    monthly, monthly_missing = cols.get_first("monthly_credits", "bank_monthly_credits")
+    declared, declared_missing = cols.get("declared_income", 0.0)
+
+    # income_baseline = monthly or declared_income; income = income_baseline or 0.0
+    monthly_truthy = _truthy(monthly, monthly_missing)
+    income = np.where(
+        monthly_truthy,
+        monthly,
+        np.where(_truthy(declared, declared_missing), declared, 0.0),
     )
+    income_score = _clip01(income / caps["income_cap"])
 
-    fair_lending_bonus = 0.0
-    fraud_risk_penalty = 0.0
-    affluence_penalty = 0.0
-    income_volatility_relief = 0.0
+    salary_std, salary_std_missing = cols.get_first("salary_std", "bank_salary_std")
+    salary_std = np.where(_truthy(salary_std, salary_std_missing), salary_std, 0.0)
+    stability_score = 1.0 - _clip01(salary_std / caps["std_cap"])
+
+    avg_balance, avg_balance_missing = cols.get_first("avg_balance", "bank_avg_balance")
+    avg_balance_truthy = _truthy(avg_balance, avg_balance_missing)
+    balance_score = _clip01(np.where(avg_balance_truthy, avg_balance, 0.0) / caps["balance_cap"])
+
+    consent_given = np.zeros(n)
+    consent_present = np.zeros(n)
+    for key in _CONSENT_KEYS:
+        values, missing = cols.get(key)
+        consent_present += ~missing
+        consent_given += _truthy(values, missing)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        consent_depth = np.where(consent_present > 0, consent_given / consent_present, 0.0)
 
     # --- Detect newcomer (no previous loans) ---
-    prev_loans = features.get("previous_loans_count", 0)
+    prev_loans, _ = cols.get("previous_loans_count", 0)
     is_new_user = prev_loans == 0
 
     # --- Repayment Subcomponents ---
-    if is_new_user:
-        ontime_score = 0.5
-        delay_score = 0.5
-    else:
-        on_time = features.get("on_time_ratio")
-        ontime_score = _clip01(on_time if on_time is not None else 0.0)
-        avg_delay = features.get("avg_payment_delay_days")
-        delay_score = 1.0 - _clip01((avg_delay or 0.0) / caps["delay_cap"])
+    on_time, on_time_missing = cols.get("on_time_ratio")
+    avg_delay, avg_delay_missing = cols.get("avg_payment_delay_days")
+    avg_delay = np.where(_truthy(avg_delay, avg_delay_missing), avg_delay, 0.0)
+    ontime_score = np.where(
+        is_new_user, 0.5, _clip01(np.where(on_time_missing, 0.0, on_time))
+    )
+    delay_score = np.where(is_new_user, 0.5, 1.0 - _clip01(avg_delay / caps["delay_cap"]))
 
     # --- Consumption Subcomponents ---
-    bill_consistency = features.get("bill_consistency")
-    if bill_consistency is None:
-        bill_consistency = features.get("elec_bill_consistency")
-    elec_consistency_score = 1.0 - _clip01((bill_consistency or 0.0) / caps["bill_consistency_cap"])
-    recharge_freq = features.get("recharge_freq_per_month")
-    if recharge_freq is None:
-        recharge_freq = features.get("recharge_recharge_freq_per_month")
-    recharge_score = _clip01((recharge_freq or 0.0) / caps["recharge_freq_cap"])
+    bill_consistency, bill_missing = cols.get_first("bill_consistency", "elec_bill_consistency")
+    bill_consistency = np.where(_truthy(bill_consistency, bill_missing), bill_consistency, 0.0)
+    elec_consistency_score = 1.0 - _clip01(bill_consistency / caps["bill_consistency_cap"])
+    recharge_freq, recharge_missing = cols.get_first(
+        "recharge_freq_per_month", "recharge_recharge_freq_per_month"
+    )
+    recharge_freq = np.where(_truthy(recharge_freq, recharge_missing), recharge_freq, 0.0)
+    recharge_score = _clip01(recharge_freq / caps["recharge_freq_cap"])
 
     # --- Education proxy (only active if user has children) ---
-    has_children = features.get("has_children", 0)
-    if has_children:
-        edu_consistency = features.get("edu_fee_consistency", 0.5)
-        edu_ontime = features.get("edu_on_time_payment_ratio", 0.5)
-    else:
-        edu_consistency, edu_ontime = 0.5, 0.5
+    has_children, has_children_missing = cols.get("has_children", 0)
+    has_children = _truthy(has_children, has_children_missing)
+    edu_fee, edu_fee_missing = cols.get("edu_fee_consistency", 0.5)
+    edu_ot, edu_ot_missing = cols.get("edu_on_time_payment_ratio", 0.5)
+    edu_consistency = np.where(has_children & ~edu_fee_missing, edu_fee, 0.5)
+    edu_ontime = np.where(has_children & ~edu_ot_missing, edu_ot, 0.5)
     education_score = 0.6 * edu_consistency + 0.4 * edu_ontime
 
     # --- History Subcomponents ---
-    prev_repay_ratio = features.get("avg_prev_repayment_ratio")
-    history_score = _clip01(prev_repay_ratio if prev_repay_ratio is not None else 0.5)
-
-    # --- Load dynamic income barrier safely ---
-    import os, json
-    ROOT = os.path.dirname(__file__)
-    META_PATH = os.path.join(ROOT, "models", "model_metadata.json")
-    try:
-        with open(META_PATH, "r") as f:
-            meta = json.load(f)
-            barrier = float(meta.get("dynamic_income_barrier", 15000))
-    except Exception:
-        barrier = 15000  # fallback default
+    prev_repay, prev_repay_missing = cols.get("avg_prev_repayment_ratio")
+    history_score = np.where(prev_repay_missing, 0.5, _clip01(prev_repay))
 
     # --- Adjust pillar weights based on income & data availability ---
-    # 🎯 ENHANCED LOGIC: Different evaluation strategies for different income groups
-
-    has_bank_data = features.get("_has_real_bank_data", bool(monthly and avg_balance))
-    income = income_baseline or 0.0
-    loan_amount = features.get("loan_amount", 0)
+    bank_flag, bank_flag_missing = cols.get("_has_real_bank_data")
+    has_bank_data = np.where(
+        cols.present("_has_real_bank_data"),
+        _truthy(bank_flag, bank_flag_missing),
+        monthly_truthy & avg_balance_truthy,
+    )
 
-    # Calculate loan-to-income ratio (important for all users)
-    loan_to_income_ratio = _safe_div(loan_amount, income, default=0.0) if income > 0 else 0.0
+    loan_amount, loan_missing = cols.get("loan_amount", 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        loan_to_income_ratio = np.where(
+            income > 0, np.where(loan_missing, 0.0, loan_amount / income), 0.0
+        )
 
     # Provide relief for low-income applicants with irregular cashflows
-    if income > 0 and income < barrier:
-        stability_floor = 0.6
-        balance_floor = 0.5
-        if stability_score < stability_floor:
-            income_volatility_relief += stability_floor - stability_score
-            stability_score = stability_floor
-        if balance_score < balance_floor:
-            income_volatility_relief += balance_floor - balance_score
-            balance_score = balance_floor
-        income_volatility_relief = min(1.0, income_volatility_relief)
+    relief_band = (income > 0) & (income < barrier)
+    stability_relief = relief_band & (stability_score < 0.6)
+    income_volatility_relief = np.where(stability_relief, 0.6 - stability_score, 0.0)
+    stability_score = np.where(stability_relief, 0.6, stability_score)
+    balance_relief = relief_band & (balance_score < 0.5)
+    income_volatility_relief = np.where(
+        balance_relief, income_volatility_relief + (0.5 - balance_score), income_volatility_relief
+    )
+    balance_score = np.where(balance_relief, 0.5, balance_score)
+    income_volatility_relief = np.where(
+        relief_band & ~(income_volatility_relief < 1.0), 1.0, income_volatility_relief
+    )
 
     # Determine user segment
-    user_segment = "unknown"
-    pillar_weights_local = dict(PILLAR_WEIGHTS)
-
-    if not has_bank_data:
-        # 🆕 NEW USERS / NO BANK DATA
-        # Strategy: Heavy reliance on alternative proxies + anti-fraud checks
-        user_segment = "new_user_no_bank_data"
-        pillar_weights_local = {
-            "financial": 0.15,      # Limited financial data, use declared income
-            "repayment": 0.10,      # No repayment history
-            "consumption": 0.50,    # 🔥 HIGH weight on alternative proxies
-            "history": 0.25         # Check for any previous loan patterns
-        }
+    no_bank = ~has_bank_data
+    low_income = has_bank_data & (income < barrier)
+    high_income = has_bank_data & ~low_income
+    high_no_history = high_income & (is_new_user | (prev_loans < 2))
+    segment = np.select(
+        [no_bank, low_income, high_no_history],
+        [
+            _SEGMENTS.index("new_user_no_bank_data"),
+            _SEGMENTS.index("low_income_alternative_proxies"),
+            _SEGMENTS.index("high_income_no_history_manual_review"),
+        ],
+        default=_SEGMENTS.index("high_income_repayment_only"),
+    )
+    weights = _SEGMENT_WEIGHT_TABLE[segment]
+
+    # 🚨 ANTI-FRAUD: new users asking for >50% of monthly income,
+    # high-income users without history forced to manual review
+    fraud_risk_penalty = np.where(no_bank & (loan_to_income_ratio > 0.5), 0.20, 0.0)
+    fraud_risk_penalty = np.where(high_no_history, 0.25, fraud_risk_penalty)
+    # Stricter loan-to-income enforcement for high earners
+    fraud_risk_penalty = np.where(
+        high_income & (loan_to_income_ratio > 1.0),
+        fraud_risk_penalty + 0.30,
+        np.where(
+            high_income & (loan_to_income_ratio > 0.8),
+            fraud_risk_penalty + 0.20,
+            fraud_risk_penalty,
+        ),
+    )
 
-        # 🚨 ANTI-FRAUD: New users get penalty if loan amount is too high relative to income
-        if loan_to_income_ratio > 0.5:  # Asking for >50% of monthly income
-            fraud_risk_penalty = 0.20  # 20% penalty on composite score
-
-    elif income < barrier:
-        # 🏚️ POOR / LOW-INCOME USERS (Below barrier, e.g., <₹15K/month)
-        # Strategy: Evaluate through ALTERNATIVE PROXIES + Loan-to-Income Ratio
-        user_segment = "low_income_alternative_proxies"
-        pillar_weights_local = {
-            "financial": 0.20,
-            "repayment": 0.20,
-            "consumption": 0.45,
-            "history": 0.15
-        }
+    fair_lending_bonus = np.zeros(n)
+    fair_lending_bonus = np.where(
+        low_income & (loan_to_income_ratio < 0.3), fair_lending_bonus + 0.05, fair_lending_bonus
+    )
+    fair_lending_bonus = np.where(
+        low_income & (consent_depth >= 0.5), fair_lending_bonus + 0.03, fair_lending_bonus
+    )
+    fair_lending_bonus = np.where(
+        no_bank & (consent_depth >= 0.5), fair_lending_bonus + 0.02, fair_lending_bonus
+    )
 
-        if loan_to_income_ratio < 0.3:
-            fair_lending_bonus += 0.05  # Encourage right-sized borrowing
-        if consent_depth >= 0.5:
-            fair_lending_bonus += 0.03  # Reward data-sharing for underserved users
+    consent_relief = (consent_depth >= 0.75) & (fraud_risk_penalty > 0)
+    relieved = fraud_risk_penalty - 0.05
+    fraud_risk_penalty = np.where(
+        consent_relief, np.where(relieved > 0.0, relieved, 0.0), fraud_risk_penalty
+    )
 
-    else:
-        # 💰 HIGH-INCOME USERS (Above barrier, e.g., ≥₹15K/month)
-        # Strategy: STRICT REPAYMENT HISTORY ONLY - NO alternative proxies to prevent misuse
-        user_segment = "high_income_repayment_only"
-        
-        # 🚨 CRITICAL: High-income users CANNOT use alternative proxies
-        # They must have verifiable repayment history OR will be manually reviewed
-        
-        if is_new_user or prev_loans < 2:
-            # High-income user with NO repayment history
-            # Flag for mandatory manual review - cannot rely on proxies
-            user_segment = "high_income_no_history_manual_review"
-            pillar_weights_local = {
-                "financial": 0.60,      # Income verification only
-                "repayment": 0.00,      # No history available
-                "consumption": 0.00,    # 🚫 BLOCKED - prevent proxy misuse
-                "history": 0.40         # General creditworthiness check
-            }
-            # Auto-flag for manual review
-            fraud_risk_penalty = 0.25  # Heavy penalty forces manual review
-        else:
-            # High-income user WITH repayment history
-            # Evaluate ONLY on proven repayment track record
-            pillar_weights_local = {
-                "financial": 0.30,      # Basic income verification
-                "repayment": 0.60,      # 🔥 PRIMARY: Proven repayment behavior
-                "consumption": 0.00,    # 🚫 BLOCKED - no alternative proxies
-                "history": 0.10         # Historical loan performance
-            }
-        
-        # Stricter loan-to-income enforcement for high earners
-        if loan_to_income_ratio > 1.0:  # Asking for more than monthly income
-            fraud_risk_penalty += 0.30  # Severe penalty - likely fraud
-        elif loan_to_income_ratio > 0.8:  # Asking for >80% of monthly income
-            fraud_risk_penalty += 0.20
-
-    if not has_bank_data and consent_depth >= 0.5:
-        fair_lending_bonus += 0.02
-
-    if consent_depth >= 0.75 and fraud_risk_penalty > 0:
-        fraud_risk_penalty = max(0.0, fraud_risk_penalty - 0.05)
-
-    if income >= barrier * 2:
-        if consent_depth < 0.5:
-            affluence_penalty += min(0.2, 0.1 + (0.5 - consent_depth) * 0.3)
-        lifestyle_signal = features.get("lifestyle_index", 0.0)
-        if lifestyle_signal and lifestyle_signal > 0.75 and loan_to_income_ratio > 0.4:
-            affluence_penalty += 0.05
-
-    fraud_risk_penalty = min(0.35, max(0.0, fraud_risk_penalty + affluence_penalty))
+    affluent = income >= barrier * 2
+    shallow_consent = 0.1 + (0.5 - consent_depth) * 0.3
+    affluence_penalty = np.where(
+        affluent & (consent_depth < 0.5),
+        np.where(shallow_consent < 0.2, shallow_consent, 0.2),
+        0.0,
+    )
+    lifestyle, lifestyle_missing = cols.get("lifestyle_index", 0.0)
+    lifestyle_flag = (
+        affluent
+        & _truthy(lifestyle, lifestyle_missing)
+        & (lifestyle > 0.75)
+        & (loan_to_income_ratio > 0.4)
+    )
+    affluence_penalty = np.where(lifestyle_flag, affluence_penalty + 0.05, affluence_penalty)
+
+    combined = fraud_risk_penalty + affluence_penalty
+    combined = np.where(combined > 0.0, combined, 0.0)
+    fraud_risk_penalty = np.where(combined < 0.35, combined, 0.35)
 
     # --- Pillar-level scores ---
-    financial_sub = (0.5 * income_score + 0.3 * stability_score + 0.2 * balance_score)
+    financial_sub = 0.5 * income_score + 0.3 * stability_score + 0.2 * balance_score
     repayment_sub = 0.5 * ontime_score + 0.5 * delay_score
-    
-    # 🚨 CRITICAL: Consumption pillar ONLY available if weights allow it
-    # High-income users have consumption weight = 0.0 to prevent proxy misuse
-    consumption_weight = pillar_weights_local.get("consumption", 0)
-    if consumption_weight > 0:
-        consumption_sub = (
-            0.4 * elec_consistency_score +
-            0.3 * recharge_score +
-            0.3 * education_score
-        )
-    else:
-        # Consumption pillar disabled - set to neutral to avoid unfair penalty
-        consumption_sub = 0.5  # Neutral score when blocked
-    
-    history_sub = history_score
-    
-    # 🆕 LOAN-TO-INCOME SCORE (Important for all users)
-    # Lower ratio = better (more responsible borrowing)
-    if loan_to_income_ratio <= 0.3:
-        loan_to_income_score = 1.0  # Excellent - asking for <30% of income
-    elif loan_to_income_ratio <= 0.5:
-        loan_to_income_score = 0.8  # Good - asking for 30-50% of income
-    elif loan_to_income_ratio <= 0.8:
-        loan_to_income_score = 0.5  # Moderate - asking for 50-80% of income
-    elif loan_to_income_ratio <= 1.0:
-        loan_to_income_score = 0.3  # High risk - asking for 80-100% of income
-    else:
-        loan_to_income_score = 0.1  # Very high risk - asking for >100% of income
-    
-    # Incorporate loan-to-income into financial pillar
+
+    # 🚨 Consumption pillar ONLY available if weights allow it; neutral when blocked
+    consumption_weight = weights[:, _PILLARS.index("consumption")]
+    consumption_sub = np.where(
+        consumption_weight > 0,
+        0.4 * elec_consistency_score + 0.3 * recharge_score + 0.3 * education_score,
+        0.5,
+    )
+
+    # 🆕 LOAN-TO-INCOME SCORE: lower ratio = more responsible borrowing
+    loan_to_income_score = np.select(
+        [
+            loan_to_income_ratio <= 0.3,
+            loan_to_income_ratio <= 0.5,
+            loan_to_income_ratio <= 0.8,
+            loan_to_income_ratio <= 1.0,
+        ],
+        [1.0, 0.8, 0.5, 0.3],
+        default=0.1,
+    )
     financial_sub = 0.7 * financial_sub + 0.3 * loan_to_income_score
 
-    # 🌟 EXCELLENT REPAYMENT HISTORY BONUS
-    # If user has 3+ previous loans AND 95%+ on-time ratio, give significant bonus
-    excellent_history_bonus = 0.0
-    if prev_loans >= 3 and ontime_score >= 0.95:
-        excellent_history_bonus = 0.10  # 10% bonus for proven excellent borrowers
-        # Boost repayment score for these proven borrowers
-        repayment_sub = min(1.0, repayment_sub + 0.15)  # Add 15% to repayment pillar
-    
-    # 🆕 HIGH-INCOME NO-HISTORY PENALTY
-    # If high-income user lacks repayment history, they MUST go through manual review
-    no_history_manual_flag = False
-    if user_segment == "high_income_no_history_manual_review":
-        no_history_manual_flag = True
-        # Additional notes will be added to breakdown for loan officers
-    
-    # --- Return all breakdowns ---
-    return {
+    # 🌟 EXCELLENT REPAYMENT HISTORY BONUS: 3+ previous loans AND 95%+ on-time
+    excellent = (prev_loans >= 3) & (ontime_score >= 0.95)
+    excellent_history_bonus = np.where(excellent, 0.10, 0.0)
+    boosted = repayment_sub + 0.15
+    repayment_sub = np.where(excellent, np.where(boosted < 1.0, boosted, 1.0), repayment_sub)
+
+    pillars = {
         "financial": _clip01(financial_sub),
         "repayment": _clip01(repayment_sub),
         "consumption": _clip01(consumption_sub),
-        "history": _clip01(history_sub),
-        "pillar_weights_used": pillar_weights_local,
+        "history": _clip01(history_score),
+    }
+
+    # --- Composite: weights normalized across pillars, then adjustments ---
+    total_weight = weights[:, 0] + weights[:, 1] + weights[:, 2] + weights[:, 3]
+    final_01 = np.zeros(n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for i, pillar in enumerate(_PILLARS):
+            final_01 = final_01 + pillars[pillar] * (weights[:, i] / total_weight)
+    final_01 = np.where(total_weight <= 0, 0.5, final_01)
+    # Penalty is multiplicative, bonuses additive but capped at 1.0
+    final_01 = final_01 * (1.0 - fraud_risk_penalty)
+    final_01 = final_01 + fair_lending_bonus + excellent_history_bonus
+    final_01 = np.where(final_01 < 1.0, final_01, 1.0)
+
+    return {
+        "n": n,
+        **pillars,
+        "segment": segment,
+        "final_01": final_01,
         "is_new_user": is_new_user,
         "has_bank_data": has_bank_data,
         "income_barrier_used": barrier,
-        "user_segment": user_segment,  # 🆕 Track which strategy was used
-        "loan_to_income_ratio": round(loan_to_income_ratio, 3),  # 🆕 For transparency
-        "fraud_risk_penalty": fraud_risk_penalty,  # 🆕 Anti-fraud adjustment
-        "fair_lending_bonus": fair_lending_bonus,  # 🆕 Fair lending bonus
-        "excellent_history_bonus": excellent_history_bonus,  # 🌟 Reward for proven borrowers
+        "loan_to_income_ratio": loan_to_income_ratio,
+        "fraud_risk_penalty": fraud_risk_penalty,
+        "fair_lending_bonus": fair_lending_bonus,
+        "excellent_history_bonus": excellent_history_bonus,
         "income_volatility_relief": income_volatility_relief,
         "affluence_penalty": affluence_penalty,
         "consent_depth": consent_depth,
-        "no_history_manual_flag": no_history_manual_flag,  # 🆕 High-income no-history flag
-        "alternative_proxies_blocked": consumption_weight == 0.0,  # 🆕 Track if proxies disabled
+        "no_history_manual_flag": high_no_history,
+        "alternative_proxies_blocked": consumption_weight == 0.0,
         "components": {
             "income_score": income_score,
             "stability_score": stability_score,
@@ -334,8 +419,77 @@ def compute_subscores(features: Dict, caps: Optional[Dict] = None) -> Dict:
             "consent_depth": consent_depth,
             "income_volatility_relief": income_volatility_relief,
             "affluence_penalty": affluence_penalty,
-        }
+        },
+    }
+
+
+def _subscores_at(res: Dict, i: int) -> Dict:
+    """Materialize the compute_subscores() breakdown dict for row i."""
+    user_segment = _SEGMENTS[res["segment"][i]]
+    return {
+        "financial": float(res["financial"][i]),
+        "repayment": float(res["repayment"][i]),
+        "consumption": float(res["consumption"][i]),
+        "history": float(res["history"][i]),
+        "pillar_weights_used": dict(SEGMENT_PILLAR_WEIGHTS[user_segment]),
+        "is_new_user": bool(res["is_new_user"][i]),
+        "has_bank_data": bool(res["has_bank_data"][i]),
+        "income_barrier_used": res["income_barrier_used"],
+        "user_segment": user_segment,  # 🆕 Track which strategy was used
+        "loan_to_income_ratio": round(float(res["loan_to_income_ratio"][i]), 3),  # 🆕 For transparency
+        "fraud_risk_penalty": float(res["fraud_risk_penalty"][i]),  # 🆕 Anti-fraud adjustment
+        "fair_lending_bonus": float(res["fair_lending_bonus"][i]),  # 🆕 Fair lending bonus
+        "excellent_history_bonus": float(res["excellent_history_bonus"][i]),  # 🌟 Reward for proven borrowers
+        "income_volatility_relief": float(res["income_volatility_relief"][i]),
+        "affluence_penalty": float(res["affluence_penalty"][i]),
+        "consent_depth": float(res["consent_depth"][i]),
+        "no_history_manual_flag": bool(res["no_history_manual_flag"][i]),  # 🆕 High-income no-history flag
+        "alternative_proxies_blocked": bool(res["alternative_proxies_blocked"][i]),  # 🆕 Track if proxies disabled
+        "components": {k: float(v[i]) for k, v in res["components"].items()},
+    }
+
+
+def compute_subscores(features: Dict, caps: Optional[Dict] = None) -> Dict:
+    """Compute normalized sub-scores (0..1) for pillars. Returns breakdown dict."""
+    policy = registry.policy()
+    caps = caps or policy.caps
+    res = _score_columns(_Columns(features), caps, policy.dynamic_income_barrier)
+    return _subscores_at(res, 0)
+
+
+def _composite_at(res: Dict, i: int) -> Tuple[float, Dict]:
+    """Materialize the compute_composite_score() result for row i."""
+    subs = _subscores_at(res, i)
+
+    final_01 = float(res["final_01"][i])
+    composite_score = round(final_01 * 100.0, 2)
+
+    breakdown = {
+        "composite_score": composite_score,
+        "composite_score_01": final_01,
+        "pillar_scores": {
+            k: round(subs[k], 4)
+            for k in ["financial", "repayment", "consumption", "history"]
+        },
+        "pillar_weights_used": subs["pillar_weights_used"],  # 🆕 Show which weights were used
+        "user_segment": subs["user_segment"],  # 🆕 Evaluation strategy
+        "loan_to_income_ratio": subs["loan_to_income_ratio"],  # 🆕 Risk indicator
+        "fraud_risk_penalty": subs["fraud_risk_penalty"],  # 🆕 Anti-fraud adjustment
+        "fair_lending_bonus": subs["fair_lending_bonus"],  # 🆕 Fair lending bonus
+        "excellent_history_bonus": subs["excellent_history_bonus"],  # 🌟 Reward for proven borrowers
+        "is_new_user": subs["is_new_user"],
+        "has_bank_data": subs["has_bank_data"],
+        "income_barrier": subs["income_barrier_used"],
+        "components": subs["components"],
+        "income_volatility_relief": subs["income_volatility_relief"],
+        "affluence_penalty": subs["affluence_penalty"],
+        "consent_depth": subs["consent_depth"],
+        "no_history_manual_flag": subs["no_history_manual_flag"],  # 🆕 High-income no-history flag
+        "alternative_proxies_blocked": subs["alternative_proxies_blocked"],  # 🆕 Track if proxies disabled
     }
+    
+    return composite_score, breakdown
+
 
 def compute_composite_score(features: Dict,
                             pillar_weights: Optional[Dict] = None,
@@ -349,76 +503,71 @@ def compute_composite_score(features: Dict,
     - New users: Anti-fraud checks + fair lending bonus
     
     If some pillars are missing, weights are rescaled among available pillars.
+    Thin wrapper over the vectorized engine behind compute_composite_scores_batch.
     """
-    pillar_weights = pillar_weights or PILLAR_WEIGHTS
-    caps = caps or DEFAULT_CAPS
+    policy = registry.policy()
+    caps = caps or policy.caps
+    res = _score_columns(_Columns(features), caps, policy.dynamic_income_barrier)
+    return _composite_at(res, 0)
 
-    subs = compute_subscores(features, caps=caps)
-    
-    # Extract pillar scores
-    available = {}
-    for k in ["financial", "repayment", "consumption", "history"]:
-        val = subs.get(k)
-        if val is not None:
-            available[k] = val
-
-    # Get the dynamic weights from subscores
-    dynamic_weights = subs.get("pillar_weights_used", pillar_weights)
-    
-    # Compute normalized weights across available pillars
-    total_weight = sum(dynamic_weights.get(k, 0) for k in available.keys())
-    if total_weight <= 0:
-        # Fallback neutral score
-        final_01 = 0.5
-    else:
-        final_01 = 0.0
-        for k, s in available.items():
-            w = dynamic_weights.get(k, 0.0)
-            normalized_w = w / total_weight
-            final_01 += s * normalized_w
-
-    # 🆕 APPLY ADJUSTMENTS
-    fraud_penalty = subs.get("fraud_risk_penalty", 0.0)
-    fair_bonus = subs.get("fair_lending_bonus", 0.0)
-    excellent_history_bonus = subs.get("excellent_history_bonus", 0.0)
-    income_relief = subs.get("income_volatility_relief", 0.0)
-    affluence_penalty = subs.get("affluence_penalty", 0.0)
-    consent_depth = subs.get("consent_depth", 0.0)
-    
-    # Apply penalty (multiplicative - reduces score)
-    final_01 = final_01 * (1.0 - fraud_penalty)
-    
-    # Apply bonuses (additive - but capped at 1.0)
-    final_01 = min(1.0, final_01 + fair_bonus + excellent_history_bonus)
-    
-    composite_score = round(final_01 * 100.0, 2)
 
-    breakdown = {
-        "composite_score": composite_score,
-        "composite_score_01": final_01,
-        "pillar_scores": {
-            k: round(float(v), 4) 
-            for k, v in subs.items() 
-            if k in ["financial","repayment","consumption","history"]
+def compute_composite_scores(features_list: List[Dict],
+                             caps: Optional[Dict] = None) -> List[Tuple[float, Dict]]:
+    """
+    compute_composite_score for many feature dicts in one vectorized pass.
+    Returns [(composite_score, breakdown), ...] in input order.
+    """
+    if not features_list:
+        return []
+    policy = registry.policy()
+    caps = caps or policy.caps
+    res = _score_columns(_Columns(list(features_list)), caps, policy.dynamic_income_barrier)
+    return [_composite_at(res, i) for i in range(res["n"])]
+
+
+def compute_composite_scores_batch(df, caps: Optional[Dict] = None):
+    """
+    Vectorized compute_composite_score over a DataFrame of feature rows.
+
+    Row i of the result matches compute_composite_score(df.iloc[i].to_dict())
+    exactly. Returns a DataFrame indexed like df with the composite score,
+    pillar scores and the segment/penalty/bonus columns of the breakdown.
+    """
+    import pandas as pd
+
+    policy = registry.policy()
+    caps = caps or policy.caps
+    res = _score_columns(_Columns(df), caps, policy.dynamic_income_barrier)
+
+    # Python round() keeps results identical to the scalar path (np.round is not)
+    composite = [round(v, 2) for v in (res["final_01"] * 100.0).tolist()]
+    ratio = [round(v, 3) for v in res["loan_to_income_ratio"].tolist()]
+
+    return pd.DataFrame(
+        {
+            "composite_score": composite,
+            "composite_score_01": res["final_01"],
+            "financial": res["financial"],
+            "repayment": res["repayment"],
+            "consumption": res["consumption"],
+            "history": res["history"],
+            "user_segment": np.array(_SEGMENTS, dtype=object)[res["segment"]],
+            "loan_to_income_ratio": ratio,
+            "fraud_risk_penalty": res["fraud_risk_penalty"],
+            "fair_lending_bonus": res["fair_lending_bonus"],
+            "excellent_history_bonus": res["excellent_history_bonus"],
+            "income_volatility_relief": res["income_volatility_relief"],
+            "affluence_penalty": res["affluence_penalty"],
+            "consent_depth": res["consent_depth"],
+            "is_new_user": res["is_new_user"],
+            "has_bank_data": res["has_bank_data"],
+            "no_history_manual_flag": res["no_history_manual_flag"],
+            "alternative_proxies_blocked": res["alternative_proxies_blocked"],
+            "income_barrier": res["income_barrier_used"],
         },
-        "pillar_weights_used": dynamic_weights,  # 🆕 Show which weights were used
-        "user_segment": subs.get("user_segment", "unknown"),  # 🆕 Evaluation strategy
-        "loan_to_income_ratio": subs.get("loan_to_income_ratio", 0),  # 🆕 Risk indicator
-        "fraud_risk_penalty": fraud_penalty,  # 🆕 Anti-fraud adjustment
-        "fair_lending_bonus": fair_bonus,  # 🆕 Fair lending bonus
-        "excellent_history_bonus": excellent_history_bonus,  # 🌟 Reward for proven borrowers
-        "is_new_user": subs.get("is_new_user", False),
-        "has_bank_data": subs.get("has_bank_data", False),
-        "income_barrier": subs.get("income_barrier_used", 15000),
-        "components": {k: float(v) for k, v in subs.get("components", {}).items()},
-        "income_volatility_relief": income_relief,
-        "affluence_penalty": affluence_penalty,
-        "consent_depth": consent_depth,
-        "no_history_manual_flag": subs.get("no_history_manual_flag", False),  # 🆕 High-income no-history flag
-        "alternative_proxies_blocked": subs.get("alternative_proxies_blocked", False),  # 🆕 Track if proxies disabled
-    }
-    
-    return composite_score, breakdown
+        index=df.index,
+    )
+
 
 def combine_ml_and_composite(ml_prob: float, composite_score: float, ml_weight: float = 0.6) -> Tuple[float, dict]:
     """
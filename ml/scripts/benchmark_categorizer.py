@@ -0,0 +1,113 @@
+"""
+Benchmark the single-regex TransactionCategorizer against the original
+per-pattern re.search loop.
+
+Usage:
+    python ml/scripts/benchmark_categorizer.py [--lines 1000000] [--merchants 5000] [--unique-share 0.3]
+
+Builds a synthetic statement of --lines descriptions. Most lines repeat
+one of --merchants recurring merchant strings; --unique-share of them carry
+a fresh UPI/NEFT reference number, so no cache can help with those. Checks
+that both implementations agree on every line, then times:
+
+    legacy loop      for each category, for each pattern: re.search
+    regex, no cache  one combined match per line
+    categorize       combined match behind the LRU cache
+    categorize_series pandas Series, each distinct value matched once
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_DIR)
+
+from nlp_utils import TransactionCategorizer  # noqa: E402
+
+KEYWORDS = [p for patterns in TransactionCategorizer.CATEGORIES.values() for p in patterns if p.isalpha()]
+FILLER = ["payment", "transfer", "txn", "pos", "online", "store", "services", "ltd", "pvt", "india", "ref"]
+PREFIXES = ["UPI/DR", "UPI/CR", "NEFT", "IMPS", "POS", "ACH", "ATM WDL", "BIL/ONL"]
+
+
+def legacy_categorize(description: str) -> str:
+    desc_lower = description.lower()
+    for category, patterns in TransactionCategorizer.CATEGORIES.items():
+        for pattern in patterns:
+            if re.search(pattern, desc_lower):
+                return category
+    return "OTHER"
+
+
+def synthetic_statement(n_lines: int, n_merchants: int, unique_share: float, seed: int = 7) -> pd.Series:
+    rng = np.random.default_rng(seed)
+
+    def description() -> str:
+        words = [str(rng.choice(PREFIXES))]
+        if rng.random() < 0.8:
+            words.append(str(rng.choice(KEYWORDS)).upper())
+        words.extend(str(w).upper() for w in rng.choice(FILLER, size=rng.integers(1, 4)))
+        return " ".join(words)
+
+    merchants = np.array([description() for _ in range(n_merchants)], dtype=object)
+    lines = merchants[rng.integers(0, n_merchants, size=n_lines)]
+    unique = rng.random(n_lines) < unique_share
+    refs = rng.integers(10 ** 11, 10 ** 12, size=int(unique.sum()))
+    lines[unique] = [f"{line}/{ref}" for line, ref in zip(lines[unique], refs)]
+    return pd.Series(lines, name="description")
+
+
+def _timed(label: str, fn, n_lines: int, baseline: float = None) -> float:
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    speedup = f"{baseline / elapsed:7.1f}x" if baseline else "       -"
+    print(f"{label:<20} {elapsed:9.2f} s {elapsed / n_lines * 1e6:9.2f} us/line {speedup}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--merchants", type=int, default=5000)
+    parser.add_argument("--unique-share", type=float, default=0.3)
+    args = parser.parse_args()
+
+    series = synthetic_statement(args.lines, args.merchants, args.unique_share)
+    lines = series.tolist()
+    print(f"{len(lines)} lines, {series.nunique()} distinct descriptions")
+
+    matcher = TransactionCategorizer.matcher()
+    categorize = TransactionCategorizer.categorize
+
+    def regex_only():
+        return [(m.lastgroup if m else "OTHER") for m in map(matcher.match, map(str.lower, lines))]
+
+    legacy = []
+    baseline = _timed("legacy loop", lambda: legacy.extend(map(legacy_categorize, lines)), len(lines))
+    _timed("regex, no cache", regex_only, len(lines), baseline)
+    categorize.cache_clear()
+    cached = []
+    _timed("categorize", lambda: cached.extend(map(categorize, lines)), len(lines), baseline)
+    categorize.cache_clear()
+    vectorized = []
+    _timed(
+        "categorize_series",
+        lambda: vectorized.append(TransactionCategorizer.categorize_series(series)),
+        len(lines),
+        baseline,
+    )
+
+    mismatches = sum(a != b for a, b in zip(legacy, cached))
+    mismatches += int((vectorized[0].to_numpy() != np.array(legacy, dtype=object)).sum())
+    print(f"\nMismatches vs legacy: {mismatches} ({'OK' if mismatches == 0 else 'MISMATCH'})")
+    print(f"Category counts: {pd.Series(legacy).value_counts().to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
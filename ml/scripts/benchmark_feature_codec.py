@@ -0,0 +1,104 @@
+"""
+Benchmark the binary feature codec against the JSON text FeatureStore used
+to keep in Redis.
+
+Usage:
+    python ml/scripts/benchmark_feature_codec.py [--vectors 100000] [--features 30] [--missing-share 0.1]
+
+Builds --vectors synthetic feature dicts of --features numeric features,
+each feature absent with probability --missing-share. Checks that every
+format decodes back to the same values, then reports the mean entry size
+and times:
+
+    encode            json.dumps / FeatureCodec.encode per dict
+    decode dict       json.loads / FeatureCodec.decode per entry
+    decode matrix     json.loads + row fill / FeatureCodec.decode_matrix
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_DIR)
+
+from feature_codec import FeatureCodec, SchemaRegistry  # noqa: E402
+
+NAME_STEMS = ["income", "expense_ratio", "dpd_count", "bounced", "balance", "bill", "recharge", "tenure", "volatility"]
+
+
+def synthetic_features(n_vectors: int, n_features: int, missing_share: float, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    names = [f"{NAME_STEMS[i % len(NAME_STEMS)]}_{i}" for i in range(n_features)]
+    values = np.round(rng.lognormal(6, 2, size=(n_vectors, n_features)), 2)
+    present = rng.random((n_vectors, n_features)) >= missing_share
+    dicts = [
+        {name: v for name, v, keep in zip(names, row, mask) if keep}
+        for row, mask in zip(values.tolist(), present.tolist())
+    ]
+    return names, dicts
+
+
+def _timed(label: str, fn, n: int, baseline: float = None) -> float:
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    speedup = f"{baseline / elapsed:7.1f}x" if baseline else "       -"
+    print(f"  {label:<12} {elapsed:8.3f} s {elapsed / n * 1e6:8.2f} us/vector {speedup}")
+    return elapsed
+
+
+def json_matrix(entries, names):
+    index = {name: i for i, name in enumerate(names)}
+    out = np.full((len(entries), len(names)), np.nan)
+    for i, raw in enumerate(entries):
+        for name, value in json.loads(raw).items():
+            out[i, index[name]] = value
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--features", type=int, default=30)
+    parser.add_argument("--missing-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    names, dicts = synthetic_features(args.vectors, args.features, args.missing_share)
+    n = len(dicts)
+    print(f"{n} vectors x {args.features} features, {args.missing_share:.0%} missing")
+
+    json_entries = [json.dumps(d).encode() for d in dicts]
+    reference = json_matrix(json_entries, names)
+    print(f"\njson     {np.mean([len(e) for e in json_entries]):7.1f} bytes/vector")
+    json_times = {
+        "encode": _timed("encode", lambda: [json.dumps(d) for d in dicts], n),
+        "decode dict": _timed("decode dict", lambda: [json.loads(e) for e in json_entries], n),
+        "decode matrix": _timed("decode matrix", lambda: json_matrix(json_entries, names), n),
+    }
+
+    for dtype in (np.float64, np.float32):
+        registry = SchemaRegistry()
+        registry.register(names, dtype=dtype)
+        codec = FeatureCodec(registry)
+        entries = [codec.encode(d) for d in dicts]
+        assert all(isinstance(e, bytes) for e in entries)
+        matrix = codec.decode_matrix(entries)
+        decoded = [codec.decode(e) for e in entries]
+        if dtype is np.float64:
+            exact = np.array_equal(matrix, reference, equal_nan=True) and decoded == dicts
+        else:
+            exact = np.allclose(matrix, reference, rtol=1e-6, equal_nan=True)
+        print(f"\n{np.dtype(dtype).name:<8} {np.mean([len(e) for e in entries]):7.1f} bytes/vector "
+              f"({'OK' if exact else 'MISMATCH'} vs json)")
+        _timed("encode", lambda: [codec.encode(d) for d in dicts], n, json_times["encode"])
+        _timed("decode dict", lambda: [codec.decode(e) for e in entries], n, json_times["decode dict"])
+        _timed("decode matrix", lambda: codec.decode_matrix(entries), n, json_times["decode matrix"])
+
+
+if __name__ == "__main__":
+    main()
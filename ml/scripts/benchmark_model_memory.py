@@ -0,0 +1,130 @@
+"""
+Per-worker memory of the ML API model under three loading strategies.
+
+Usage:
+    python ml/scripts/benchmark_model_memory.py [--workers 4]
+
+Forks N workers per mode and, once every worker has loaded the model and
+run predictions, reads /proc/self/smaps_rollup in each (Linux only):
+
+    baseline  each worker joblib.loads the pickles itself
+    mmap      each worker loads through ModelRegistry(mmap=True)
+    preload   the parent calls registry.preload() (load + gc.freeze) and forks
+
+RSS counts shared pages in full; PSS splits them between the processes
+sharing them, and Private is what a worker really costs on its own.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_DIR)
+
+MODES = ("baseline", "mmap", "preload")
+
+
+def _memory_kb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _load(mode, cache_dir):
+    from model_registry import ModelRegistry
+
+    if mode == "baseline":
+        return ModelRegistry(mmap=False).artifacts()
+    return ModelRegistry(mmap=True, cache_dir=cache_dir).artifacts()
+
+
+def _worker(mode, cache_dir, preloaded, barrier, results):
+    warnings.filterwarnings("ignore")
+    before = _memory_kb()
+    artifacts = preloaded if preloaded is not None else _load(mode, cache_dir)
+    X = np.random.default_rng(os.getpid()).normal(0, 1, (1000, len(artifacts.feature_order)))
+    artifacts.predictor.predict_proba(X[:8])   # compiled engine path
+    artifacts.predictor.predict_proba(X)       # sklearn path
+    barrier.wait()  # every worker alive and loaded before measuring PSS
+    results.put((os.getpid(), before, _memory_kb()))
+    barrier.wait()
+
+
+def _run_mode(mode, n_workers, cache_dir):
+    ctx = mp.get_context("fork")
+    preloaded = None
+    if mode == "preload":
+        from model_registry import ModelRegistry
+
+        preloaded = ModelRegistry(mmap=False).preload()
+
+    barrier = ctx.Barrier(n_workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(mode, cache_dir, preloaded, barrier, results))
+        for _ in range(n_workers)
+    ]
+    for p in procs:
+        p.start()
+    rows = [results.get(timeout=120) for _ in procs]
+    for p in procs:
+        p.join()
+    return rows
+
+
+def _build_cache(cache_dir):
+    # In a throwaway child so the parent stays model-free for the next modes
+    ctx = mp.get_context("fork")
+    p = ctx.Process(target=_load, args=("mmap", cache_dir))
+    p.start()
+    p.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("This benchmark needs Linux /proc/self/smaps_rollup")
+    warnings.filterwarnings("ignore")
+
+    cache_dir = tempfile.mkdtemp(prefix="safecred-mmap-")
+    try:
+        _build_cache(cache_dir)
+        print(f"{'mode':>9} {'worker':>7} {'RSS before':>11} {'RSS MB':>8} {'PSS MB':>8} {'Private MB':>11}")
+        summary = {}
+        # preload last: it leaves the model loaded in this process
+        for mode in MODES:
+            rows = _run_mode(mode, args.workers, cache_dir)
+            for i, (_, before, after) in enumerate(rows):
+                print(f"{mode:>9} {i:>7} {before['rss'] / 1024:>11.1f} {after['rss'] / 1024:>8.1f} "
+                      f"{after['pss'] / 1024:>8.1f} {after['private'] / 1024:>11.1f}")
+            summary[mode] = (
+                sum(r[2]["pss"] for r in rows) / 1024,
+                sum(r[2]["private"] for r in rows) / len(rows) / 1024,
+            )
+        print(f"\n{'mode':>9} {'total PSS MB':>13} {'avg private MB':>15}")
+        for mode, (pss, private) in summary.items():
+            print(f"{mode:>9} {pss:>13.1f} {private:>15.1f}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
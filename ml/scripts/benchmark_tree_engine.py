@@ -0,0 +1,70 @@
+"""
+Benchmark the compiled NumPy tree engine against sklearn predict_proba.
+
+Usage:
+    python ml/scripts/benchmark_tree_engine.py [--sizes 1 10 100 1000 10000] [--repeat 20]
+
+Loads ml/models/safecred_model.pkl, compiles it with tree_engine, checks
+that both agree to 1e-9 and prints per-batch latency for each batch size.
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_DIR)
+
+from tree_engine import export_tree_ensemble  # noqa: E402
+
+MODELS_DIR = os.path.join(ML_DIR, "models")
+
+
+def _time(fn, X, repeat):
+    fn(X)  # warm up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(X)
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--model", default=os.path.join(MODELS_DIR, "safecred_model.pkl"))
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    clf = joblib.load(args.model)
+    t0 = time.perf_counter()
+    engine = export_tree_ensemble(clf)
+    export_ms = (time.perf_counter() - t0) * 1000
+    print(f"Model: {type(clf).__name__} | trees: {engine.n_trees} | nodes: {len(engine.feature)} "
+          f"| max depth: {engine.max_depth} | export: {export_ms:.1f} ms")
+
+    rng = np.random.default_rng(42)
+    X_check = rng.normal(0, 1.5, (max(args.sizes), engine.n_features_in_))
+    X_check[rng.random(X_check.shape) < 0.02] = np.nan
+    max_diff = float(np.abs(clf.predict_proba(X_check) - engine.predict_proba(X_check)).max())
+    print(f"Max |sklearn - compiled| over {len(X_check)} rows: {max_diff:.3e} "
+          f"({'OK' if max_diff <= 1e-9 else 'MISMATCH'})")
+
+    print(f"\n{'batch':>8} {'sklearn ms':>12} {'compiled ms':>12} {'speedup':>8}")
+    for size in args.sizes:
+        X = X_check[:size]
+        repeat = args.repeat if size <= 1000 else max(3, args.repeat // 5)
+        sk = _time(clf.predict_proba, X, repeat)
+        np_ms = _time(engine.predict_proba, X, repeat)
+        print(f"{size:>8} {sk:>12.3f} {np_ms:>12.3f} {sk / np_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
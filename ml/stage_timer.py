@@ -0,0 +1,118 @@
+"""
+stage_timer.py
+
+Per-stage latency for the scoring pipeline.
+
+A StageTimer is made active for the duration of one scoring call (on the
+executor thread or process that runs it). Code inside the pipeline marks
+stages with stage("features"), stage("predict") and so on; outside an
+active timer stage() is a no-op, so the scoring functions can be called
+directly (tests, scripts) without any setup.
+
+The timer is plain data and pickles, so with a process-pool executor the
+worker returns it alongside the result and the API process records it:
+
+    - ml_api_stage_duration_seconds{stage, model_version, segment}
+      Prometheus histogram, one observation per stage per request
+    - a Server-Timing response header, e.g.
+      "features;dur=1.92, predict;dur=0.41, total;dur=3.70"
+
+The segment label is the user_segment scoring.py picked for the request
+(a key of SEGMENT_PILLAR_WEIGHTS), "batch" for batch calls, or "unknown"
+when the request failed before scoring, so label cardinality stays bounded.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import Histogram
+
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+STAGE_LATENCY = Histogram(
+    "ml_api_stage_duration_seconds",
+    "Time spent in each scoring pipeline stage",
+    ["stage", "model_version", "segment"],
+    buckets=STAGE_BUCKETS,
+)
+
+_active = threading.local()
+
+
+class StageTimer:
+    """Accumulated wall time per stage name, in seconds, in first-seen order."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.labels: Dict[str, str] = {"model_version": "unknown", "segment": "unknown"}
+        self.started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start)
+
+    def label(self, **labels: Optional[str]) -> None:
+        for key, value in labels.items():
+            if value is not None:
+                self.labels[key] = str(value)
+
+    @contextmanager
+    def activate(self) -> Iterator["StageTimer"]:
+        """Make this the timer stage() reports to on the current thread."""
+        previous = getattr(_active, "timer", None)
+        _active.timer = self
+        try:
+            yield self
+        finally:
+            _active.timer = previous
+            self.elapsed = time.perf_counter() - self.started
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Server-Timing header value; durations in milliseconds."""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+    def observe(self, total: Optional[float] = None) -> None:
+        """Record every stage (and the end-to-end total) in the histogram."""
+        model_version = self.labels["model_version"]
+        segment = self.labels["segment"]
+        for name, seconds in self.stages.items():
+            STAGE_LATENCY.labels(name, model_version, segment).observe(seconds)
+        if total is not None:
+            STAGE_LATENCY.labels("total", model_version, segment).observe(total)
+
+
+@contextmanager
+def _untimed() -> Iterator[None]:
+    yield
+
+
+def current_timer() -> Optional[StageTimer]:
+    return getattr(_active, "timer", None)
+
+
+def stage(name: str):
+    """Time a block against the active timer; no-op when none is active."""
+    timer = getattr(_active, "timer", None)
+    if timer is None:
+        return _untimed()
+    return timer.stage(name)
+
+
+def label(**labels: Optional[str]) -> None:
+    """Set labels on the active timer, if any."""
+    timer = getattr(_active, "timer", None)
+    if timer is not None:
+        timer.label(**labels)
+
@@ -0,0 +1,218 @@
+"""
+structured_log.py
+
+Non-blocking JSON-lines logger for the ML API.
+
+log() only builds a dict and puts it on a bounded queue; a daemon writer
+thread drains the queue in batches, appends them to the log file in one
+write, and rotates the file by size. If the queue is full the record is
+dropped and counted rather than blocking the request; the writer reports
+the drop count in the log itself ("log_records_dropped" events).
+
+Each process gets its own writer thread (started lazily, restarted after
+fork), so the logger also works inside process-pool workers.
+
+Configuration (environment):
+    ML_API_LOG_FILE          path of the JSON-lines log  (default: ml_api_debug.log)
+    ML_API_LOG_MAX_BYTES     rotate when the file exceeds this size (default: 10 MB)
+    ML_API_LOG_BACKUPS       rotated files to keep        (default: 3)
+    ML_API_LOG_ECHO          also echo records to stdout (default: 1)
+    ML_API_LOG_LEVEL         minimum level: debug | info | warning | error (default: info)
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+DEFAULT_LOG_FILE = os.getenv("ML_API_LOG_FILE", "ml_api_debug.log")
+DEFAULT_MAX_BYTES = int(os.getenv("ML_API_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+DEFAULT_BACKUPS = int(os.getenv("ML_API_LOG_BACKUPS", "3"))
+DEFAULT_ECHO = os.getenv("ML_API_LOG_ECHO", "1") not in ("0", "false", "False")
+DEFAULT_LEVEL = os.getenv("ML_API_LOG_LEVEL", "info").strip().lower()
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 256
+FLUSH_INTERVAL_SECONDS = 0.5
+
+_STOP = object()
+
+
+class StructuredLogger:
+    def __init__(
+        self,
+        path: str = DEFAULT_LOG_FILE,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backup_count: int = DEFAULT_BACKUPS,
+        echo: bool = DEFAULT_ECHO,
+        level: str = DEFAULT_LEVEL,
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.echo = echo
+        self.min_level = LEVELS.get(level, LEVELS["info"])
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._dropped = 0
+        self._dropped_reported = 0
+        self._written = 0
+        atexit.register(self.close)
+
+    # --- Producer side (request path) ---
+
+    def log(self, event: str, level: str = "info", **fields: Any) -> None:
+        """Queue one record. Never blocks and never raises."""
+        if LEVELS.get(level, LEVELS["info"]) < self.min_level:
+            return
+        record = {"ts": datetime.now().isoformat(), "level": level, "event": event}
+        record.update(fields)
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self.log(event, "debug", **fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self.log(event, "info", **fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self.log(event, "warning", **fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        self.log(event, "error", **fields)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self._written,
+            "dropped": self._dropped,
+        }
+
+    # --- Writer thread ---
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Forked child: the parent's writer thread did not come along
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="structured-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        q = self._queue
+        stopping = False
+        while not stopping:
+            try:
+                first = q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                batch = self._report_drops([])
+                if batch:
+                    self._write(batch)
+                continue
+            batch: List[Dict[str, Any]] = []
+            if first is _STOP:
+                stopping = True
+            else:
+                batch.append(first)
+            while len(batch) < self.batch_size:
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._report_drops(batch)
+            if batch:
+                self._write(batch)
+
+    def _report_drops(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        dropped = self._dropped
+        if dropped != self._dropped_reported:
+            batch.append({
+                "ts": datetime.now().isoformat(),
+                "level": "warning",
+                "event": "log_records_dropped",
+                "dropped_total": dropped,
+                "dropped_since_last": dropped - self._dropped_reported,
+            })
+            self._dropped_reported = dropped
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(r, default=str) + "\n" for r in batch)
+        try:
+            self._rotate_if_needed(len(data))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+            self._written += len(batch)
+        except Exception as exc:
+            self._dropped += len(batch)
+            self._dropped_reported += len(batch)
+            sys.stderr.write(f"[structured_log] write failed: {exc}\n")
+        if self.echo:
+            sys.stdout.write(data)
+            sys.stdout.flush()
+
+    def _rotate_if_needed(self, incoming: int) -> None:
+        if self.max_bytes <= 0:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size + incoming <= self.max_bytes:
+            return
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    # --- Lifecycle ---
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush everything queued so far and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid():
+                return
+            self._thread = None
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout=timeout)
+
+
+# Process-wide API logger
+api_log = StructuredLogger()
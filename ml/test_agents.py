@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from ml.agents import GenAIAgent, LoanOfficerAgent
+
+
+def _review_args(app_id, final_sci=85.0, status="approved"):
+    return {
+        "application_data": {
+            "application_id": app_id,
+            "name": f"Applicant {app_id}",
+            "declared_income": 10000,
+            "loan_amount": 3000,
+        },
+        "ml_result": {"ml_probability": 0.9, "final_sci": final_sci},
+        "composite_result": {"composite_score": 70, "fraud_risk_penalty": 0, "consent_depth": 0.8},
+        "precomputed_status": status,
+    }
+
+
+def test_review_traces_the_decision():
+    report = LoanOfficerAgent().review_application(**_review_args("APP1"))
+    thoughts = [entry["content"] for entry in report["thought_process"]]
+    assert report["decision"] == "APPROVED"
+    assert thoughts[0] == "Starting review for application APP1"
+    assert thoughts[-1] == "Final Decision: APPROVED"
+    assert report["message"].startswith("Congratulations Applicant!")
+
+
+def test_trace_false_skips_thought_process_only():
+    agent = LoanOfficerAgent()
+    traced = agent.review_application(**_review_args("APP1"))
+    fast = agent.review_application(**_review_args("APP1"), trace=False)
+    assert fast["thought_process"] == []
+    assert {**fast, "thought_process": traced["thought_process"]} == traced
+
+
+def test_shared_agent_keeps_concurrent_traces_separate():
+    agent = LoanOfficerAgent()
+    ids = [f"APP{i}" for i in range(200)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        reports = list(pool.map(lambda app_id: agent.review_application(**_review_args(app_id)), ids))
+
+    for app_id, report in zip(ids, reports):
+        thoughts = [entry["content"] for entry in report["thought_process"]]
+        assert thoughts[0] == f"Starting review for application {app_id}"
+        assert sum(t.startswith("Starting review") for t in thoughts) == 1
+    assert not hasattr(agent, "memory")
+
+
+def test_review_batch_matches_single_reviews_in_order():
+    agent = GenAIAgent()
+    reviews = [
+        _review_args("A", final_sci=85, status="approved"),
+        _review_args("B", final_sci=40, status="rejected"),
+        _review_args("C", final_sci=65, status=None),
+    ]
+    batch = agent.review_batch(reviews, trace=False)
+    assert [r["decision"] for r in batch] == ["APPROVED", "REJECTED", "MANUAL_REVIEW"]
+    assert batch == [agent.review_application(**r, trace=False) for r in reviews]
+    assert all(r["message"].startswith("[AI Generated]") for r in batch)
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.bank_parser import (
+    FEATURE_COLUMNS,
+    BankFeatureAccumulator,
+    extract_bank_features,
+    iter_statement_dir,
+    stream_bank_features,
+)
+
+
+def _transactions(n_users=40, per_user=30, seed=0):
+    rng = np.random.default_rng(seed)
+    users = np.repeat([f"u{i}" for i in range(n_users)], per_user)
+    n = len(users)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 300, n), unit="D")
+    return pd.DataFrame({
+        "user_id": users,
+        "date": dates.strftime("%Y-%m-%d"),
+        "description": rng.choice(["SALARY", "upi swiggy", "NACH Bounce chg", "rent", None], n),
+        "amount": rng.uniform(0, 20000, n).round(2),
+        "type": rng.choice(["CREDIT", "DEBIT", "credit", "OTHER"], n),
+        "balance": rng.uniform(-500, 30000, n).round(2),
+    }).sample(frac=1, random_state=1)
+
+
+def _assert_matches_single_user_path(frame, features):
+    for user, group in frame.groupby("user_id"):
+        expected = extract_bank_features(group.drop(columns="user_id").to_dict("records"))
+        for column in FEATURE_COLUMNS:
+            assert features.loc[user, column] == pytest.approx(expected[column], nan_ok=True), (user, column)
+
+
+def test_chunked_features_match_per_user_extraction():
+    frame = _transactions()
+    chunks = (frame.iloc[i:i + 97] for i in range(0, len(frame), 97))
+    features = stream_bank_features(chunks)
+    assert list(features.columns) == FEATURE_COLUMNS
+    assert len(features) == frame["user_id"].nunique()
+    _assert_matches_single_user_path(frame, features)
+
+
+@pytest.mark.parametrize("merge_every", [1, 4])
+def test_partials_merged_in_batches_match(merge_every):
+    frame = _transactions(n_users=25, per_user=12)
+    accumulator = BankFeatureAccumulator(merge_every=merge_every)
+    for i in range(0, len(frame), 11):
+        accumulator.update(frame.iloc[i:i + 11])
+    _assert_matches_single_user_path(frame, accumulator.features())
+
+
+def test_csv_streaming_with_small_chunks(tmp_path):
+    frame = _transactions(n_users=10, per_user=20)
+    path = tmp_path / "statements.csv"
+    frame.to_csv(path, index=False)
+    features = stream_bank_features(path, chunksize=13)
+    _assert_matches_single_user_path(frame, features)
+
+
+def test_income_volatility_edge_cases():
+    accumulator = BankFeatureAccumulator()
+    accumulator.update(pd.DataFrame({
+        "user_id": ["single", "single", "gap", "gap", "none"],
+        "date": ["2024-03-01", "2024-03-20", "2024-01-05", "2024-03-05", "2024-02-02"],
+        "description": ["salary", "salary", "salary", "salary", "Payment RETURN"],
+        "amount": [100, 50, 100, 100, 30],
+        "type": ["CREDIT", "CREDIT", "CREDIT", "CREDIT", "DEBIT"],
+        "balance": [500, 2000, 1500, 1500, np.nan],
+    }))
+    features = accumulator.features()
+    assert np.isnan(features.loc["single", "income_volatility"])  # one month: std undefined
+    assert features.loc["gap", "income_volatility"] == pytest.approx(0.866)  # Feb counts as 0
+    assert features.loc["none", "income_volatility"] == 0
+    assert features.loc["none", "expense_ratio"] == 1.0
+    assert features.loc["none", "bounced_count"] == 1
+    assert features.loc["single", "min_balance_days"] == 1
+
+
+def test_statement_directory_summaries(tmp_path):
+    pd.DataFrame({
+        "date": ["2025-04-13", "2025-05-13"],
+        "salary_credit": [20000, 30000],
+        "emi_debit": [3000, 3000],
+        "bill_debit": [1000, 500],
+        "closing_balance": [800, 40000],
+    }).to_csv(tmp_path / "7.csv", index=False)
+
+    features = stream_bank_features(iter_statement_dir(tmp_path))
+    assert list(features.index) == ["7"]
+    row = features.loc["7"]
+    assert row["expense_ratio"] == pytest.approx(7500 / 50000)
+    assert row["min_balance_days"] == 1
+    assert row["avg_daily_balance"] == pytest.approx(20400)
+
+
+def test_empty_input():
+    assert stream_bank_features([]).empty
+    assert extract_bank_features([]) == {}
@@ -3,15 +3,79 @@ import numpy as np
 from unittest.mock import MagicMock
 from ml.bayesian_updater import DemographicRegistry, DemographicPrior, BayesianIncomeUpdater
 
+_MISSING = object()
+
+
+def _evaluate(expr, doc, variables=None):
+    """Just enough of the aggregation expression language for the updater's pipelines."""
+    variables = variables or {}
+    if isinstance(expr, str) and expr.startswith("$$"):
+        return variables[expr[2:]]
+    if isinstance(expr, str) and expr.startswith("$"):
+        return doc.get(expr[1:], _MISSING)
+    if isinstance(expr, list):
+        return [_evaluate(e, doc, variables) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) == 1 and next(iter(expr)).startswith("$"):
+        op, arg = next(iter(expr.items()))
+        if op == "$literal":
+            return arg
+        if op == "$map":
+            items = _evaluate(arg["input"], doc, variables)
+            return [_evaluate(arg["in"], doc, {**variables, arg["as"]: item}) for item in items]
+        args = _evaluate(arg, doc, variables)
+        if op == "$eq":
+            return args[0] == args[1]
+        if op == "$type":
+            return "missing" if args is _MISSING else type(args).__name__
+        if op == "$cond":
+            return args[1] if args[0] else args[2]
+        if op == "$ifNull":
+            return next(a for a in args if a is not None and a is not _MISSING)
+        if op == "$zip":
+            return [list(t) for t in zip(*args["inputs"])]
+        if op == "$sum":
+            return sum(args)
+        if op == "$concatArrays":
+            return [x for a in args for x in a]
+        if op == "$slice":
+            return args[0][args[1]:]
+        raise NotImplementedError(op)
+    return {k: v for k, v in ((k, _evaluate(v, doc, variables)) for k, v in expr.items()) if v is not _MISSING}
+
+
 @pytest.fixture
 def mock_mongo():
     # A simple mock simulating a MongoDB collection dictionary store
     class MockCollection:
         def __init__(self):
             self.store = {}
+            self.round_trips = 0
             
-        def find_one(self, query):
+        def find_one(self, query, projection=None):
             return self.store.get(query["beneficiary_id"])
+
+        def _apply_pipeline(self, query, pipeline, upsert):
+            doc = self.store.get(query["beneficiary_id"])
+            if doc is None:
+                assert upsert
+                doc = dict(query)
+            for stage in pipeline:
+                doc = {**doc, **_evaluate(stage["$set"], doc)}
+            self.store[query["beneficiary_id"]] = doc
+            return doc
+
+        def find_one_and_update(self, query, pipeline, projection=None, upsert=False, return_document=False):
+            self.round_trips += 1
+            doc = self._apply_pipeline(query, pipeline, upsert)
+            return {k: v for k, v in doc.items() if not projection or projection.get(k, 1)}
+
+        def bulk_write(self, operations, ordered=True):
+            self.round_trips += 1
+            for op in operations:
+                self._apply_pipeline(op._filter, op._doc, op._upsert)
+            return MagicMock(matched_count=0, modified_count=0, upserted_count=len(operations))
             
         def insert_one(self, doc):
             self.store[doc["beneficiary_id"]] = doc
@@ -82,3 +146,49 @@ def test_bayesian_convergence(registry, mock_mongo):
     # Verify history is truncated (1 UNKNOWN + 10 HIGH = 11 entries < 50)
     history = updater.get_estimate_history(b_id)
     assert len(history) == 11
+
+def test_update_is_single_round_trip(registry, mock_mongo):
+    updater = BayesianIncomeUpdater(mock_mongo, registry, concentration_factor=10)
+    res = updater.update("USER3", "ELECTRICITY", "HIGH", district="Lucknow")
+    assert mock_mongo.round_trips == 1
+    np.testing.assert_array_almost_equal(res["alphas"], [1.8, 2.4, 2.8, 2.4, 1.6])
+    doc = mock_mongo.find_one({"beneficiary_id": "USER3"})
+    assert doc["district"] == "Lucknow"
+    assert doc["signal_history"][0]["posterior_alphas"] == res["alphas"]
+
+    # An existing document keeps its district and prior
+    updater.update("USER3", "MOBILE_RECHARGE", "$LOW", district="Aligarh")
+    doc = mock_mongo.find_one({"beneficiary_id": "USER3"})
+    assert doc["district"] == "Lucknow"
+    assert doc["signal_history"][-1]["signal_value"] == "$LOW"
+
+
+def test_update_many_matches_sequential_updates(registry, mock_mongo):
+    import copy
+    rng = np.random.default_rng(0)
+    values = {"ELECTRICITY": ["LOW", "MEDIUM", "HIGH"], "MOBILE_RECHARGE": ["LOW", "HIGH"],
+              "LOAN_REPAYMENT": ["ON_TIME", "DEFAULT"], "GOVT_SURVEY": ["2", "5"]}
+    signals = []
+    for _ in range(300):
+        signal_type = str(rng.choice(list(values)))
+        signals.append({"beneficiary_id": f"B{rng.integers(0, 5)}", "district": str(rng.choice(["Aligarh", "Lucknow", "X"])),
+                        "signal_type": signal_type, "signal_value": str(rng.choice(values[signal_type]))})
+    sequential = copy.deepcopy(mock_mongo)
+    seq_updater = BayesianIncomeUpdater(sequential, registry, concentration_factor=10)
+    first_district = {}
+    for s in signals:
+        first_district.setdefault(s["beneficiary_id"], s["district"])
+        seq_updater.update(s["beneficiary_id"], s["signal_type"], s["signal_value"], district=first_district[s["beneficiary_id"]])
+
+    updater = BayesianIncomeUpdater(mock_mongo, registry, concentration_factor=10)
+    counts = updater.update_many(signals)
+    assert counts["beneficiaries"] == len(first_district)
+    assert mock_mongo.round_trips == 1
+
+    for bid, expected in sequential.store.items():
+        doc = mock_mongo.store[bid]
+        np.testing.assert_array_almost_equal(doc["alphas"], expected["alphas"])
+        assert len(doc["signal_history"]) == len(expected["signal_history"]) <= 50
+        for got, want in zip(doc["signal_history"], expected["signal_history"]):
+            assert got["signal_value"] == want["signal_value"]
+            np.testing.assert_array_almost_equal(got["posterior_alphas"], want["posterior_alphas"])
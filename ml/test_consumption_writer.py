@@ -0,0 +1,137 @@
+from contextlib import contextmanager
+
+import pytest
+
+from ml.consumption_writer import (
+    ConsumptionWriteBehind,
+    build_consumption_rows,
+    write_consumption_data,
+)
+
+CONSUMPTION = {
+    "bank_statements": [
+        {"date": "2024-01-05", "description": "Salary", "credit": 9000, "balance": 12000},
+        {"date": "2024-01-09", "description": "Groceries", "debit": 1200, "balance": 10800},
+    ],
+    "recharge_data": [{"date": "2024-01-03", "amount": 199, "operator": "Jio"}],
+    "electricity_bills": [
+        {"month": "2024-01", "billDate": "2024-01-01", "dueDate": "2024-01-15",
+         "amount": 640, "unitsConsumed": 80, "paidDate": "2024-01-10"},
+        {"month": "2024-02", "billDate": "2024-02-01", "dueDate": "2024-02-15",
+         "amount": 610, "unitsConsumed": 76},
+    ],
+    "education_fees": [],
+}
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.connection = conn
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if isinstance(sql, bytes):
+            sql = sql.decode()
+        if self.conn.fail_on and self.conn.fail_on in sql:
+            raise RuntimeError("insert failed")
+        self.conn.statements.append(sql)
+
+    def fetchone(self):
+        return self.conn.app_row
+
+    def mogrify(self, template, args):
+        if isinstance(template, bytes):
+            template = template.decode()
+        return (template.replace("%s", "?") + repr(args)).encode()
+
+
+class _FakeConnection:
+    encoding = "UTF8"
+
+    def __init__(self, app_row=(42,), fail_on=None):
+        self.app_row = app_row
+        self.fail_on = fail_on
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = 0
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class _FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+def test_build_rows_skips_empty_tables():
+    rows = build_consumption_rows(42, CONSUMPTION)
+    assert set(rows) == {"bank_statements", "recharge_data", "electricity_bills"}
+    assert len(rows["bank_statements"]) == 2
+    assert rows["bank_statements"][1][3] == 1200  # debit
+    assert rows["electricity_bills"][0][-1] is True
+    assert rows["electricity_bills"][1][-2:] == (None, False)
+
+
+def test_one_insert_per_table_in_one_transaction():
+    conn = _FakeConnection()
+    assert write_consumption_data(conn, "APP-1", CONSUMPTION) is True
+
+    inserts = [s for s in conn.statements if s.startswith("INSERT")]
+    assert len(inserts) == 3
+    assert inserts[0].count("NOW()") == 2  # both bank rows in one statement
+    assert conn.commits == 1
+    assert conn.rollbacks == 0
+
+
+def test_unknown_application_writes_nothing():
+    conn = _FakeConnection(app_row=None)
+    assert write_consumption_data(conn, "APP-404", CONSUMPTION) is False
+    assert not [s for s in conn.statements if s.startswith("INSERT")]
+    assert conn.commits == 0
+
+
+def test_failure_rolls_back_everything():
+    conn = _FakeConnection(fail_on="electricity_bills")
+    with pytest.raises(RuntimeError):
+        write_consumption_data(conn, "APP-1", CONSUMPTION)
+    assert conn.commits == 0
+    assert conn.rollbacks == 1
+
+
+def test_write_behind_persists_off_request_path():
+    conn = _FakeConnection()
+    writer = ConsumptionWriteBehind(_FakePool(conn))
+    try:
+        assert writer.submit("APP-1", CONSUMPTION) is True
+        assert writer.submit("APP-2", CONSUMPTION) is True
+        writer.flush()
+    finally:
+        writer.close()
+    assert writer.stats()["written"] == 2
+    assert conn.commits == 2
+
+
+def test_write_behind_rejects_when_full():
+    writer = ConsumptionWriteBehind(_FakePool(_FakeConnection()), queue_size=1)
+    writer.start = lambda: None  # no consumer, so the queue stays full
+    assert writer.submit("APP-1", CONSUMPTION) is True
+    assert writer.submit("APP-2", CONSUMPTION) is False
+    assert writer.stats()["rejected"] == 1
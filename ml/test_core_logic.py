@@ -1,13 +1,18 @@
 import asyncio
 import os
 import sys
+import threading
+import time
 import unittest
 
+from prometheus_client import REGISTRY
+
 sys.path.insert(0, os.path.dirname(__file__))
 
 import application_api
 from features_direct import extract_features_from_application_data
 from models_enhanced import EnhancedLoanApplication
+from request_profiler import SamplingProfiler
 from scoring import compute_composite_score, map_sci_to_riskband
 
 
@@ -20,12 +25,27 @@ class _CompositeAwareClassifier:
     def __init__(self):
         self.seen_composite_score = None
 
-    def predict_proba(self, frame):
-        self.seen_composite_score = float(frame.iloc[0]["composite_score"])
+    def predict_proba(self, matrix):
+        column = application_api.feature_order.index("composite_score")
+        self.seen_composite_score = float(matrix[0][column])
         return [[0.2, 0.8]]
 
 
+class _BatchCountingClassifier:
+    def __init__(self):
+        self.calls = 0
+        self.rows_seen = 0
+
+    def predict_proba(self, frame):
+        self.calls += 1
+        self.rows_seen += len(frame)
+        return [[0.2, 0.8] for _ in range(len(frame))]
+
+
 class CoreLogicTests(unittest.TestCase):
+    def setUp(self):
+        application_api.result_cache.clear()
+
     def test_low_income_no_bank_uses_consumption_weight(self):
         features = extract_features_from_application_data({
             "declared_income": 8000,
@@ -114,6 +134,7 @@ class CoreLogicTests(unittest.TestCase):
             application_api.load_ml_model = lambda: True
             application_api.loan_officer = _LoanOfficer()
 
+            http_response = application_api.Response()
             response = asyncio.run(application_api.apply_direct(EnhancedLoanApplication(
                 name="Test User",
                 mobile="9999999999",
@@ -122,13 +143,28 @@ class CoreLogicTests(unittest.TestCase):
                 loan_amount=3000,
                 tenure_months=12,
                 consent_recharge=True,
-            )))
+            ), http_response))
 
             self.assertGreater(fake_classifier.seen_composite_score, 0)
             self.assertEqual(
                 fake_classifier.seen_composite_score,
                 response["details"]["score_breakdown"]["composite_score"],
             )
+            server_timing = http_response.headers["Server-Timing"]
+            for stage_name in ("validate", "features", "composite", "scale", "predict", "agent", "total"):
+                self.assertIn(f"{stage_name};dur=", server_timing)
+            # Stage metrics carry the segment scoring chose
+            segment = response["details"]["score_breakdown"]["user_segment"]
+            predictions = [
+                sample.value
+                for metric in REGISTRY.collect()
+                if metric.name == "ml_api_stage_duration_seconds"
+                for sample in metric.samples
+                if sample.name.endswith("_count")
+                and sample.labels["stage"] == "predict"
+                and sample.labels["segment"] == segment
+            ]
+            self.assertGreaterEqual(sum(predictions), 1)
         finally:
             (
                 application_api.clf,
@@ -192,6 +228,336 @@ class CoreLogicTests(unittest.TestCase):
                 application_api.loan_officer,
             ) = original_state
 
+    def test_apply_batch_predicts_once_and_isolates_item_errors(self):
+        fake_classifier = _BatchCountingClassifier()
+        original_state = (
+            application_api.clf,
+            application_api.scaler,
+            application_api.feature_order,
+            application_api.load_ml_model,
+            application_api.loan_officer,
+        )
+
+        class _LoanOfficer:
+            batch_calls = 0
+
+            def review_application(self, **kwargs):
+                return {"message": "Reviewed"}
+
+            def review_batch(self, reviews, trace=True):
+                self.batch_calls += 1
+                return [self.review_application(**review, trace=trace) for review in reviews]
+
+        valid = {
+            "name": "Batch User",
+            "mobile": "9999999997",
+            "age": 30,
+            "declared_income": 8000,
+            "loan_amount": 3000,
+            "tenure_months": 12,
+            "consent_recharge": True,
+        }
+
+        try:
+            application_api.clf = fake_classifier
+            application_api.scaler = _PassthroughScaler()
+            application_api.feature_order = [
+                "declared_income",
+                "loan_amount",
+                "tenure",
+                "composite_score",
+            ]
+            application_api.load_ml_model = lambda: True
+            loan_officer = application_api.loan_officer = _LoanOfficer()
+
+            response = asyncio.run(application_api.apply_batch(application_api.BatchApplicationRequest(
+                applications=[
+                    valid,
+                    {"name": "Missing Fields"},
+                    {**valid, "mobile": "9999999996", "loan_amount": 5000},
+                ]
+            )))
+            single = asyncio.run(application_api.apply_direct(EnhancedLoanApplication(**valid)))
+
+            self.assertEqual(response["count"], 3)
+            self.assertEqual(response["succeeded"], 2)
+            self.assertEqual(response["failed"], 1)
+            self.assertEqual([r["index"] for r in response["results"]], [0, 1, 2])
+            self.assertFalse(response["results"][1]["ok"])
+            self.assertEqual(response["results"][1]["error"]["status_code"], 422)
+
+            self.assertEqual(fake_classifier.calls, 2)  # one batch call + the apply_direct call
+            self.assertEqual(fake_classifier.rows_seen, 3)
+            self.assertEqual(loan_officer.batch_calls, 1)
+
+            batch_result = response["results"][0]["result"]
+            self.assertEqual(batch_result["loan_offer"], single["loan_offer"])
+            self.assertEqual(
+                batch_result["details"]["score_breakdown"]["composite_score"],
+                single["details"]["score_breakdown"]["composite_score"],
+            )
+        finally:
+            (
+                application_api.clf,
+                application_api.scaler,
+                application_api.feature_order,
+                application_api.load_ml_model,
+                application_api.loan_officer,
+            ) = original_state
+
+    def test_apply_batch_isolates_composite_scoring_errors(self):
+        fake_classifier = _BatchCountingClassifier()
+        original_state = (
+            application_api.clf,
+            application_api.scaler,
+            application_api.feature_order,
+            application_api.load_ml_model,
+            application_api.loan_officer,
+            application_api.compute_composite_scores,
+            application_api.compute_composite_score,
+        )
+
+        class _LoanOfficer:
+            def review_application(self, **kwargs):
+                return {"message": "Reviewed"}
+
+            def review_batch(self, reviews, trace=True):
+                return [self.review_application(**review, trace=trace) for review in reviews]
+
+        def failing_batch(features_list):
+            raise TypeError("unsupported operand type(s)")
+
+        def failing_single(features):
+            if features["loan_amount"] == 5000:
+                raise TypeError("unsupported operand type(s)")
+            return compute_composite_score(features)
+
+        valid = {
+            "name": "Batch User",
+            "mobile": "9999999997",
+            "age": 30,
+            "declared_income": 8000,
+            "loan_amount": 3000,
+            "tenure_months": 12,
+            "consent_recharge": True,
+        }
+
+        try:
+            application_api.clf = fake_classifier
+            application_api.scaler = _PassthroughScaler()
+            application_api.feature_order = ["declared_income", "loan_amount", "tenure", "composite_score"]
+            application_api.load_ml_model = lambda: True
+            application_api.loan_officer = _LoanOfficer()
+            application_api.compute_composite_scores = failing_batch
+            application_api.compute_composite_score = failing_single
+
+            response = asyncio.run(application_api.apply_batch(application_api.BatchApplicationRequest(
+                applications=[valid, {**valid, "mobile": "9999999996", "loan_amount": 5000}]
+            )))
+
+            self.assertEqual((response["succeeded"], response["failed"]), (1, 1))
+            self.assertTrue(response["results"][0]["ok"])
+            self.assertEqual(response["results"][1]["error"]["status_code"], 500)
+            self.assertEqual(fake_classifier.rows_seen, 1)
+        finally:
+            (
+                application_api.clf,
+                application_api.scaler,
+                application_api.feature_order,
+                application_api.load_ml_model,
+                application_api.loan_officer,
+                application_api.compute_composite_scores,
+                application_api.compute_composite_score,
+            ) = original_state
+
+    def test_apply_direct_returns_503_when_executor_saturated(self):
+        original_executor = application_api.inference_executor
+        release = threading.Event()
+        application_api.inference_executor = application_api.InferenceExecutor(
+            mode="thread", max_workers=1, queue_depth=0
+        )
+
+        async def main():
+            blocker = asyncio.ensure_future(application_api.inference_executor.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            try:
+                with self.assertRaises(application_api.HTTPException) as ctx:
+                    await application_api.apply_direct(EnhancedLoanApplication(
+                        name="Busy",
+                        mobile="9999999995",
+                        age=30,
+                        declared_income=8000,
+                        loan_amount=3000,
+                        tenure_months=12,
+                    ))
+                return ctx.exception
+            finally:
+                release.set()
+                await blocker
+
+        try:
+            exc = asyncio.run(main())
+            self.assertEqual(exc.status_code, 503)
+            self.assertEqual(exc.headers, {"Retry-After": "1"})
+        finally:
+            application_api.inference_executor.shutdown()
+            application_api.inference_executor = original_executor
+
+    def test_failed_profile_write_does_not_fail_the_request(self):
+        original_profiler = application_api.request_profiler
+        profiler = SamplingProfiler(mode="every", every_n=1, interval_ms=1)
+
+        def broken_write(stacks, elapsed, name):
+            raise OSError("disk full")
+
+        profiler._write = broken_write
+        application_api.request_profiler = profiler
+
+        def busy():
+            time.sleep(0.02)
+            return "scored"
+
+        try:
+            result, error, _ = application_api._run_scoring_stage(busy)
+        finally:
+            application_api.request_profiler = original_profiler
+        self.assertEqual(result, "scored")
+        self.assertIsNone(error)
+
+    def test_apply_direct_retry_is_served_from_result_cache(self):
+        fake_classifier = _BatchCountingClassifier()
+        original_state = (
+            application_api.clf,
+            application_api.scaler,
+            application_api.feature_order,
+            application_api.load_ml_model,
+            application_api.loan_officer,
+        )
+
+        class _LoanOfficer:
+            def review_application(self, **kwargs):
+                return {"message": "Reviewed"}
+
+        payload = {
+            "name": "Retry User",
+            "mobile": "9999999994",
+            "age": 30,
+            "declared_income": 8000,
+            "loan_amount": 3000,
+            "tenure_months": 12,
+            "application_id": "APP-RETRY",
+        }
+
+        async def main():
+            first_http, retry_http = application_api.Response(), application_api.Response()
+            first = await application_api.apply_direct(EnhancedLoanApplication(**payload), first_http)
+            retry = await application_api.apply_direct(EnhancedLoanApplication(**payload), retry_http)
+            keyed_request = application_api.Request(
+                {"type": "http", "headers": [(b"idempotency-key", b"idem-1")]}
+            )
+            keyed = await application_api.apply_direct(
+                EnhancedLoanApplication(**payload), request=keyed_request
+            )
+            with self.assertRaises(application_api.HTTPException) as ctx:
+                await application_api.apply_direct(
+                    EnhancedLoanApplication(**{**payload, "loan_amount": 4000}),
+                    request=keyed_request,
+                )
+            return first, retry, keyed, first_http, retry_http, ctx.exception
+
+        try:
+            application_api.clf = fake_classifier
+            application_api.scaler = _PassthroughScaler()
+            application_api.feature_order = ["declared_income", "loan_amount", "tenure", "composite_score"]
+            application_api.load_ml_model = lambda: True
+            application_api.loan_officer = _LoanOfficer()
+
+            first, retry, keyed, first_http, retry_http, conflict = asyncio.run(main())
+
+            self.assertEqual(retry, first)
+            self.assertEqual(keyed["final_sci"], first["final_sci"])
+            self.assertEqual(first_http.headers["X-Cache"], "miss")
+            self.assertEqual(retry_http.headers["X-Cache"], "hit")
+            self.assertEqual(fake_classifier.calls, 2)  # payload key once, Idempotency-Key once
+            self.assertEqual(conflict.status_code, 422)
+        finally:
+            (
+                application_api.clf,
+                application_api.scaler,
+                application_api.feature_order,
+                application_api.load_ml_model,
+                application_api.loan_officer,
+            ) = original_state
+
+    def test_apply_direct_without_application_id_is_not_cached(self):
+        fake_classifier = _BatchCountingClassifier()
+        original_state = (
+            application_api.clf,
+            application_api.scaler,
+            application_api.feature_order,
+            application_api.load_ml_model,
+            application_api.loan_officer,
+        )
+
+        class _LoanOfficer:
+            def review_application(self, **kwargs):
+                return {"message": "Reviewed"}
+
+        payload = {
+            "name": "Anonymous User",
+            "mobile": "9999999993",
+            "age": 30,
+            "declared_income": 8000,
+            "loan_amount": 3000,
+            "tenure_months": 12,
+        }
+
+        async def main():
+            responses = [application_api.Response(), application_api.Response()]
+            for http_response in responses:
+                await application_api.apply_direct(EnhancedLoanApplication(**payload), http_response)
+            return responses
+
+        try:
+            application_api.clf = fake_classifier
+            application_api.scaler = _PassthroughScaler()
+            application_api.feature_order = ["declared_income", "loan_amount", "tenure", "composite_score"]
+            application_api.load_ml_model = lambda: True
+            application_api.loan_officer = _LoanOfficer()
+
+            responses = asyncio.run(main())
+
+            # Each request gets its own generated id, so neither is replayed
+            self.assertEqual(fake_classifier.calls, 2)
+            self.assertTrue(all("X-Cache" not in r.headers for r in responses))
+        finally:
+            (
+                application_api.clf,
+                application_api.scaler,
+                application_api.feature_order,
+                application_api.load_ml_model,
+                application_api.loan_officer,
+            ) = original_state
+
+    def test_probes_serve_cached_snapshot(self):
+        original_monitor = application_api.health_monitor
+        checks = []
+        application_api.health_monitor = application_api.HealthMonitor(
+            db_check=lambda: checks.append("db") or True,
+            model_check=lambda: (True, "test"),
+            warmup=lambda: None,
+        )
+        try:
+            self.assertEqual(application_api.liveness(), {"status": "alive"})
+            self.assertEqual(application_api.readiness().status_code, 503)
+
+            application_api.health_monitor.refresh()
+            self.assertEqual(application_api.readiness().status_code, 200)
+            self.assertEqual(application_api.health_check()["model_version"], "test")
+            self.assertEqual(checks, ["db"])
+        finally:
+            application_api.health_monitor = original_monitor
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.district_stats import DistrictStatsService, QuantileSketch
+
+
+def _rank_error(sketch, data, q):
+    return abs(np.mean(data <= sketch.quantile(q)) - q)
+
+
+def test_sketch_exact_while_small():
+    sketch = QuantileSketch(k=200)
+    sketch.update_many([5.0, 1.0, 3.0, 2.0])
+    assert sketch.exact
+    assert sketch.median() == 2.5
+    assert sketch.quantile(0) == 1.0 and sketch.quantile(1) == 5.0
+
+
+def test_sketch_accuracy_and_bounded_memory():
+    data = np.random.default_rng(0).lognormal(5, 1, size=200_000)
+    sketch = QuantileSketch(k=200)
+    for chunk in np.array_split(data, 100):
+        sketch.update_many(chunk)
+    assert sketch.count == len(data)
+    assert sum(map(len, sketch.levels)) < 1000
+    for q in (0.1, 0.5, 0.9):
+        assert _rank_error(sketch, data, q) < 0.02
+    assert sketch.rank(np.median(data)) == pytest.approx(0.5, abs=0.02)
+
+
+def test_sketch_merge_and_roundtrip():
+    rng = np.random.default_rng(1)
+    parts = [rng.normal(100, 20, size=30_000) for _ in range(4)]
+    merged = QuantileSketch(k=200)
+    for part in parts:
+        worker = QuantileSketch(k=200)
+        worker.update_many(part)
+        restored, end = QuantileSketch.from_bytes(worker.to_bytes())
+        assert end == len(worker.to_bytes())
+        assert restored.median() == worker.median()
+        merged.merge(restored)
+    data = np.concatenate(parts)
+    assert merged.count == len(data)
+    assert _rank_error(merged, data, 0.5) < 0.02
+
+
+def test_service_levels_and_missing_data_handler():
+    service = DistrictStatsService()
+    service.observe("D1", "S1", {"avg_monthly_recharge_amount": 100.0, "emi_hit_rate": None})
+    service.observe("D1", "S1", {"avg_monthly_recharge_amount": 300.0})
+    service.observe("D2", "S1", {"avg_monthly_recharge_amount": 500.0, "note": "text"})
+
+    assert service.median("district", "D1", "avg_monthly_recharge_amount") == 200.0
+    assert service.median("state", "S1", "avg_monthly_recharge_amount") == 300.0
+    assert service.national_stats() == {"avg_monthly_recharge_amount": 300.0}
+    assert service.median("district", "D9", "avg_monthly_recharge_amount") is None
+
+    service.observe("D1", "S1", {"avg_monthly_recharge_amount": 400.0})
+    assert service.median("district", "D1", "avg_monthly_recharge_amount") == 300.0
+
+    handler = service.missing_data_handler()
+    assert handler.district_stats["D2"] == {"avg_monthly_recharge_amount": 500.0}
+
+
+def test_service_frame_merge_persist_and_medians(tmp_path):
+    rng = np.random.default_rng(2)
+    frame = pd.DataFrame({
+        "district_code": rng.choice(["D1", "D2", "D3"], size=6000),
+        "state_code": "S1",
+        "avg_monthly_electricity_units": rng.gamma(4, 40, size=6000),
+        "avg_monthly_recharge_amount": rng.gamma(3, 80, size=6000),
+    })
+    workers = [DistrictStatsService(), DistrictStatsService()]
+    workers[0].observe_frame(frame.iloc[:3000])
+    workers[1].observe_frame(frame.iloc[3000:])
+    workers[1].save(str(tmp_path / "stats.bin"))
+    service = workers[0].merge(DistrictStatsService.load(str(tmp_path / "stats.bin")))
+
+    for district, part in frame.groupby("district_code"):
+        data = part["avg_monthly_electricity_units"].to_numpy()
+        estimate = service.median("district", district, "avg_monthly_electricity_units")
+        assert abs(np.mean(data <= estimate) - 0.5) < 0.03
+
+    medians = service.district_medians("D1")
+    assert medians.median_recharge_amount == service.median("district", "D1", "avg_monthly_recharge_amount")
+    # no district observations for this feature: national median, then dataclass default
+    assert medians.median_lpg_frequency == 0.0
+    assert 0.0 < medians.estimated_consumption_percentile < 100.0
+
+    table = service.median_table()
+    assert list(table.districts) == ["D1", "D2", "D3"]
+    assert table.medians("D2") == service.district_medians("D2")
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from feature_cache import FeatureL1Cache
+
+
+class _FakePubSub:
+    def __init__(self, queue):
+        self.queue = queue
+        self.channels = []
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def listen(self):
+        yield {"type": "subscribe", "data": 1}
+        while True:
+            message = await self.queue.get()
+            if isinstance(message, Exception):
+                raise message
+            yield {"type": "message", "data": message}
+
+    async def reset(self):
+        pass
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.queues = []
+        self.published = []
+
+    @property
+    def subscriptions(self):
+        return len(self.queues)
+
+    def pubsub(self):
+        self.queues.append(asyncio.Queue())
+        return _FakePubSub(self.queues[-1])
+
+    async def publish(self, channel, data):
+        self.published.append((channel, data))
+        for queue in self.queues:
+            await queue.put(data)
+
+
+def _active_cache(**kwargs):
+    cache = FeatureL1Cache(**kwargs)
+    cache._subscribed = True
+    return cache
+
+
+def test_lru_and_ttl(monkeypatch):
+    cache = _active_cache(max_entries=2, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr("feature_cache.time.monotonic", lambda: now[0])
+    stamp = cache.stamp()
+    assert cache.put("A", {"a": 1}, stamp) and cache.put("B", {"b": 1}, stamp)
+    assert cache.get("A") == {"a": 1}
+    cache.put("C", {"c": 1}, stamp)  # evicts B, the least recently used
+    assert cache.get("B") is None and cache.get("A") == {"a": 1}
+    now[0] = 111.0
+    assert cache.get("A") is None
+    assert len(cache) == 1
+
+
+def test_inactive_cache_stores_nothing():
+    cache = FeatureL1Cache(max_entries=10)
+    assert not cache.put("A", {"a": 1}, cache.stamp())
+    assert cache.get("A") is None
+
+
+def test_stale_read_is_refused_after_invalidation():
+    cache = _active_cache(max_entries=10)
+    stamp = cache.stamp()              # read of A starts
+    cache.invalidate(["A"])            # a write of A lands meanwhile
+    assert not cache.put("A", {"a": "old"}, stamp)
+    assert cache.put("B", {"b": 1}, stamp)  # other beneficiaries are unaffected
+    assert cache.put("A", {"a": "new"}, cache.stamp())
+    assert cache.get("A") == {"a": "new"}
+
+
+def test_forgotten_stamps_refuse_older_reads():
+    cache = _active_cache(max_entries=2)
+    stamp = cache.stamp()
+    cache.invalidate(["A"])
+    cache.invalidate(["B"])
+    cache.invalidate(["C"])  # A's stamp is forgotten
+    assert not cache.put("A", {"a": 1}, stamp)
+    assert not cache.put("Z", {"z": 1}, stamp)
+    assert cache.put("A", {"a": 1}, cache.stamp())
+
+
+def test_messages_from_other_processes_invalidate():
+    cache = _active_cache(max_entries=10)
+    cache.put("A", {"a": 1}, cache.stamp())
+    cache.put("B", {"b": 1}, cache.stamp())
+    cache.handle_message(json.dumps({"origin": cache.origin, "bids": ["A"]}))
+    assert cache.get("A") == {"a": 1}
+    cache.handle_message(json.dumps({"origin": "other", "bids": ["A"]}))
+    assert cache.get("A") is None and cache.get("B") == {"b": 1}
+    cache.handle_message(b"not json")  # unknown message: drop everything
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_pubsub_invalidation_between_processes():
+    redis = _FakeRedis()
+    first, second = FeatureL1Cache(max_entries=10), FeatureL1Cache(max_entries=10)
+    assert await first.start(redis) and await second.start(redis)
+    for cache in (first, second):
+        cache.put("A", {"a": 1}, cache.stamp())
+
+    await first.publish(redis, ["A"])
+    assert first.get("A") is None
+    await asyncio.sleep(0.01)
+    assert second.get("A") is None
+    assert json.loads(redis.published[0][1])["bids"] == ["A"]
+
+    await first.stop()
+    await second.stop()
+    assert not first.active
+
+
+@pytest.mark.asyncio
+async def test_lost_subscription_clears_and_resubscribes(monkeypatch):
+    monkeypatch.setattr("feature_cache.RESUBSCRIBE_DELAY_SECONDS", 0.0)
+    redis = _FakeRedis()
+    cache = FeatureL1Cache(max_entries=10)
+    await cache.start(redis)
+    stamp = cache.stamp()
+    cache.put("A", {"a": 1}, stamp)
+
+    await redis.queues[-1].put(ConnectionError("connection lost"))
+    await asyncio.sleep(0.01)
+    assert cache.get("A") is None
+    assert not cache.put("A", {"a": 1}, stamp)  # read from before the outage
+    assert redis.subscriptions == 2 and cache.active
+    await cache.stop()
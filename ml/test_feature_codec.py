@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+import pytest
+
+from ml.feature_codec import FORMAT_BINARY, FeatureCodec, SchemaRegistry, UnknownSchemaError
+
+NAMES = [f"f{i}" for i in range(30)]
+
+
+@pytest.fixture
+def codec():
+    registry = SchemaRegistry()
+    registry.register(NAMES)
+    return FeatureCodec(registry)
+
+
+def test_without_schema_stays_json():
+    codec = FeatureCodec()
+    assert codec.encode({"feat": 1}) == '{"feat": 1}'
+    assert codec.decode('{"feat": 1}') == {"feat": 1}
+
+
+def test_binary_roundtrip_full_and_partial(codec):
+    features = {name: i * 1.5 for i, name in enumerate(NAMES)}
+    blob = codec.encode(features)
+    assert isinstance(blob, bytes) and blob[0] == FORMAT_BINARY
+    assert len(blob) == 3 + 4 + 30 * 8
+    assert codec.decode(blob) == features
+
+    partial = {"f29": 2, "f3": None, "f0": -1.25}
+    blob = codec.encode(partial)
+    assert len(blob) == 3 + 4 + 3 * 8
+    assert codec.decode(blob) == {"f0": -1.25, "f3": None, "f29": 2.0}
+
+
+def test_non_schema_dicts_fall_back_to_json(codec):
+    for features in ({"f0": 1, "other": 2}, {"f0": "text"}, {"f0": [1, 2]}, {"f0": True, "f1": 3}):
+        encoded = codec.encode(features)
+        assert encoded == json.dumps(features)
+        assert codec.decode(encoded.encode()) == features
+
+
+def test_float32_schema_is_smaller():
+    registry = SchemaRegistry()
+    registry.register(NAMES, dtype=np.float32)
+    codec = FeatureCodec(registry)
+    blob = codec.encode({name: 0.5 for name in NAMES})
+    assert len(blob) == 3 + 4 + 30 * 4
+    assert codec.decode(blob)["f7"] == 0.5
+    assert isinstance(codec.encode({"f0": 1e40}), str)  # out of float32 range
+
+
+def test_register_versions():
+    registry = SchemaRegistry()
+    v1 = registry.register(["a", "b"])
+    assert registry.register(["a", "b"], version=1) is v1
+    with pytest.raises(ValueError):
+        registry.register(["a", "c"], version=1)
+    v2 = registry.register(["b", "c"])
+    assert (v2.version, registry.current) == (2, v2)
+    assert registry.versions == [1, 2]
+    with pytest.raises(ValueError):
+        registry.register(["a", "a"])
+
+
+def test_unknown_schema_version(codec):
+    other = SchemaRegistry()
+    other.register(["x"], version=9)
+    blob = FeatureCodec(other).encode({"x": 1.0})
+    assert not codec.can_decode(blob)
+    with pytest.raises(UnknownSchemaError):
+        codec.decode(blob)
+    assert codec.can_decode(b'{"x": 1}')
+
+
+def test_decode_matrix_matches_dicts_across_versions_and_formats():
+    registry = SchemaRegistry()
+    registry.register(["a", "b", "c"])
+    codec = FeatureCodec(registry)
+    old_full = codec.encode({"a": 1, "b": 2, "c": 3})
+    old_partial = codec.encode({"c": 4})
+    registry.register(["c", "d", "a"], dtype=np.float32)
+    new_full = codec.encode({"a": 5, "c": 6, "d": 7})
+    new_partial = codec.encode({"d": 8, "a": None})
+    entries = [old_full, new_full, None, old_partial, '{"a": 9, "zz": 1}', b'{"d": 10}', {"c": 11}, new_partial, new_full]
+
+    matrix = codec.decode_matrix(entries)
+    expected = np.array([
+        [3, np.nan, 1], [6, 7, 5], [np.nan] * 3, [4, np.nan, np.nan], [np.nan, np.nan, 9],
+        [np.nan, 10, np.nan], [11, np.nan, np.nan], [np.nan, 8, np.nan], [6, 7, 5],
+    ])
+    np.testing.assert_array_equal(matrix, expected)
+
+    # Per-row decoding and decoding into an older schema agree
+    row = np.empty(3)
+    for raw, want in zip(entries, expected):
+        if raw is not None:
+            np.testing.assert_array_equal(codec.decode_row(raw, row), want)
+    np.testing.assert_array_equal(codec.decode_matrix([new_full, old_full], schema=1), [[5, np.nan, 6], [1, 2, 3]])
+
+
+def test_decode_matrix_random_parity(codec):
+    rng = np.random.default_rng(3)
+    dicts = []
+    for _ in range(200):
+        keep = rng.random(len(NAMES)) < rng.choice([0.5, 1.0])
+        dicts.append({name: float(v) for name, v, k in zip(NAMES, rng.normal(size=len(NAMES)), keep) if k})
+    matrix = codec.decode_matrix([codec.encode(d) for d in dicts])
+    expected = np.array([[d.get(name, np.nan) for name in NAMES] for d in dicts])
+    np.testing.assert_array_equal(matrix, expected)
+    assert [codec.decode(codec.encode(d)) for d in dicts] == dicts
@@ -1,7 +1,11 @@
 import pytest
 import asyncio
+import json
 from unittest.mock import AsyncMock, MagicMock
-from ml.feature_store import FeatureStore, CACHE_HITS, CACHE_MISSES
+import numpy as np
+from ml.feature_store import FeatureStore, CACHE_HITS, CACHE_MISSES, BATCH_HIT_RATIO
+from ml.feature_codec import FeatureCodec, SchemaRegistry
+from feature_cache import FeatureL1Cache
 
 @pytest.fixture
 def mock_redis():
@@ -94,6 +98,219 @@ async def test_read_features_total_miss(store, mock_redis, mock_session_maker):
     
     assert features is None
 
+@pytest.mark.asyncio
+async def test_read_many_all_hits(store, mock_redis, mock_session_maker):
+    mock_redis.mget.return_value = ['{"feat": 1}', '{"feat": 2}']
+    initial_hits = CACHE_HITS._value.get()
+
+    features = await store.read_many(["USER1", "USER2"])
+
+    assert features == [{"feat": 1}, {"feat": 2}]
+    mock_redis.mget.assert_called_once_with(["features:USER1", "features:USER2"])
+    mock_session = mock_session_maker.return_value.__aenter__.return_value
+    mock_session.execute.assert_not_called()
+    assert CACHE_HITS._value.get() == initial_hits + 2
+
+@pytest.mark.asyncio
+async def test_read_many_misses_one_query_one_pipeline(store, mock_redis, mock_session_maker):
+    # USER1 cached, USER2 and USER3 (requested twice) only in Postgres, USER4 nowhere
+    mock_redis.mget.return_value = ['{"feat": 1}', None, None, None, None]
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    mock_redis.pipeline = MagicMock(return_value=pipe)
+
+    mock_session = mock_session_maker.return_value.__aenter__.return_value
+    mock_result = MagicMock()
+    mock_result.fetchall.return_value = [("USER3", {"feat": 3}), ("USER2", {"feat": 2})]
+    mock_session.execute.return_value = mock_result
+
+    initial_misses = CACHE_MISSES._value.get()
+    initial_batches = BATCH_HIT_RATIO._sum.get()
+
+    features = await store.read_many(["USER1", "USER2", "USER3", "USER4", "USER3"])
+
+    assert features == [{"feat": 1}, {"feat": 2}, {"feat": 3}, None, {"feat": 3}]
+    mock_session.execute.assert_called_once()
+    query, params = mock_session.execute.call_args.args
+    assert "ANY(:bids)" in str(query)
+    assert params == {"bids": ["USER2", "USER3", "USER4"]}
+
+    await asyncio.sleep(0.01)
+    mock_redis.pipeline.assert_called_once_with(transaction=False)
+    assert sorted(c.args[0] for c in pipe.set.call_args_list) == ["features:USER2", "features:USER3"]
+    assert all(c.kwargs == {"ex": 2592000} for c in pipe.set.call_args_list)
+    pipe.execute.assert_awaited_once()
+    mock_redis.set.assert_not_called()
+
+    assert CACHE_MISSES._value.get() == initial_misses + 4
+    assert BATCH_HIT_RATIO._sum.get() == pytest.approx(initial_batches + 0.2)
+
+@pytest.mark.asyncio
+async def test_read_many_corrupt_entry_falls_back_to_postgres(store, mock_redis, mock_session_maker):
+    mock_redis.mget.return_value = ['{"feat": 1}', b'{"a": 1', '{"feat": 3}']
+    mock_redis.pipeline = MagicMock(return_value=MagicMock(execute=AsyncMock()))
+
+    mock_session = mock_session_maker.return_value.__aenter__.return_value
+    mock_result = MagicMock()
+    mock_result.fetchall.return_value = [("USER2", {"feat": 2})]
+    mock_session.execute.return_value = mock_result
+    initial_misses = CACHE_MISSES._value.get()
+
+    features = await store.read_many(["USER1", "USER2", "USER3"])
+
+    assert features == [{"feat": 1}, {"feat": 2}, {"feat": 3}]
+    assert mock_session.execute.call_args.args[1] == {"bids": ["USER2"]}
+    assert CACHE_MISSES._value.get() == initial_misses + 1
+
+@pytest.mark.asyncio
+async def test_read_many_redis_down_falls_back_to_postgres(store, mock_redis, mock_session_maker):
+    mock_redis.mget.side_effect = ConnectionError("redis down")
+    mock_redis.pipeline = MagicMock(return_value=MagicMock(execute=AsyncMock()))
+
+    mock_session = mock_session_maker.return_value.__aenter__.return_value
+    mock_result = MagicMock()
+    mock_result.fetchall.return_value = [("USER1", {"feat": 1})]
+    mock_session.execute.return_value = mock_result
+
+    features = await store.read_many(["USER1", "USER2"])
+
+    assert features == [{"feat": 1}, None]
+
+@pytest.mark.asyncio
+async def test_read_many_empty(store, mock_redis):
+    assert await store.read_many([]) == []
+    mock_redis.mget.assert_not_called()
+
+@pytest.fixture
+def binary_store(mock_redis, mock_session_maker):
+    registry = SchemaRegistry()
+    registry.register(["a", "b"])
+    return FeatureStore(redis_client=mock_redis, db_session_maker=mock_session_maker, codec=FeatureCodec(registry))
+
+@pytest.mark.asyncio
+async def test_binary_write_and_read(binary_store, mock_redis):
+    await binary_store.write_features("USER1", {"a": 1.0, "b": 2.5})
+
+    payload = mock_redis.set.call_args.args[1]
+    assert isinstance(payload, bytes)
+    mock_redis.get.return_value = payload
+    assert await binary_store.read_features("USER1") == {"a": 1.0, "b": 2.5}
+
+    # Entries written before the migration still decode
+    mock_redis.get.return_value = b'{"a": 3}'
+    assert await binary_store.read_features("USER1") == {"a": 3}
+
+@pytest.mark.asyncio
+async def test_read_matrix_mixes_binary_json_and_postgres(binary_store, mock_redis, mock_session_maker):
+    codec = binary_store.codec
+    mock_redis.mget.return_value = [codec.encode({"a": 1.0, "b": 2.0}), b'{"b": 3}', None, None]
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    mock_redis.pipeline = MagicMock(return_value=pipe)
+
+    mock_session = mock_session_maker.return_value.__aenter__.return_value
+    mock_result = MagicMock()
+    mock_result.fetchall.return_value = [("USER3", {"a": 4, "b": 5})]
+    mock_session.execute.return_value = mock_result
+
+    matrix = await binary_store.read_matrix(["USER1", "USER2", "USER3", "USER4"])
+
+    np.testing.assert_array_equal(matrix, [[1, 2], [np.nan, 3], [4, 5], [np.nan, np.nan]])
+    await asyncio.sleep(0.01)
+    assert pipe.set.call_args.args == ("features:USER3", codec.encode({"a": 4, "b": 5}))
+
+@pytest.mark.asyncio
+async def test_read_matrix_truncated_binary_entry_falls_back(binary_store, mock_redis, mock_session_maker):
+    codec = binary_store.codec
+    good = codec.encode({"a": 1.0, "b": 2.0})
+    mock_redis.mget.return_value = [good, good[:-3], b'{"a": 1']
+    mock_redis.pipeline = MagicMock(return_value=MagicMock(execute=AsyncMock()))
+
+    mock_session = mock_session_maker.return_value.__aenter__.return_value
+    mock_result = MagicMock()
+    mock_result.fetchall.return_value = [("USER2", {"a": 5, "b": 6})]
+    mock_session.execute.return_value = mock_result
+
+    matrix = await binary_store.read_matrix(["USER1", "USER2", "USER3"])
+
+    np.testing.assert_array_equal(matrix, [[1, 2], [5, 6], [np.nan, np.nan]])
+    assert mock_session.execute.call_args.args[1] == {"bids": ["USER2", "USER3"]}
+
+@pytest.mark.asyncio
+async def test_read_many_unknown_schema_counts_as_miss(binary_store, mock_redis, mock_session_maker):
+    newer = SchemaRegistry()
+    newer.register(["a", "b", "c"], version=7)
+    mock_redis.mget.return_value = [FeatureCodec(newer).encode({"c": 1.0})]
+    mock_redis.pipeline = MagicMock(return_value=MagicMock(execute=AsyncMock()))
+
+    mock_session = mock_session_maker.return_value.__aenter__.return_value
+    mock_result = MagicMock()
+    mock_result.fetchall.return_value = [("USER1", {"a": 1})]
+    mock_session.execute.return_value = mock_result
+
+    assert await binary_store.read_many(["USER1"]) == [{"a": 1}]
+    mock_session.execute.assert_called_once()
+
+@pytest.fixture
+def l1_store(mock_redis, mock_session_maker):
+    l1 = FeatureL1Cache(max_entries=100, ttl=60)
+    l1._subscribed = True  # as if the invalidation listener were running
+    return FeatureStore(redis_client=mock_redis, db_session_maker=mock_session_maker, l1=l1)
+
+@pytest.mark.asyncio
+async def test_l1_serves_repeat_reads(l1_store, mock_redis):
+    mock_redis.get.return_value = '{"feat": 1}'
+
+    assert await l1_store.read_features("USER1") == {"feat": 1}
+    assert await l1_store.read_features("USER1") == {"feat": 1}
+
+    mock_redis.get.assert_called_once_with("features:USER1")
+    assert l1_store.l1.hits == 1
+
+@pytest.mark.asyncio
+async def test_l1_write_invalidates_and_publishes(l1_store, mock_redis):
+    mock_redis.get.return_value = '{"feat": 1}'
+    await l1_store.read_features("USER1")
+
+    await l1_store.write_features("USER1", {"feat": 2})
+
+    assert l1_store.l1.get("USER1") is None
+    channel, message = mock_redis.publish.call_args.args
+    assert channel == l1_store.l1.channel
+    assert json.loads(message) == {"origin": l1_store.l1.origin, "bids": ["USER1"]}
+
+@pytest.mark.asyncio
+async def test_l1_refuses_read_that_raced_a_write(l1_store, mock_redis):
+    async def slow_get(key):
+        # A write lands while this read is in flight
+        await l1_store.write_features("USER1", {"feat": 2})
+        return '{"feat": 1}'
+    mock_redis.get.side_effect = slow_get
+
+    assert await l1_store.read_features("USER1") == {"feat": 1}
+    assert l1_store.l1.get("USER1") is None
+
+@pytest.mark.asyncio
+async def test_l1_read_many_only_fetches_uncached(l1_store, mock_redis):
+    mock_redis.get.return_value = '{"feat": 1}'
+    await l1_store.read_features("USER1")
+    mock_redis.mget.return_value = ['{"feat": 2}']
+
+    assert await l1_store.read_many(["USER1", "USER2"]) == [{"feat": 1}, {"feat": 2}]
+    mock_redis.mget.assert_called_once_with(["features:USER2"])
+    assert l1_store.l1.get("USER2") == {"feat": 2}
+
+@pytest.mark.asyncio
+async def test_l1_bulk_write_invalidates(l1_store, mock_redis, mock_session_maker):
+    mock_redis.get.return_value = '{"feat": 1}'
+    await l1_store.read_features("USER1")
+
+    await l1_store.bulk_write([{"beneficiary_id": "USER1", "features": {"feat": 2}}])
+
+    assert l1_store.l1.get("USER1") is None
+    mock_redis.delete.assert_called_once_with("features:USER1")
+    assert json.loads(mock_redis.publish.call_args.args[1])["bids"] == ["USER1"]
+
 @pytest.mark.asyncio
 async def test_bulk_write(store, mock_session_maker):
     mock_session = mock_session_maker.return_value.__aenter__.return_value
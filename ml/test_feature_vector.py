@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+from ml.feature_vector import FeatureVectorAssembler, MissingFeatureError, compile_scaler
+
+ORDER = ["declared_income", "loan_amount", "tenure", "composite_score"]
+
+
+def _features(i=0):
+    return {
+        "composite_score": 55.5 + i,
+        "tenure": 12,
+        "loan_amount": 3000.0 * (i + 1),
+        "declared_income": 8000,
+        "unused_extra": "ignored",
+    }
+
+
+def test_row_matches_dataframe_reorder():
+    assembler = FeatureVectorAssembler(ORDER)
+    row = assembler.row(_features())
+    expected = pd.DataFrame([_features()])[ORDER].to_numpy(dtype=np.float64)
+    assert row.dtype == np.float64
+    assert np.array_equal(row, expected)
+
+
+def test_matrix_matches_dataframe_reorder():
+    assembler = FeatureVectorAssembler(ORDER)
+    rows = [_features(i) for i in range(5)]
+    out = np.empty((5, len(ORDER)))
+    matrix = assembler.matrix(rows, out=out)
+    assert matrix is out
+    assert np.array_equal(matrix, pd.DataFrame(rows)[ORDER].to_numpy(dtype=np.float64))
+
+
+def test_missing_features_fail_fast():
+    assembler = FeatureVectorAssembler(ORDER)
+    features = _features()
+    del features["tenure"]
+    del features["composite_score"]
+    with pytest.raises(MissingFeatureError) as exc:
+        assembler.row(features)
+    assert exc.value.missing == ["tenure", "composite_score"]
+
+
+def test_none_becomes_nan():
+    assembler = FeatureVectorAssembler(ORDER)
+    row = assembler.row({**_features(), "tenure": None})
+    assert np.isnan(row[0, 2])
+
+
+def test_single_feature_order():
+    assembler = FeatureVectorAssembler(["tenure"])
+    assert assembler.row(_features()).tolist() == [[12.0]]
+
+
+def test_compiled_standard_scaler_is_exact():
+    rng = np.random.default_rng(7)
+    train = pd.DataFrame(rng.normal(1000, 300, (200, len(ORDER))), columns=ORDER)
+    scaler = StandardScaler().fit(train)
+    X = rng.normal(1000, 300, (50, len(ORDER)))
+    expected = scaler.transform(pd.DataFrame(X, columns=ORDER))
+    result = compile_scaler(scaler)(X)
+    assert np.array_equal(result, expected)
+    assert not np.shares_memory(result, X)
+
+
+def test_other_scalers_fall_back_to_transform():
+    scaler = MinMaxScaler().fit(np.arange(8.0).reshape(4, 2))
+    assert compile_scaler(scaler) == scaler.transform
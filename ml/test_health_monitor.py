@@ -0,0 +1,88 @@
+import time
+
+from ml.health_monitor import HealthMonitor
+
+
+def _monitor(db=True, model=(True, "2.2.0"), warmup=None, **kwargs):
+    calls = {"db": 0, "warmup": 0}
+
+    def db_check():
+        calls["db"] += 1
+        if isinstance(db, Exception):
+            raise db
+        return db
+
+    def do_warmup():
+        calls["warmup"] += 1
+        if warmup is not None:
+            warmup()
+
+    state = {"model": model}
+    monitor = HealthMonitor(db_check, lambda: state["model"], do_warmup, **kwargs)
+    return monitor, calls, state
+
+
+def test_not_ready_before_first_refresh():
+    monitor, calls, _ = _monitor()
+    snapshot = monitor.snapshot()
+    assert not snapshot.ready
+    assert calls == {"db": 0, "warmup": 0}
+
+
+def test_refresh_warms_up_once_then_ready():
+    monitor, calls, _ = _monitor()
+    assert monitor.refresh().ready
+    monitor.refresh()
+    snapshot = monitor.snapshot()
+    assert snapshot.ready and snapshot.warmed_up
+    assert snapshot.model_version == "2.2.0"
+    assert calls == {"db": 2, "warmup": 1}
+
+
+def test_snapshot_does_not_run_checks():
+    monitor, calls, _ = _monitor()
+    monitor.refresh()
+    for _ in range(10):
+        monitor.snapshot()
+    assert calls["db"] == 1
+
+
+def test_new_model_version_warms_up_again():
+    monitor, calls, state = _monitor()
+    monitor.refresh()
+    state["model"] = (True, "2.3.0")
+    assert monitor.refresh().model_version == "2.3.0"
+    assert calls["warmup"] == 2
+
+
+def test_failed_warmup_is_not_ready():
+    def boom():
+        raise RuntimeError("predict failed")
+
+    monitor, _, _ = _monitor(warmup=boom)
+    snapshot = monitor.refresh()
+    assert not snapshot.ready
+    assert snapshot.errors["warmup"] == "predict failed"
+
+
+def test_database_only_gates_readiness_when_required():
+    monitor, _, _ = _monitor(db=ConnectionError("refused"))
+    snapshot = monitor.refresh()
+    assert snapshot.ready
+    assert snapshot.database == "disconnected"
+    assert "refused" in snapshot.errors["database"]
+
+    strict, _, _ = _monitor(db=False, require_db=True)
+    assert not strict.refresh().ready
+
+
+def test_background_thread_publishes_snapshot():
+    monitor, _, _ = _monitor(refresh_interval=0.01)
+    monitor.start()
+    try:
+        deadline = time.time() + 2
+        while not monitor.snapshot().ready and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        monitor.stop()
+    assert monitor.snapshot().ready
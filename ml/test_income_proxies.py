@@ -116,3 +116,60 @@ def test_consumption_growth_rate_valid(extractor, default_medians):
     feats = extractor.compute_features(utils, [], default_medians)
     # prev = 300, last = 600. Growth = (600 - 300) / 300 = 1.0 (100%)
     assert feats["consumption_growth_rate"] == 1.0
+
+# --- Batch (columnar) mode ---
+
+def _random_records(n_beneficiaries, seed=0):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    base = datetime(2023, 1, 1)
+    utils, telecoms = [], []
+    for b in range(n_beneficiaries):
+        for _ in range(rng.integers(0, 9)):
+            rec = {"beneficiary_id": b, "billing_date": (base + timedelta(days=int(rng.integers(0, 360)))).strftime("%Y-%m-%d"),
+                   "type": str(rng.choice(["electricity", "Electricity", "water", "LPG", "pahal"])),
+                   "amount": float(rng.integers(50, 900))}
+            if rng.random() < 0.7:
+                rec["units_consumed_kwh"] = float(rng.integers(0, 300))
+            if rng.random() < 0.8:
+                rec["payment_status"] = str(rng.choice(["PAID", "paid", "PENDING"]))
+            if rng.random() < 0.6:
+                rec["payment_method"] = str(rng.choice(["UPI", "cash", "card"]))
+            utils.append(rec)
+        for _ in range(rng.integers(0, 8)):
+            telecoms.append({"beneficiary_id": b, "type": "mobile", "amount": float(rng.integers(10, 800)),
+                             "billing_date": base + timedelta(days=int(rng.integers(0, 360)))})
+    return utils, telecoms
+
+
+def test_batch_matches_per_beneficiary(extractor, default_medians):
+    import pandas as pd
+    from ml.income_proxies import DistrictMedianTable, PROXY_FEATURES
+
+    utils, telecoms = _random_records(300)
+    other = DistrictMedians(median_electricity_kwh=90.0, estimated_consumption_percentile=40.0)
+    table = DistrictMedianTable.from_medians({"D1": default_medians, "D2": other})
+    districts = pd.Series({b: ("D1" if b % 3 else "D2") for b in range(300)})
+    batch = extractor.compute_features_batch(pd.DataFrame(utils), pd.DataFrame(telecoms), districts, table)
+    assert list(batch.columns) == PROXY_FEATURES
+
+    for b in range(300):
+        strip = lambda rows: [{k: v for k, v in r.items() if k != "beneficiary_id"} for r in rows if r["beneficiary_id"] == b]
+        expected = extractor.compute_features(strip(utils), strip(telecoms), table.medians(districts[b]))
+        for name, value in expected.items():
+            assert batch.loc[b, name] == pytest.approx(value, rel=1e-9, abs=1e-9), (b, name)
+
+
+def test_batch_leaves_records_untouched_and_needs_medians(extractor, default_medians):
+    import pandas as pd
+    from ml.income_proxies import DistrictMedianTable
+
+    utils = [{"type": "electricity", "billing_date": "2023-11-01", "amount": 10}]
+    extractor.compute_features(utils, [], default_medians)
+    assert "_parsed_date" not in utils[0]
+
+    table = DistrictMedianTable.from_medians({"D1": default_medians})
+    with pytest.raises(ValueError, match="district_medians required"):
+        extractor.compute_features_batch(pd.DataFrame(utils).assign(beneficiary_id=1), None, {1: "D9"}, table)
+    batch = extractor.compute_features_batch(None, None, {1: "D1"}, table)
+    assert batch.loc[1, "avg_monthly_electricity_units"] == 150.0
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from ml.inference_executor import ExecutorSaturated, InferenceExecutor
+
+
+def _square(x):
+    return x * x
+
+
+def test_thread_mode_runs_off_event_loop():
+    executor = InferenceExecutor(mode="thread", max_workers=2, queue_depth=0)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run(threading.get_ident)
+        return loop_thread, worker_thread, await executor.run(_square, 7)
+
+    try:
+        loop_thread, worker_thread, result = asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert worker_thread != loop_thread
+    assert result == 49
+
+
+def test_saturated_executor_rejects_immediately():
+    executor = InferenceExecutor(mode="thread", max_workers=1, queue_depth=1)
+    release = threading.Event()
+
+    async def main():
+        blocked = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(_square, 3)
+        release.set()
+        await asyncio.gather(*blocked)
+        # Capacity is released once work finishes
+        return await executor.run(_square, 3)
+
+    try:
+        assert asyncio.run(main()) == 9
+    finally:
+        executor.shutdown()
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_caller_keeps_slot_until_work_finishes():
+    executor = InferenceExecutor(mode="thread", max_workers=1, queue_depth=0)
+    release = threading.Event()
+
+    async def main():
+        task = asyncio.ensure_future(executor.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The worker is still busy, so its slot is too
+        assert executor.stats()["in_flight"] == 1
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(_square, 3)
+        release.set()
+        for _ in range(100):
+            if executor.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return await executor.run(_square, 3)
+
+    try:
+        assert asyncio.run(main()) == 9
+    finally:
+        executor.shutdown()
+    assert executor.stats()["in_flight"] == 0
+
+
+def test_process_mode_runs_in_worker_process():
+    executor = InferenceExecutor(mode="process", max_workers=1, queue_depth=0)
+    try:
+        executor.start()
+        pid = asyncio.run(executor.run(os.getpid))
+    finally:
+        executor.shutdown()
+    assert pid != os.getpid()
+
+
+def test_invalid_mode_rejected():
+    with pytest.raises(ValueError):
+        InferenceExecutor(mode="gpu")
@@ -113,3 +113,46 @@ def test_100_percent_missing(handler, meta):
     assert result.features["avg_days_past_due"] == 10.0 # Hit district
     assert result.features["emi_hit_rate"] == 85.0 # Hit state
     assert result.features["utility_diversity_score"] == 2.0 # Hit national
+
+# --- Batch matrix imputation ---
+
+def test_impute_matrix_matches_impute(handler):
+    import pandas as pd
+    from ml.missing_data import TIER_OBSERVED, tier_name
+
+    features = ["avg_days_past_due", "emi_hit_rate", "avg_monthly_recharge_amount",
+                "utility_diversity_score", "repeat_borrower_flag"]
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 500, size=(400, len(features))), columns=features)
+    X = X.mask(rng.random(X.shape) < 0.4)
+    districts = rng.choice(["D1", "D2"], size=400)
+    states = rng.choice(["S1", "S9"], size=400)
+
+    result = handler.impute_matrix(X, districts, states)
+
+    for i in range(len(X)):
+        meta = BeneficiaryMeta(district_code=districts[i], state_code=states[i], caste_category="GEN", loan_count=1)
+        fv = {k: (None if np.isnan(v) else v) for k, v in X.iloc[i].items()}
+        expected = handler.impute(fv, meta)
+        assert result.completeness_score[i] == pytest.approx(expected.completeness_score)
+        assert result.requires_ccs_cap[i] == expected.requires_ccs_cap
+        assert result.requires_manual_review[i] == expected.policy_flags["requires_manual_review"]
+        for j, feat in enumerate(features):
+            assert result.values[i, j] == expected.features[feat]
+            if feat in expected.imputation_metadata:
+                assert tier_name(result.tiers[i, j]) == expected.imputation_metadata[feat]["tier_used"]
+            else:
+                assert result.tiers[i, j] == TIER_OBSERVED
+
+
+def test_impute_matrix_array_input(handler):
+    from ml.missing_data import TIER_CAPPED, TIER_DISTRICT
+
+    X = np.array([[np.nan, np.nan], [5.0, 1.0]])
+    result = handler.impute_matrix(X, ["D1", "D1"], ["S1", "S1"],
+                                   feature_names=["avg_days_past_due", "avg_monthly_recharge_amount"])
+    assert result.values.tolist() == [[10.0, 200.0], [5.0, 1.0]]
+    assert result.tiers[0].tolist() == [TIER_DISTRICT, TIER_DISTRICT | TIER_CAPPED]
+    assert result.completeness_score.tolist() == [0.0, 1.0]
+    with pytest.raises(ValueError, match="feature_names"):
+        handler.impute_matrix(X, ["D1", "D1"], ["S1", "S1"])
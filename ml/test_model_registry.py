@@ -0,0 +1,222 @@
+import json
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from ml.model_registry import ModelRegistry
+
+
+def _write_meta(models_dir, barrier, version="1.0.0", **extra):
+    path = os.path.join(models_dir, "model_metadata.json")
+    with open(path, "w") as f:
+        json.dump({"version": version, "dynamic_income_barrier": barrier, **extra}, f)
+    # Make the change visible even on filesystems with coarse mtime resolution
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    d = str(tmp_path)
+    _write_meta(d, 12000)
+    joblib.dump({"kind": "clf"}, os.path.join(d, "safecred_model.pkl"))
+    joblib.dump({"kind": "scaler"}, os.path.join(d, "scaler.pkl"))
+    joblib.dump(["declared_income", "loan_amount"], os.path.join(d, "feature_order.pkl"))
+    return d
+
+
+def test_policy_loaded_once(models_dir, monkeypatch):
+    registry = ModelRegistry(models_dir)
+    calls = []
+    real_load = json.load
+    monkeypatch.setattr(json, "load", lambda f: calls.append(1) or real_load(f))
+
+    for _ in range(5):
+        assert registry.policy().dynamic_income_barrier == 12000.0
+    assert len(calls) == 1
+
+
+def test_policy_overrides_and_defaults(models_dir):
+    _write_meta(models_dir, 9000, caps={"income_cap": 30000.0})
+    policy = ModelRegistry(models_dir).policy()
+    assert policy.caps["income_cap"] == 30000.0
+    assert policy.caps["delay_cap"] == 30.0
+    assert policy.pillar_weights["financial"] == 0.35
+
+
+def test_missing_metadata_falls_back(tmp_path):
+    policy = ModelRegistry(str(tmp_path)).policy()
+    assert policy.dynamic_income_barrier == 15000
+    assert policy.version == "unversioned"
+
+
+def test_artifacts_snapshot(models_dir):
+    artifacts = ModelRegistry(models_dir).artifacts()
+    assert artifacts.ready
+    assert artifacts.clf == {"kind": "clf"}
+    assert artifacts.feature_order == ["declared_income", "loan_amount"]
+    assert artifacts.version == "1.0.0"
+
+
+def test_missing_artifacts_not_ready(tmp_path):
+    _write_meta(str(tmp_path), 12000)
+    assert not ModelRegistry(str(tmp_path)).artifacts().ready
+
+
+def test_refresh_swaps_on_change(models_dir):
+    registry = ModelRegistry(models_dir)
+    before = registry.artifacts()
+    assert registry.refresh() is False
+    assert registry.artifacts() is before
+
+    _write_meta(models_dir, 14000, version="1.1.0")
+    assert registry.refresh() is True
+    after = registry.artifacts()
+    assert after is not before
+    assert after.version == "1.1.0"
+    assert registry.policy().dynamic_income_barrier == 14000.0
+    # The old snapshot is untouched for requests still holding it
+    assert before.version == "1.0.0"
+
+
+def test_failed_reload_keeps_previous(models_dir):
+    registry = ModelRegistry(models_dir)
+    before = registry.artifacts()
+
+    with open(os.path.join(models_dir, "safecred_model.pkl"), "wb") as f:
+        f.write(b"not a pickle")
+    registry.refresh()
+    assert registry.artifacts() is before
+
+
+def test_mmap_loads_from_uncompressed_cache(models_dir, tmp_path):
+    import numpy as np
+
+    model_path = os.path.join(models_dir, "safecred_model.pkl")
+    joblib.dump({"kind": "clf", "weights": np.arange(1000.0)}, model_path, compress=3)
+    cache_dir = str(tmp_path / "cache")
+
+    artifacts = ModelRegistry(models_dir, mmap=True, cache_dir=cache_dir).artifacts()
+    assert isinstance(artifacts.clf["weights"], np.memmap)
+    assert artifacts.clf["weights"][-1] == 999.0
+    first_entries = sorted(os.listdir(cache_dir))
+    assert len(first_entries) == 2  # model + scaler
+
+    # A new model file gets a new cache entry and the stale one is pruned
+    joblib.dump({"kind": "clf", "weights": np.zeros(3)}, model_path)
+    st = os.stat(model_path)
+    os.utime(model_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    registry = ModelRegistry(models_dir, mmap=True, cache_dir=cache_dir)
+    assert list(registry.artifacts().clf["weights"]) == [0.0, 0.0, 0.0]
+    assert len(os.listdir(cache_dir)) == 2
+    assert sorted(os.listdir(cache_dir)) != first_entries
+
+
+def test_preload_loads_and_freezes(models_dir, monkeypatch):
+    import gc
+
+    frozen = []
+    monkeypatch.setattr(gc, "freeze", lambda: frozen.append(1))
+    registry = ModelRegistry(models_dir)
+    artifacts = registry.preload()
+    assert artifacts.ready
+    assert registry.artifacts() is artifacts
+    assert frozen == [1]
+
+
+def test_failed_load_not_retried_until_files_change(models_dir, monkeypatch):
+    registry = ModelRegistry(models_dir)
+    model_path = os.path.join(models_dir, "safecred_model.pkl")
+    with open(model_path, "wb") as f:
+        f.write(b"not a pickle")
+    loads = []
+    real_load = registry._load_artifacts
+    monkeypatch.setattr(registry, "_load_artifacts", lambda policy: loads.append(1) or real_load(policy))
+
+    for _ in range(3):
+        assert not registry.artifacts().ready
+    assert registry.refresh() is False
+    assert len(loads) == 1
+
+    joblib.dump({"kind": "clf"}, model_path)
+    st = os.stat(model_path)
+    os.utime(model_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert registry.refresh() is True
+    assert registry.artifacts().ready
+    assert len(loads) == 2
+
+
+def test_failed_reload_not_retried_on_every_refresh(models_dir, monkeypatch):
+    registry = ModelRegistry(models_dir)
+    before = registry.artifacts()
+    with open(os.path.join(models_dir, "safecred_model.pkl"), "wb") as f:
+        f.write(b"not a pickle")
+    loads = []
+    real_load = registry._load_artifacts
+    monkeypatch.setattr(registry, "_load_artifacts", lambda policy: loads.append(1) or real_load(policy))
+
+    assert registry.refresh() is False
+    assert registry.refresh() is False
+    assert len(loads) == 1
+    assert registry.artifacts() is before
+
+
+def test_refresh_if_due_is_rate_limited(models_dir, monkeypatch):
+    import ml.model_registry as model_registry
+
+    now = [1000.0]
+    monkeypatch.setattr(model_registry.time, "monotonic", lambda: now[0])
+    registry = ModelRegistry(models_dir, refresh_interval=30)
+    registry.artifacts()
+
+    _write_meta(models_dir, 14000, version="1.1.0")
+    assert registry.refresh_if_due() is True
+    _write_meta(models_dir, 13000, version="1.2.0")
+    now[0] += 10
+    assert registry.refresh_if_due() is False
+    assert registry.artifacts().version == "1.1.0"
+    now[0] += 21
+    assert registry.refresh_if_due() is True
+    assert registry.artifacts().version == "1.2.0"
+
+
+def test_failed_reload_keeps_previous_policy(models_dir):
+    registry = ModelRegistry(models_dir)
+    before = registry.artifacts()
+
+    _write_meta(models_dir, 14000, version="1.1.0", caps={"income_cap": 1.0})
+    with open(os.path.join(models_dir, "safecred_model.pkl"), "wb") as f:
+        f.write(b"not a pickle")
+    assert registry.refresh() is False
+
+    assert registry.artifacts() is before
+    assert registry.policy() is before.policy
+    assert registry.policy().dynamic_income_barrier == 12000.0
+    assert registry.policy().version == "1.0.0"
+
+
+def test_exported_engine_loaded_instead_of_compiling(models_dir, monkeypatch):
+    import ml.model_registry as model_registry
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(0, 1, (200, 2))
+    clf = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, (X[:, 0] > 0).astype(int))
+    joblib.dump(clf, os.path.join(models_dir, "safecred_model.pkl"))
+    model_registry.export_tree_ensemble(clf).save(os.path.join(models_dir, "safecred_model_compiled.npz"))
+
+    compiled = []
+    real_export = model_registry.export_tree_ensemble
+    monkeypatch.setattr(model_registry, "export_tree_ensemble", lambda m: compiled.append(m) or real_export(m))
+
+    predictor = ModelRegistry(models_dir).artifacts().predictor
+    assert predictor is not clf
+    assert compiled == []
+    np.testing.assert_allclose(predictor.predict_proba(X[:4]), clf.predict_proba(X[:4]), rtol=0, atol=1e-9)
+
+    # A model newer than the export is compiled on load instead
+    os.utime(os.path.join(models_dir, "safecred_model.pkl"), (1e10, 1e10))
+    assert ModelRegistry(models_dir).artifacts().predictor is not clf
+    assert len(compiled) == 1
@@ -0,0 +1,80 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from ml.nlp_utils import TransactionCategorizer, compile_categories
+
+
+def _legacy_categorize(description):
+    desc_lower = description.lower()
+    for category, patterns in TransactionCategorizer.CATEGORIES.items():
+        for pattern in patterns:
+            if re.search(pattern, desc_lower):
+                return category
+    return "OTHER"
+
+
+SAMPLES = [
+    "SALARY CREDIT ACME LTD",
+    "UPI/DR/SWIGGY/ORDER",
+    "swiggy salary advance",      # FOOD keyword first, INCOME category wins
+    "ACH bill DEBIT",             # ach.*debit spans a UTILITIES keyword; UTILITIES wins
+    "NEFT/OUT/RENT",
+    "NEFT transfer in",
+    "EMI BAJAJ FINANCE",
+    "NETFLIX.COM",
+    "premium",                    # 'emi' inside a word
+    "random merchant",
+    "first line\nnetflix",
+    "neft\nin",
+    "",
+]
+
+
+def test_first_category_precedence_matches_legacy_loop():
+    for description in SAMPLES:
+        assert TransactionCategorizer.categorize(description) == _legacy_categorize(description), description
+
+
+def test_matches_legacy_on_generated_descriptions():
+    rng = np.random.default_rng(0)
+    vocabulary = [p for patterns in TransactionCategorizer.CATEGORIES.values() for p in patterns if p.isalpha()]
+    vocabulary += ["neft", "imps", "upi", "ach", "in", "debit", "xyz", "pay", "\n"]
+    for _ in range(2000):
+        words = rng.choice(vocabulary, size=rng.integers(0, 5))
+        description = " ".join(str(w) for w in words).upper()
+        assert TransactionCategorizer.categorize(description) == _legacy_categorize(description), description
+
+
+def test_compile_categories_uses_dict_order():
+    matcher = compile_categories({"B": ["beta"], "A": ["alpha"]})
+    assert matcher.match("alpha beta").lastgroup == "B"
+    assert matcher.match("gamma") is None
+
+
+def test_categorize_is_cached():
+    TransactionCategorizer.categorize.cache_clear()
+    TransactionCategorizer.categorize("ZOMATO ORDER")
+    TransactionCategorizer.categorize("ZOMATO ORDER")
+    info = TransactionCategorizer.categorize.cache_info()
+    assert info.hits == 1 and info.misses == 1
+
+
+def test_categorize_series_preserves_index_and_handles_missing():
+    series = pd.Series(["UBER TRIP", None, "UBER TRIP", "MOVIE TICKETS"], index=[10, 11, 12, 13], name="description")
+    result = TransactionCategorizer.categorize_series(series)
+    assert list(result.index) == [10, 11, 12, 13]
+    assert result.name == "description"
+    assert result.tolist() == ["TRANSPORT", "OTHER", "TRANSPORT", "ENTERTAINMENT"]
+
+
+def test_analyze_statements_breakdown():
+    summary = TransactionCategorizer.analyze_statements([
+        {"description": "SWIGGY", "debit": 300},
+        {"description": "ELECTRICITY BILL", "debit": 700},
+        {"description": "SALARY", "credit": 20000},
+    ])
+    assert summary["total_debits"] == 1000
+    assert summary["breakdown_amount"]["FOOD"] == 300
+    assert summary["breakdown_percentage"]["UTILITIES"] == 0.7
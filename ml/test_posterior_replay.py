@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from ml.bayesian_updater import BayesianIncomeUpdater, DemographicPrior, DemographicRegistry
+from ml.posterior_replay import load_histories, replay, replay_collection, write_posteriors
+
+
+class ReplayCollection:
+    def __init__(self, docs):
+        self.store = {d["beneficiary_id"]: d for d in docs}
+        self.bulk_calls = 0
+
+    def find(self, query, projection=None):
+        return iter(list(self.store.values()))
+
+    def bulk_write(self, operations, ordered=True):
+        self.bulk_calls += 1
+        for op in operations:
+            doc = self.store.setdefault(op._filter["beneficiary_id"], dict(op._filter))
+            doc.update(op._doc["$set"])
+        return MagicMock()
+
+
+@pytest.fixture
+def registry():
+    return DemographicRegistry(
+        district_priors={"Aligarh": DemographicPrior([0.32, 0.28, 0.20, 0.14, 0.06])},
+        state_priors={"UP": DemographicPrior([0.2, 0.2, 0.2, 0.2, 0.2])},
+    )
+
+
+def _sequential(updater, history, district, state):
+    alphas = np.array(updater._get_initial_alphas(district, state), dtype=float)
+    posteriors = []
+    for entry in history:
+        alphas = alphas + updater._calculate_likelihood(entry["signal_type"], entry["signal_value"])
+        posteriors.append(alphas.tolist())
+    return alphas, posteriors
+
+
+def _documents(n, seed=0):
+    rng = np.random.default_rng(seed)
+    values = {"ELECTRICITY": ["LOW", "MEDIUM", "HIGH"], "MOBILE_RECHARGE": ["LOW", "HIGH", "OTHER"],
+              "LOAN_REPAYMENT": ["ON_TIME", "DEFAULT"], "GOVT_SURVEY": [2, "4"]}
+    docs = []
+    for b in range(n):
+        history = []
+        for _ in range(rng.integers(0, 60)):
+            signal_type = str(rng.choice(list(values)))
+            value = values[signal_type][rng.integers(0, len(values[signal_type]))]
+            history.append({"timestamp": "2024-01-01T00:00:00", "signal_type": signal_type,
+                            "signal_value": value, "posterior_alphas": [0.0] * 5})
+        docs.append({"beneficiary_id": f"B{b}", "district": [None, "Aligarh", "Agra"][b % 3],
+                     "state": None if b % 2 else "UP", "alphas": [0.0] * 5, "signal_history": history})
+    return docs
+
+
+def test_replay_matches_sequential_updates(registry):
+    updater = BayesianIncomeUpdater(None, registry, concentration_factor=10)
+    updater.electricity_mapping["HIGH"] = [0.0, 0.0, 0.0, 0.5, 1.0]  # the mapping change being replayed
+    docs = _documents(200)
+    histories = load_histories(docs)
+    result = replay(updater, histories, include_truncated=True)
+
+    for i, doc in enumerate(docs):
+        alphas, posteriors = _sequential(updater, doc["signal_history"], doc["district"], doc["state"])
+        np.testing.assert_allclose(result.alphas[i], alphas)
+        segment = result.history_posteriors[histories.offsets[i]:histories.offsets[i + 1]]
+        np.testing.assert_allclose(segment, np.array(posteriors).reshape(-1, 5))
+
+
+def test_replay_collection_skips_truncated_and_rewrites(registry):
+    docs = _documents(100, seed=1)
+    collection = ReplayCollection(docs)
+    updater = BayesianIncomeUpdater(collection, registry, concentration_factor=10)
+    truncated = sum(len(d["signal_history"]) >= 50 for d in docs)
+    expected = {d["beneficiary_id"]: _sequential(updater, d["signal_history"], d["district"], d["state"])[0]
+                for d in docs if len(d["signal_history"]) < 50}
+
+    report = replay_collection(updater)
+
+    assert report.beneficiaries == 100
+    assert report.skipped_truncated == truncated
+    assert report.written == 100 - truncated
+    assert report.beneficiaries_per_second > 0
+    assert collection.bulk_calls == 1
+    for bid, alphas in expected.items():
+        np.testing.assert_allclose(collection.store[bid]["alphas"], alphas)
+        history = collection.store[bid]["signal_history"]
+        if history:
+            np.testing.assert_allclose(history[-1]["posterior_alphas"], alphas)
+
+
+def test_replay_empty():
+    updater = BayesianIncomeUpdater(None, DemographicRegistry())
+    result = replay(updater, load_histories([]))
+    assert result.alphas.shape == (0, 5)
+    assert write_posteriors(ReplayCollection([]), load_histories([]), result) == 0
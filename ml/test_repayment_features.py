@@ -1,7 +1,14 @@
 import pytest
 from datetime import datetime, timedelta
 import numpy as np
-from ml.repayment_features import RepaymentFeatureExtractor
+import pandas as pd
+from ml.repayment_features import FEATURE_NAMES, RepaymentFeatureExtractor, RepaymentFeatureState
+
+# Closed-form sums in compute_features_batch; see the repayment_features docstring
+CLOSED_FORM_FEATURES = {
+    'avg_days_past_due', 'avg_loan_size_growth', 'avg_loan_tenure_months',
+    'payment_consistency_score', 'delinquency_trend',
+}
 
 @pytest.fixture
 def extractor():
@@ -165,3 +172,127 @@ def test_on_time_late_ratios(extractor):
     feats = extractor.compute_features([], reps)
     assert feats['on_time_payment_ratio'] == 0.5
     assert feats['late_payment_ratio'] == 0.5
+
+# --- Batch (columnar) engine ---
+
+def _random_histories(n_beneficiaries, seed=0):
+    rng = np.random.default_rng(seed)
+    base = datetime(2022, 1, 1)
+    loans, reps = [], []
+    for b in range(n_beneficiaries):
+        for _ in range(rng.integers(0, 4)):
+            loan = {"beneficiary_id": b, "approved_amount": float(rng.integers(1, 50) * 1000),
+                    "disbursed_amount": float(rng.integers(0, 50) * 1000)}
+            if rng.random() < 0.8:
+                loan["status"] = str(rng.choice(["ACTIVE", "closed", "Repaid"]))
+            if rng.random() < 0.7:
+                loan["purpose"] = str(rng.choice(["agri", "dairy", "retail"]))
+            if rng.random() < 0.7:
+                loan["channel_partner"] = str(rng.choice(["NBCFDC", "SHG", "MFI"]))
+            if rng.random() < 0.8:
+                loan["tenure_months"] = float(rng.choice([0, 6, 12, 24]))
+            if rng.random() < 0.6:
+                closed = base + timedelta(days=int(rng.integers(0, 600)))
+                loan["closed_date"] = closed.strftime("%Y-%m-%d")
+                loan["maturity_date"] = (closed + timedelta(days=int(rng.integers(0, 200)))).isoformat()
+            loans.append(loan)
+        for _ in range(rng.integers(0, 12)):
+            rep = {"beneficiary_id": b, "amount_due": 1000.0,
+                   "amount_paid": float(rng.choice([0, 400, 1000]))}
+            kind = rng.random()
+            if kind < 0.1:
+                rep["dpd"] = float(rng.integers(0, 120))
+            else:
+                due = base + timedelta(days=int(rng.integers(0, 700)))
+                rep["due_date"] = due.strftime("%Y-%m-%d") if rng.random() < 0.7 else due
+                if kind < 0.8:
+                    rep["paid_date"] = (due + timedelta(days=int(rng.integers(-10, 120)))).strftime("%Y-%m-%d %H:%M")
+            reps.append(rep)
+    return loans, reps
+
+
+def test_batch_matches_per_beneficiary(extractor):
+    loans, reps = _random_histories(300)
+    batch = extractor.compute_features_batch(pd.DataFrame(loans), pd.DataFrame(reps),
+                                             beneficiary_ids=range(300))
+    assert list(batch.columns) == FEATURE_NAMES
+    for b in range(300):
+        strip = lambda rows: [{k: v for k, v in r.items() if k != "beneficiary_id"}
+                              for r in rows if r["beneficiary_id"] == b]
+        expected = extractor.compute_features(strip(loans), strip(reps))
+        row = batch.loc[b]
+        for name in FEATURE_NAMES:
+            if name in CLOSED_FORM_FEATURES:
+                assert row[name] == pytest.approx(expected[name], rel=1e-12, abs=1e-12), (b, name)
+            else:
+                assert row[name] == expected[name], (b, name)
+
+
+def test_batch_missing_due_date_raises(extractor):
+    reps = pd.DataFrame([{"beneficiary_id": "B1", "amount_due": 100}])
+    with pytest.raises(ValueError, match="Repayment record must contain due_date"):
+        extractor.compute_features_batch(None, reps)
+
+
+def test_batch_unknown_beneficiary_is_empty(extractor):
+    reps = pd.DataFrame([{"beneficiary_id": "B1", "due_date": "2023-11-01"}])
+    batch = extractor.compute_features_batch(None, reps, beneficiary_ids=["B1", "B2"])
+    assert batch.loc["B1", "max_days_past_due"] == 30.0
+    assert (batch.loc["B2"] == 0).all()
+
+# --- Incremental state ---
+
+def _strip(rows, b):
+    return [{k: v for k, v in r.items() if k != "beneficiary_id"} for r in rows if r["beneficiary_id"] == b]
+
+
+def _assert_features_equal(actual, expected, context=None):
+    assert set(actual) == set(expected)
+    for name, value in expected.items():
+        assert actual[name] == pytest.approx(value, rel=1e-9, abs=1e-9), (context, name)
+
+
+def test_state_from_history_matches_compute_features(extractor):
+    loans, reps = _random_histories(200, seed=3)
+    for b in range(200):
+        state = RepaymentFeatureState.from_history(_strip(loans, b), _strip(reps, b))
+        expected = extractor.compute_features(_strip(loans, b), _strip(reps, b))
+        _assert_features_equal(state.features(extractor.reference_date), expected, b)
+        restored = RepaymentFeatureState.from_bytes(state.to_bytes())
+        _assert_features_equal(restored.features(extractor.reference_date), expected, b)
+
+
+def test_state_event_stream(extractor):
+    state = RepaymentFeatureState()
+    state.add_loan({"approved_amount": 10000, "disbursed_amount": 9000, "status": "ACTIVE", "purpose": "dairy"})
+    history = []
+    # EMIs fall due unpaid, then get paid (the second one before the first)
+    for month in (1, 2, 3):
+        state.add_repayment({"due_date": f"2023-0{month}-05", "amount_due": 1000})
+        history.append({"due_date": f"2023-0{month}-05", "amount_due": 1000})
+    for month, paid in ((2, "2023-02-03"), (1, "2023-03-20"), (3, "2023-03-05")):
+        state.record_payment(f"2023-0{month}-05", paid, amount_paid=1000)
+        history[month - 1].update(paid_date=paid, amount_paid=1000)
+        state = RepaymentFeatureState.from_bytes(state.to_bytes())
+        expected = extractor.compute_features(
+            [{"approved_amount": 10000, "disbursed_amount": 9000, "status": "ACTIVE", "purpose": "dairy"}], history
+        )
+        _assert_features_equal(state.features(extractor.reference_date), expected, month)
+    assert not state.pending
+    assert len(state.to_bytes()) < 300
+
+    previous = {"approved_amount": 10000, "disbursed_amount": 9000, "status": "ACTIVE", "purpose": "dairy"}
+    current = dict(previous, status="CLOSED", closed_date="2023-03-01", maturity_date="2024-03-01")
+    state.update_loan(previous, current)
+    feats = state.features(extractor.reference_date)
+    assert feats['tenure_completion_rate'] == 1.0
+    assert feats['early_repayment_flag'] == 1.0
+
+
+def test_state_rejects_out_of_order(extractor):
+    state = RepaymentFeatureState()
+    state.add_repayment({"due_date": "2023-02-01", "paid_date": "2023-02-01"})
+    with pytest.raises(ValueError, match="due_date order"):
+        state.add_repayment({"due_date": "2023-01-01", "paid_date": "2023-01-01"})
+    with pytest.raises(ValueError, match="No pending installment"):
+        state.record_payment("2023-02-01", "2023-02-02")
@@ -0,0 +1,70 @@
+import os
+import time
+
+import pytest
+
+from ml.request_profiler import SamplingProfiler, fold_stack
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def _profiled(profiler, seconds, name="req"):
+    token = profiler.begin()
+    started = time.perf_counter()
+    _busy(seconds)
+    return profiler.finish(token, time.perf_counter() - started, name)
+
+
+def test_off_mode_never_samples(tmp_path):
+    profiler = SamplingProfiler(mode="off", directory=str(tmp_path))
+    assert profiler.begin() is None
+    assert profiler.finish(None, 1.0) is None
+    assert not os.listdir(tmp_path)
+
+
+def test_every_mode_profiles_one_request_in_n(tmp_path):
+    profiler = SamplingProfiler(mode="every", every_n=3, interval_ms=1, directory=str(tmp_path))
+    tokens = [profiler.begin() for _ in range(6)]
+    assert [t is not None for t in tokens] == [False, False, True, False, False, True]
+    for token in tokens:
+        profiler.finish(token, 0.0)
+
+
+def test_profile_is_folded_stacks_of_the_request_thread(tmp_path):
+    profiler = SamplingProfiler(mode="every", every_n=1, interval_ms=1, directory=str(tmp_path))
+    path = _profiled(profiler, 0.1, name="score")
+    assert path is not None and path.endswith(".folded")
+    assert "_score_" in os.path.basename(path)
+    with open(path) as fh:
+        lines = fh.read().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) >= 1
+    assert any("_busy (test_request_profiler.py" in line for line in lines)
+
+
+def test_slowest_mode_keeps_only_the_slowest(tmp_path):
+    profiler = SamplingProfiler(mode="slowest", keep=2, interval_ms=1, directory=str(tmp_path))
+    paths = [_profiled(profiler, seconds, name=f"r{i}") for i, seconds in enumerate((0.03, 0.08, 0.05, 0.01))]
+    assert paths[3] is None  # faster than both kept profiles
+    kept = sorted(os.listdir(tmp_path))
+    assert len(kept) == 2
+    assert {name.split("_")[1] for name in kept} == {"r1", "r2"}
+
+
+def test_fold_stack_is_root_first():
+    import sys
+
+    folded = fold_stack(sys._getframe())
+    assert folded.split(";")[-1].startswith("test_fold_stack_is_root_first")
+
+
+def test_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        SamplingProfiler(mode="always")
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+# Same module path as application_api, so the metrics are registered once
+sys.path.insert(0, os.path.dirname(__file__))
+
+import result_cache as result_cache_module
+from result_cache import IdempotencyConflict, ResultCache, cache_key, payload_fingerprint
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class _FakeRedis:
+    def __init__(self, fail=False):
+        self.store = {}
+        self.fail = fail
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.store[key] = value
+
+    async def close(self):
+        pass
+
+
+def _counting_compute(value):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return value
+
+    return compute, calls
+
+
+def test_fingerprint_ignores_contact_fields_and_key_order():
+    a = payload_fingerprint({"loan_amount": 3000, "name": "A", "mobile": "1", "email": "a@x"})
+    b = payload_fingerprint({"name": "A", "loan_amount": 3000, "mobile": "2"})
+    c = payload_fingerprint({"name": "A", "loan_amount": 3001})
+    assert a == b
+    assert a != c
+
+
+def test_cache_key_uses_model_version_or_idempotency_key():
+    assert cache_key("f", "v1") != cache_key("f", "v2")
+    assert cache_key("f", "v1", "k") == cache_key("g", "v2", "k")
+
+
+def test_second_lookup_is_a_hit_and_returns_same_result():
+    cache = ResultCache(max_entries=10, ttl=60)
+    compute, calls = _counting_compute({"status": "approved"})
+    first = _run(cache.get_or_compute("k", "f", compute))
+    second = _run(cache.get_or_compute("k", "f", compute))
+    assert first == ({"status": "approved"}, False)
+    assert second == ({"status": "approved"}, True)
+    assert len(calls) == 1
+    assert cache.stats()["memory_hit"] == 1 and cache.stats()["miss"] == 1
+
+
+def test_lru_eviction_and_ttl_expiry(monkeypatch):
+    cache = ResultCache(max_entries=2, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(result_cache_module.time, "monotonic", lambda: now[0])
+    for key in ("a", "b"):
+        _run(cache.set(key, "f", key))
+    assert _run(cache.get("a", "f")) == "a"  # a is now most recent
+    _run(cache.set("c", "f", "c"))
+    assert _run(cache.get("b", "f")) is None
+    now[0] += 11
+    assert _run(cache.get("a", "f")) is None
+    assert _run(cache.get("c", "f")) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_idempotency_key_reuse_with_other_payload_conflicts():
+    cache = ResultCache(max_entries=10, ttl=60)
+    _run(cache.set("idem:x", "payload-1", {"ok": True}))
+    with pytest.raises(IdempotencyConflict):
+        _run(cache.get("idem:x", "payload-2"))
+
+
+def test_concurrent_duplicates_are_coalesced():
+    cache = ResultCache(max_entries=10, ttl=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"status": "approved"}
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("k", "f", compute) for _ in range(5)))
+
+    results = _run(main())
+    assert len(calls) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True, True]
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_failures_are_not_cached():
+    cache = ResultCache(max_entries=10, ttl=60)
+
+    async def boom():
+        raise RuntimeError("scoring failed")
+
+    with pytest.raises(RuntimeError):
+        _run(cache.get_or_compute("k", "f", boom))
+    compute, calls = _counting_compute(1)
+    assert _run(cache.get_or_compute("k", "f", compute)) == (1, False)
+
+
+def test_disabled_cache_always_computes():
+    cache = ResultCache(max_entries=0)
+    compute, calls = _counting_compute(1)
+    _run(cache.get_or_compute("k", "f", compute))
+    _run(cache.get_or_compute("k", "f", compute))
+    assert len(calls) == 2
+
+
+def test_redis_tier_is_shared_between_processes():
+    writer = ResultCache(max_entries=10, ttl=60, redis_url="redis://fake")
+    reader = ResultCache(max_entries=10, ttl=60, redis_url="redis://fake")
+    shared = _FakeRedis()
+    writer._redis = reader._redis = shared
+
+    _run(writer.set("k", "f", {"prob": 0.5}))
+    assert json.loads(shared.store["ml:result:k"])["value"] == {"prob": 0.5}
+    assert _run(reader.get("k", "f")) == {"prob": 0.5}
+    assert reader.stats()["redis_hit"] == 1
+    assert _run(reader.get("k", "f")) == {"prob": 0.5}
+    assert reader.stats()["memory_hit"] == 1
+
+
+def test_redis_errors_degrade_to_memory_only():
+    cache = ResultCache(max_entries=10, ttl=60, redis_url="redis://fake")
+    cache._redis = _FakeRedis(fail=True)
+    compute, calls = _counting_compute("v")
+    assert _run(cache.get_or_compute("k", "f", compute)) == ("v", False)
+    assert _run(cache.get_or_compute("k", "f", compute)) == ("v", True)
+    assert len(calls) == 1
+
+
+def test_corrupt_redis_value_is_a_miss():
+    cache = ResultCache(max_entries=10, ttl=60, redis_url="redis://fake")
+    cache._redis = _FakeRedis()
+    for raw in (b'{"fingerprint": "f"', b'{"other": 1}', b"[1, 2]"):
+        cache._redis.store["ml:result:k"] = raw
+        cache._entries.clear()
+        assert _run(cache.get("k", "f")) is None
+    compute, calls = _counting_compute("v")
+    assert _run(cache.get_or_compute("k", "f", compute)) == ("v", False)
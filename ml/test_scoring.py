@@ -7,8 +7,11 @@ consent aliasing, bank-data detection, and composite score flow.
 
 import unittest
 
+import pandas as pd
+
 from scoring import (
     compute_composite_score,
+    compute_composite_scores_batch,
     combine_ml_and_composite,
     map_sci_to_riskband,
     compute_subscores,
@@ -215,5 +218,56 @@ class TestHasRealBankDataFlag(unittest.TestCase):
         self.assertFalse(features["_has_real_bank_data"])
 
 
+class TestBatchMatchesScalar(unittest.TestCase):
+    """9. compute_composite_scores_batch reproduces the scalar path row by row."""
+
+    def setUp(self):
+        self.df = pd.DataFrame([
+            # No bank data, asking for a large loan
+            {"declared_income": 5000, "_has_real_bank_data": False, "previous_loans_count": 0,
+             "loan_amount": 4000, "consent_recharge": 1, "consent_bank": 0,
+             "avg_prev_repayment_ratio": None},
+            # Low income with bank data and full consent
+            {"declared_income": 9000, "_has_real_bank_data": True, "previous_loans_count": 1,
+             "bank_monthly_credits": 9000, "bank_avg_balance": 1500, "loan_amount": 2000,
+             "consent_recharge": 1, "consent_bank": 1, "on_time_ratio": 0.8,
+             "avg_prev_repayment_ratio": 0.7},
+            # High income, no history → manual review
+            {"declared_income": 30000, "_has_real_bank_data": True, "previous_loans_count": 0,
+             "bank_monthly_credits": 30000, "bank_avg_balance": 15000, "loan_amount": 28000,
+             "consent_recharge": 0, "consent_bank": 1, "avg_prev_repayment_ratio": float("nan")},
+            # Proven high-income borrower
+            {"declared_income": 25000, "_has_real_bank_data": True, "previous_loans_count": 5,
+             "bank_monthly_credits": 25000, "bank_avg_balance": 12000, "loan_amount": 15000,
+             "consent_recharge": 1, "consent_bank": 1, "on_time_ratio": 0.97,
+             "avg_prev_repayment_ratio": 0.95, "has_children": 1, "lifestyle_index": 0.9},
+        ])
+
+    def test_scores_identical(self):
+        batch = compute_composite_scores_batch(self.df)
+        for i, (_, row) in enumerate(self.df.iterrows()):
+            score, breakdown = compute_composite_score(row.to_dict())
+            self.assertEqual(score, batch["composite_score"].iloc[i])
+            self.assertEqual(breakdown["composite_score_01"], batch["composite_score_01"].iloc[i])
+            self.assertEqual(breakdown["user_segment"], batch["user_segment"].iloc[i])
+            self.assertEqual(breakdown["fraud_risk_penalty"], batch["fraud_risk_penalty"].iloc[i])
+            self.assertEqual(breakdown["fair_lending_bonus"], batch["fair_lending_bonus"].iloc[i])
+            self.assertEqual(breakdown["loan_to_income_ratio"], batch["loan_to_income_ratio"].iloc[i])
+
+    def test_all_segments_covered(self):
+        batch = compute_composite_scores_batch(self.df)
+        self.assertEqual(list(batch["user_segment"]), [
+            "new_user_no_bank_data",
+            "low_income_alternative_proxies",
+            "high_income_no_history_manual_review",
+            "high_income_repayment_only",
+        ])
+
+    def test_index_preserved(self):
+        df = self.df.set_index(pd.Index(["a", "b", "c", "d"]))
+        batch = compute_composite_scores_batch(df)
+        self.assertEqual(list(batch.index), ["a", "b", "c", "d"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,71 @@
+import os
+import pickle
+import sys
+
+from prometheus_client import REGISTRY
+
+# Same module path as application_api, so the histogram is registered once
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stage_timer import StageTimer, current_timer, label, stage
+
+
+def _sample_count(stage_name, model_version, segment):
+    value = REGISTRY.get_sample_value(
+        "ml_api_stage_duration_seconds_count",
+        {"stage": stage_name, "model_version": model_version, "segment": segment},
+    )
+    return value or 0.0
+
+
+def test_stage_is_noop_without_active_timer():
+    assert current_timer() is None
+    with stage("features"):
+        pass
+    label(model_version="x")
+    assert current_timer() is None
+
+
+def test_active_timer_accumulates_stages_in_order():
+    timer = StageTimer()
+    with timer.activate():
+        assert current_timer() is timer
+        with stage("features"):
+            pass
+        with stage("predict"):
+            pass
+        with stage("features"):
+            pass
+    assert current_timer() is None
+    assert list(timer.stages) == ["features", "predict"]
+    assert timer.elapsed >= sum(timer.stages.values())
+
+
+def test_stage_time_is_recorded_when_block_raises():
+    timer = StageTimer()
+    try:
+        with timer.activate(), stage("validate"):
+            raise ValueError("bad payload")
+    except ValueError:
+        pass
+    assert "validate" in timer.stages
+
+
+def test_server_timing_header_and_pickle_round_trip():
+    timer = StageTimer()
+    timer.stages = {"features": 0.0015, "predict": 0.0004}
+    restored = pickle.loads(pickle.dumps(timer))
+    assert restored.server_timing(0.0031) == "features;dur=1.50, predict;dur=0.40, total;dur=3.10"
+
+
+def test_observe_labels_histogram_by_version_and_segment():
+    timer = StageTimer()
+    with timer.activate():
+        label(model_version="test-v1", segment="new_user_no_bank_data", unused=None)
+        with stage("predict"):
+            pass
+    before = _sample_count("predict", "test-v1", "new_user_no_bank_data")
+    timer.observe(total=0.01)
+    assert _sample_count("predict", "test-v1", "new_user_no_bank_data") == before + 1
+    assert _sample_count("total", "test-v1", "new_user_no_bank_data") >= 1
+
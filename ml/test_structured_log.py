@@ -0,0 +1,69 @@
+import json
+import os
+
+from ml.structured_log import StructuredLogger
+
+
+def _read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_written_as_json_lines(tmp_path):
+    path = str(tmp_path / "api.log")
+    log = StructuredLogger(path=path, echo=False)
+    log.info("application_received", application_id="APP-1")
+    log.error("application_failed", application_id="APP-1", error="boom")
+    log.close()
+
+    records = _read_lines(path)
+    assert [r["event"] for r in records] == ["application_received", "application_failed"]
+    assert records[1]["level"] == "error"
+    assert records[1]["error"] == "boom"
+    assert "ts" in records[0]
+
+
+def test_debug_records_filtered_by_level(tmp_path):
+    path = str(tmp_path / "api.log")
+    log = StructuredLogger(path=path, echo=False, level="info")
+    log.debug("application_payload", payload={"age": 30})
+    log.info("scored")
+    log.close()
+
+    assert [r["event"] for r in _read_lines(path)] == ["scored"]
+
+
+def test_full_queue_drops_and_reports(tmp_path):
+    path = str(tmp_path / "api.log")
+    log = StructuredLogger(path=path, echo=False, queue_size=1)
+    # Hold the writer back so the queue fills
+    with log._lock:
+        log._pid = os.getpid()
+        log._thread = object()
+    for i in range(5):
+        log.info("event", i=i)
+    assert log.stats()["dropped"] == 4
+
+    log._thread = None
+    log._ensure_started()
+    log.close()
+
+    records = _read_lines(path)
+    assert records[0]["event"] == "event"
+    dropped = [r for r in records if r["event"] == "log_records_dropped"]
+    assert dropped and dropped[-1]["dropped_total"] == 4
+
+
+def test_rotation_by_size(tmp_path):
+    path = str(tmp_path / "api.log")
+    log = StructuredLogger(path=path, echo=False, max_bytes=200, backup_count=2, batch_size=1)
+    for i in range(20):
+        log.info("event", i=i, padding="x" * 40)
+    log.close()
+
+    assert os.path.exists(path + ".1")
+    assert os.path.exists(path + ".2")
+    assert not os.path.exists(path + ".3")
+    assert os.path.getsize(path) <= 200
+    for name in (path, path + ".1", path + ".2"):
+        _read_lines(name)  # every file stays parseable
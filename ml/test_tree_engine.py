@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+
+from ml.tree_engine import (
+    CompiledTreeEnsemble,
+    RoutedTreeModel,
+    UnsupportedModelError,
+    compile_for_serving,
+    export_tree_ensemble,
+)
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(3)
+    X = rng.normal(0, 1, (400, 5))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(0, 0.5, 400) > 0).astype(int)
+    X[rng.random(X.shape) < 0.05] = np.nan
+    X_test = rng.normal(0, 1.3, (300, 5))
+    X_test[rng.random(X_test.shape) < 0.05] = np.nan
+    return X, y, X_test
+
+
+def _models():
+    return [
+        RandomForestClassifier(n_estimators=25, random_state=0, class_weight="balanced_subsample"),
+        HistGradientBoostingClassifier(max_iter=30, random_state=0),
+    ]
+
+
+@pytest.mark.parametrize("method", [None, "isotonic", "sigmoid"])
+@pytest.mark.parametrize("model_idx", [0, 1])
+def test_matches_sklearn(data, method, model_idx):
+    X, y, X_test = data
+    model = _models()[model_idx]
+    if method is not None:
+        model = CalibratedClassifierCV(model, method=method, cv=3)
+    model.fit(X, y)
+
+    engine = export_tree_ensemble(model)
+    np.testing.assert_allclose(engine.predict_proba(X_test), model.predict_proba(X_test), rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(engine.predict(X_test), model.predict(X_test))
+    # Single-row path (the API hot path)
+    np.testing.assert_allclose(engine.predict_proba(X_test[:1]), model.predict_proba(X_test[:1]), rtol=0, atol=1e-9)
+
+
+def test_save_and_load_roundtrip(data, tmp_path):
+    X, y, X_test = data
+    model = CalibratedClassifierCV(HistGradientBoostingClassifier(max_iter=20, random_state=0), cv=3).fit(X, y)
+    path = str(tmp_path / "compiled.npz")
+    export_tree_ensemble(model).save(path)
+
+    loaded = CompiledTreeEnsemble.load(path)
+    np.testing.assert_allclose(loaded.predict_proba(X_test), model.predict_proba(X_test), rtol=0, atol=1e-9)
+
+
+def test_unsupported_model_raises(data):
+    X, y, _ = data
+    model = LogisticRegression().fit(np.nan_to_num(X), y)
+    with pytest.raises(UnsupportedModelError):
+        export_tree_ensemble(model)
+    assert compile_for_serving(model) is model
+
+
+def test_routed_model_uses_engine_for_small_batches(data):
+    X, y, X_test = data
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    routed = compile_for_serving(model, max_batch=8)
+    assert isinstance(routed, RoutedTreeModel)
+
+    calls = []
+    routed.engine.predict_proba = lambda rows: calls.append(len(rows)) or model.predict_proba(rows)
+    routed.predict_proba(X_test[:8])
+    routed.predict_proba(X_test[:9])
+    assert calls == [8]
+
+
+def test_wrong_feature_count_rejected(data):
+    X, y, _ = data
+    engine = export_tree_ensemble(RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y))
+    with pytest.raises(ValueError):
+        engine.predict_proba(np.zeros((2, 4)))
@@ -25,9 +25,10 @@ from sklearn.metrics import classification_report, roc_auc_score
 from sklearn.preprocessing import StandardScaler
 from calibration import evaluate_calibration, calibrate_model
 from fairness import compute_fairness_metrics
+from tree_engine import export_to_file
 
 from features import build_feature_matrix
-from scoring import compute_composite_score, aggregate_loan_history_metrics
+from scoring import compute_composite_scores_batch, aggregate_loan_history_metrics
 
 ROOT = os.path.dirname(__file__)
 DATA_DIR = os.path.join(ROOT, "data")
@@ -120,19 +121,11 @@ def train_and_save():
 
     # --- Step 4: Compute composite score (behavioral) ---
     print("🧮 Computing composite scores ...")
-    composite_scores = []
-    is_new_flags, has_bank_flags = [], []
+    scored = compute_composite_scores_batch(df)
 
-    for _, row in df.iterrows():
-        feats = row.to_dict()
-        comp, breakdown = compute_composite_score(feats)
-        composite_scores.append(comp)
-        is_new_flags.append(breakdown.get("is_new_user", False))
-        has_bank_flags.append(breakdown.get("has_bank_data", True))
-
-    df["composite_score"] = composite_scores
-    df["is_new_user"] = is_new_flags
-    df["has_bank_data"] = has_bank_flags
+    df["composite_score"] = scored["composite_score"]
+    df["is_new_user"] = scored["is_new_user"]
+    df["has_bank_data"] = scored["has_bank_data"]
 
     if "suspicion_score" in df.columns:
         df["suspicion_score"] = df["suspicion_score"].fillna(0)
@@ -286,6 +279,7 @@ def train_and_save():
     joblib.dump(clf, model_path)
     joblib.dump(scaler, scaler_path)
     joblib.dump(feature_names, feature_path)
+    compiled_path = export_to_file(clf, MODELS_DIR)
 
     meta = {
         "version": "2.2.0",
@@ -336,6 +330,8 @@ def train_and_save():
     print(f"   • safecred_model.pkl")
     print(f"   • scaler.pkl")
     print(f"   • feature_order.pkl ({len(feature_names)} features)")
+    if compiled_path:
+        print(f"   • {os.path.basename(compiled_path)} (NumPy tree engine)")
     print(f"   • model_metadata.json (includes data-driven barrier ₹{dynamic_barrier})")
 
     # --- Step 10: Sample verification ---
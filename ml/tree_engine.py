@@ -0,0 +1,440 @@
+"""
+tree_engine.py
+
+Pure-NumPy compiled inference for the tree models train_v2.py can ship.
+
+train_v2.py picks the best of RandomForest / HistGradientBoosting /
+LogisticRegression and wraps it in CalibratedClassifierCV. For the tree
+models, sklearn's predict_proba walks each estimator through Python-level
+dispatch (and a thread pool for forests), which dominates single-row
+latency. export_tree_ensemble() flattens every tree of every calibrated
+fold into contiguous node arrays:
+
+    feature, threshold, left, right, missing_go_left, value
+
+so a batch is evaluated by stepping every (sample, tree) pair one level per
+iteration with fancy indexing, dropping pairs once they reach a leaf. Isotonic
+calibrators become (x, y) interpolation tables evaluated with np.interp;
+sigmoid calibrators keep their (a, b).
+
+Supported: RandomForestClassifier, ExtraTreesClassifier,
+DecisionTreeClassifier, HistGradientBoostingClassifier (numeric features),
+binary targets, either bare or inside CalibratedClassifierCV with isotonic
+or sigmoid calibration. Anything else raises UnsupportedModelError so the
+caller can keep using the sklearn model.
+
+The NumPy engine wins on small batches, where sklearn's per-estimator
+overhead dominates (about 13x at one row for the bundled model). Large
+batches are faster through sklearn's Cython/OpenMP code, so
+compile_for_serving() routes by batch size.
+
+Results agree with sklearn to ~1e-15 (the 1e-9 tolerance is checked in
+test_tree_engine.py); the only differences come from summation order and
+np.interp vs scipy's interp1d.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+COMPILED_MODEL_FILE = "safecred_model_compiled.npz"
+
+# (sample, tree) pairs traversed per chunk
+CHUNK_SLOTS = 1 << 16
+
+# Above this many rows sklearn's compiled, multi-threaded predict is faster
+# (see scripts/benchmark_tree_engine.py)
+COMPILED_MAX_BATCH = int(os.getenv("ML_COMPILED_MAX_BATCH", "64"))
+
+# Group (one base estimator) kinds
+_FOREST = 0
+_BOOSTING = 1
+
+# Calibrator kinds
+_CAL_NONE = 0
+_CAL_ISOTONIC = 1
+_CAL_SIGMOID = 2
+
+# Isotonic out-of-bounds handling
+_OOB_CLIP = 0
+_OOB_NAN = 1
+
+_ARRAY_FIELDS = (
+    "classes",
+    "feature", "threshold", "left", "right", "missing_left", "value",
+    "tree_root", "group_kind", "group_tree_start", "group_tree_end",
+    "group_baseline", "group_float32", "group_cal_kind", "group_cal_start",
+    "group_cal_end", "group_cal_oob", "group_sigmoid",
+    "cal_x", "cal_y", "meta",
+)
+
+
+class UnsupportedModelError(ValueError):
+    """Model cannot be compiled; keep serving it through sklearn."""
+
+
+def _expit(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class _Builder:
+    def __init__(self, n_features: int):
+        self.n_features = n_features
+        self.nodes: Dict[str, List[np.ndarray]] = {
+            k: [] for k in ("feature", "threshold", "left", "right", "missing_left", "value")
+        }
+        self.n_nodes = 0
+        self.tree_root: List[int] = []
+        self.groups: List[Dict[str, Any]] = []
+        self.cal_x: List[np.ndarray] = []
+        self.cal_y: List[np.ndarray] = []
+        self.n_cal = 0
+
+    def _add_tree(self, feature, threshold, left, right, missing_left, value, is_leaf, feature_offset):
+        n = len(feature)
+        own = np.arange(n, dtype=np.int64)
+        base = self.n_nodes
+        self.nodes["feature"].append(np.where(is_leaf, 0, feature + feature_offset).astype(np.int64))
+        self.nodes["threshold"].append(np.where(is_leaf, np.inf, threshold).astype(np.float64))
+        self.nodes["left"].append((np.where(is_leaf, own, left) + base).astype(np.int64))
+        self.nodes["right"].append((np.where(is_leaf, own, right) + base).astype(np.int64))
+        self.nodes["missing_left"].append(np.asarray(missing_left, dtype=bool))
+        self.nodes["value"].append(np.where(is_leaf, value, 0.0).astype(np.float64))
+        self.tree_root.append(base)
+        self.n_nodes += n
+
+    def add_forest(self, estimator) -> Dict[str, Any]:
+        trees = getattr(estimator, "estimators_", None)
+        if trees is None:
+            trees = [estimator]  # single DecisionTreeClassifier
+        start = len(self.tree_root)
+        for est in trees:
+            t = est.tree_
+            if t.n_outputs != 1 or t.value.shape[2] != 2:
+                raise UnsupportedModelError("Only single-output binary trees are supported")
+            is_leaf = t.children_left == -1
+            # Same normalisation DecisionTreeClassifier.predict_proba applies
+            proba = t.value[:, 0, :2].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            missing = getattr(t, "missing_go_to_left", np.zeros(t.node_count, dtype=bool))
+            # sklearn trees compare float32-cast inputs: read those from the second block
+            self._add_tree(
+                t.feature, t.threshold, t.children_left, t.children_right,
+                missing, proba[:, 1], is_leaf, feature_offset=self.n_features,
+            )
+        return {
+            "kind": _FOREST, "start": start, "end": len(self.tree_root),
+            "baseline": 0.0, "float32": True,
+        }
+
+    def add_boosting(self, estimator) -> Dict[str, Any]:
+        if getattr(estimator, "n_trees_per_iteration_", 1) != 1:
+            raise UnsupportedModelError("Only binary HistGradientBoosting models are supported")
+        if getattr(estimator, "is_categorical_", None) is not None and np.any(estimator.is_categorical_):
+            raise UnsupportedModelError("Categorical HistGradientBoosting features are not supported")
+        start = len(self.tree_root)
+        for predictors in estimator._predictors:
+            nodes = predictors[0].nodes
+            if np.any(nodes["is_categorical"]):
+                raise UnsupportedModelError("Categorical splits are not supported")
+            is_leaf = nodes["is_leaf"].astype(bool)
+            self._add_tree(
+                nodes["feature_idx"], nodes["num_threshold"], nodes["left"], nodes["right"],
+                nodes["missing_go_to_left"].astype(bool), nodes["value"], is_leaf, feature_offset=0,
+            )
+        return {
+            "kind": _BOOSTING, "start": start, "end": len(self.tree_root),
+            "baseline": float(np.asarray(estimator._baseline_prediction).ravel()[0]), "float32": False,
+        }
+
+    def add_estimator(self, estimator) -> Dict[str, Any]:
+        name = type(estimator).__name__
+        if name in ("RandomForestClassifier", "ExtraTreesClassifier", "DecisionTreeClassifier", "ExtraTreeClassifier"):
+            return self.add_forest(estimator)
+        if name == "HistGradientBoostingClassifier":
+            return self.add_boosting(estimator)
+        raise UnsupportedModelError(f"Cannot compile {name}")
+
+    def add_group(self, estimator, calibrator=None) -> None:
+        group = self.add_estimator(estimator)
+        group.update({"cal_kind": _CAL_NONE, "cal_start": self.n_cal, "cal_end": self.n_cal,
+                      "cal_oob": _OOB_CLIP, "sigmoid": (0.0, 0.0)})
+        if calibrator is not None:
+            cal_name = type(calibrator).__name__
+            if cal_name == "IsotonicRegression":
+                x = np.asarray(calibrator.X_thresholds_, dtype=np.float64)
+                y = np.asarray(calibrator.y_thresholds_, dtype=np.float64)
+                if calibrator.out_of_bounds == "nan" and len(x) > 1:
+                    group["cal_oob"] = _OOB_NAN
+                group.update({"cal_kind": _CAL_ISOTONIC, "cal_start": self.n_cal, "cal_end": self.n_cal + len(x)})
+                self.cal_x.append(x)
+                self.cal_y.append(y)
+                self.n_cal += len(x)
+            elif cal_name == "_SigmoidCalibration":
+                group.update({"cal_kind": _CAL_SIGMOID, "sigmoid": (float(calibrator.a_), float(calibrator.b_))})
+            else:
+                raise UnsupportedModelError(f"Cannot compile calibrator {cal_name}")
+        self.groups.append(group)
+
+
+def export_tree_ensemble(model) -> "CompiledTreeEnsemble":
+    """Flatten a fitted (optionally calibrated) tree model into a CompiledTreeEnsemble."""
+    classes = np.asarray(getattr(model, "classes_", []))
+    if len(classes) != 2:
+        raise UnsupportedModelError("Only binary classifiers are supported")
+    n_features = getattr(model, "n_features_in_", None)
+    if n_features is None:
+        raise UnsupportedModelError("Model has no n_features_in_")
+
+    builder = _Builder(int(n_features))
+    calibrated = type(model).__name__ == "CalibratedClassifierCV"
+    if calibrated:
+        for cc in model.calibrated_classifiers_:
+            if len(cc.calibrators) != 1:
+                raise UnsupportedModelError("Expected one calibrator per fold for a binary model")
+            if not np.array_equal(np.asarray(cc.estimator.classes_), classes):
+                raise UnsupportedModelError("Fold estimator classes differ from the calibrated model")
+            builder.add_group(cc.estimator, cc.calibrators[0])
+    else:
+        builder.add_group(model)
+
+    groups = builder.groups
+    arrays = {
+        "classes": classes,
+        "feature": np.concatenate(builder.nodes["feature"]),
+        "threshold": np.concatenate(builder.nodes["threshold"]),
+        "left": np.concatenate(builder.nodes["left"]),
+        "right": np.concatenate(builder.nodes["right"]),
+        "missing_left": np.concatenate(builder.nodes["missing_left"]),
+        "value": np.concatenate(builder.nodes["value"]),
+        "tree_root": np.asarray(builder.tree_root, dtype=np.int64),
+        "group_kind": np.asarray([g["kind"] for g in groups], dtype=np.int64),
+        "group_tree_start": np.asarray([g["start"] for g in groups], dtype=np.int64),
+        "group_tree_end": np.asarray([g["end"] for g in groups], dtype=np.int64),
+        "group_baseline": np.asarray([g["baseline"] for g in groups], dtype=np.float64),
+        "group_float32": np.asarray([g["float32"] for g in groups], dtype=bool),
+        "group_cal_kind": np.asarray([g["cal_kind"] for g in groups], dtype=np.int64),
+        "group_cal_start": np.asarray([g["cal_start"] for g in groups], dtype=np.int64),
+        "group_cal_end": np.asarray([g["cal_end"] for g in groups], dtype=np.int64),
+        "group_cal_oob": np.asarray([g["cal_oob"] for g in groups], dtype=np.int64),
+        "group_sigmoid": np.asarray([g["sigmoid"] for g in groups], dtype=np.float64).reshape(-1, 2),
+        "cal_x": np.concatenate(builder.cal_x) if builder.cal_x else np.empty(0),
+        "cal_y": np.concatenate(builder.cal_y) if builder.cal_y else np.empty(0),
+        # n_features, calibrated flag
+        "meta": np.asarray([builder.n_features, int(calibrated)], dtype=np.int64),
+    }
+    return CompiledTreeEnsemble(arrays)
+
+
+class CompiledTreeEnsemble:
+    """
+    Drop-in replacement for the sklearn model's predict_proba / predict.
+    Holds only NumPy arrays, so it can be saved with np.savez and loaded
+    without unpickling any sklearn objects.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        for name in _ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+        self.classes_ = self.classes
+        self.n_features_in_ = int(self.meta[0])
+        self.calibrated = bool(self.meta[1])
+        self.n_trees = len(self.tree_root)
+        self.needs_float32 = bool(np.any(self.group_float32))
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self.max_depth = self._max_depth()
+        self._compile_traversal()
+
+    def _compile_traversal(self) -> None:
+        """
+        Re-lay the node arrays for stepping. Internal nodes get dense ids;
+        their children sit in adjacent slots (2 * id for left, 2 * id + 1
+        for right) holding either the child's internal id or ~leaf_id, so a
+        step is one compare plus one gather and a negative code means done.
+        """
+        internal = ~self.is_leaf
+        internal_id = np.cumsum(internal) - 1
+        leaf_id = np.cumsum(self.is_leaf) - 1
+        code = np.where(internal, internal_id, ~leaf_id).astype(np.int32)
+
+        self._feature = self.feature[internal].astype(np.int32)
+        self._threshold = self.threshold[internal]
+        self._missing_right = ~self.missing_left[internal]
+        slots = np.empty(2 * int(internal.sum()), dtype=np.int32)
+        slots[0::2] = code[self.left[internal]]
+        slots[1::2] = code[self.right[internal]]
+        self._slots = slots
+        self._leaf_value = self.value[self.is_leaf]
+        self._root_code = code[self.tree_root]
+
+    def _max_depth(self) -> int:
+        # Depth of the deepest tree = steps until every root reaches a leaf
+        node = self.tree_root.copy()
+        depth = 0
+        while True:
+            nxt = self.left[node]
+            internal = nxt != node
+            if not np.any(internal):
+                return depth
+            # Follow both children: track the frontier of all internal nodes
+            node = np.concatenate([self.left[node[internal]], self.right[node[internal]]])
+            depth += 1
+
+    # --- Inference ---
+
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """(n_samples, n_trees) leaf value each sample lands on in each tree."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected X with shape (n, {self.n_features_in_}), got {X.shape}")
+        n = X.shape[0]
+        out = np.empty((n, self.n_trees))
+        # Chunk so the per-(sample, tree) working arrays stay cache-sized
+        step = max(1, CHUNK_SLOTS // max(self.n_trees, 1))
+        for start in range(0, n, step):
+            stop = min(n, start + step)
+            out[start:stop] = self._leaf_values_chunk(X[start:stop])
+        return out
+
+    def _leaf_values_chunk(self, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        has_nan = bool(np.isnan(X).any())
+        if self.needs_float32:
+            # Forest nodes read features offset by n_features: the float32-rounded copy
+            X = np.hstack([X, X.astype(np.float32).astype(np.float64)])
+        flat = np.ascontiguousarray(X).ravel()
+
+        # One entry per (sample, tree); only entries still on an internal node are stepped
+        codes = np.tile(self._root_code, n)
+        active = np.flatnonzero(codes >= 0).astype(np.int32)
+        current = codes[active]
+        row_offset = (active // self.n_trees) * np.int32(X.shape[1])
+        while len(active):
+            x = flat[row_offset + self._feature[current]]
+            go_right = ~(x <= self._threshold[current])
+            if has_nan:
+                go_right &= ~np.isnan(x) | self._missing_right[current]
+            current = self._slots[2 * current + go_right]
+            running = current >= 0
+            if not running.all():
+                done = ~running
+                codes[active[done]] = current[done]
+                active = active[running]
+                current = current[running]
+                row_offset = row_offset[running]
+        return self._leaf_value[~codes].reshape(n, self.n_trees)
+
+    def _calibrate(self, g: int, scores: np.ndarray) -> np.ndarray:
+        kind = self.group_cal_kind[g]
+        if kind == _CAL_ISOTONIC:
+            xp = self.cal_x[self.group_cal_start[g]:self.group_cal_end[g]]
+            fp = self.cal_y[self.group_cal_start[g]:self.group_cal_end[g]]
+            if len(xp) == 1:
+                return np.where(np.isnan(scores), np.nan, fp[0])
+            if self.group_cal_oob[g] == _OOB_NAN:
+                return np.interp(scores, xp, fp, left=np.nan, right=np.nan)
+            return np.interp(scores, xp, fp)
+        if kind == _CAL_SIGMOID:
+            a, b = self.group_sigmoid[g]
+            return _expit(-(a * scores + b))
+        return scores
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        leaves = self.leaf_values(X)
+        n = leaves.shape[0]
+        mean_proba = np.zeros((n, 2))
+        for g in range(len(self.group_kind)):
+            block = leaves[:, self.group_tree_start[g]:self.group_tree_end[g]]
+            if self.group_kind[g] == _BOOSTING:
+                # Sequential accumulation from the baseline, as HistGradientBoosting does
+                with_base = np.empty((n, block.shape[1] + 1))
+                with_base[:, 0] = self.group_baseline[g]
+                with_base[:, 1:] = block
+                score = np.cumsum(with_base, axis=1)[:, -1]
+                if not self.calibrated:
+                    score = _expit(score)
+            else:
+                score = block.sum(axis=1) / block.shape[1]
+
+            proba = np.empty((n, 2))
+            proba[:, 1] = self._calibrate(g, score) if self.calibrated else score
+            proba[:, 0] = 1.0 - proba[:, 1]
+            if self.calibrated:
+                proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+            mean_proba += proba
+        mean_proba /= len(self.group_kind)
+        return mean_proba
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        # joblib mmap_mode hands back np.memmap; plain views index faster
+        self.__dict__.update({
+            k: np.asarray(v) if isinstance(v, np.memmap) else v for k, v in state.items()
+        })
+
+    # --- Persistence ---
+
+    def save(self, path: str) -> None:
+        """Uncompressed .npz, so arrays can later be memory-mapped."""
+        np.savez(path, **{name: getattr(self, name) for name in _ARRAY_FIELDS})
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledTreeEnsemble":
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in _ARRAY_FIELDS})
+
+
+def export_to_file(model, models_dir: str, filename: str = COMPILED_MODEL_FILE) -> Optional[str]:
+    """
+    Compile and save next to the pickled model. Returns the path, or None
+    when the model type is not compilable.
+    """
+    try:
+        engine = export_tree_ensemble(model)
+    except UnsupportedModelError as exc:
+        print(f"[INFO] Skipping compiled model export: {exc}")
+        return None
+    path = os.path.join(models_dir, filename)
+    engine.save(path)
+    return path
+
+
+class RoutedTreeModel:
+    """Compiled engine for small batches, the original model for large ones."""
+
+    def __init__(self, engine: CompiledTreeEnsemble, model: Any, max_batch: int = COMPILED_MAX_BATCH):
+        self.engine = engine
+        self.model = model
+        self.max_batch = max_batch
+        self.classes_ = engine.classes_
+        self.n_features_in_ = engine.n_features_in_
+
+    def predict_proba(self, X) -> np.ndarray:
+        if len(X) <= self.max_batch:
+            return self.engine.predict_proba(X)
+        return self.model.predict_proba(X)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def compile_for_serving(model: Any, max_batch: int = COMPILED_MAX_BATCH,
+                        engine: Optional[CompiledTreeEnsemble] = None) -> Any:
+    """
+    RoutedTreeModel for compilable models; the model itself otherwise.
+    engine is a ready compiled form of model (e.g. from export_to_file);
+    without it the model is compiled here.
+    """
+    if max_batch <= 0:
+        return model
+    try:
+        if engine is None:
+            engine = export_tree_ensemble(model)
+    except UnsupportedModelError:
+        return model
+    return RoutedTreeModel(engine, model, max_batch)